@@ -0,0 +1,61 @@
+import threading
+from binance.client import Client
+from crypto_utils import decrypt_text
+from time_sync import shared_sync, ExchangeClock
+from rest_scheduler import shared_scheduler
+
+class ClientPool:
+    """帳戶連線池：每個 API Key 一個常駐 Client，狀態刷新、手動平倉/下單與 Worker 都借同一個
+    keep-alive 連線 (requests.Session) 一直沿用，不會每次操作都重新 TLS 握手；時間差由 TimeSync 背景校正後套用到池中所有 Client
+    借出的 Client 不可呼叫 close_connection() (由 close() 統一關閉)
+    """
+
+    def __init__(self, testnet=False):
+        self.testnet = testnet
+        self._clients = {}   # API Key -> Client
+        self._accounts = {}  # 帳戶檔中加密的 API Key -> Client (同一帳戶不重複解密)
+        self._lock = threading.Lock()
+        # [修改] 時間差改由全行程共用的 TimeSync 提供；Worker 用同一個交易所時鐘判斷換日
+        self.sync = shared_sync(testnet)
+        self.clock = ExchangeClock(self.sync)
+        self.scheduler = shared_scheduler(testnet)  # [新增] 合約 REST 請求依 IP 權重排程，下單優先
+        self.sync.listen(self._apply_offset)
+
+    def get(self, api_key, api_secret):
+        """借出該 API Key 的 Client (第一次借用時建立)"""
+        with self._lock:
+            c = self._clients.get(api_key)
+            if c is None or c.API_SECRET != api_secret:
+                # 建立時不另外 ping，連線確認由時間校正一併完成
+                c = self._clients[api_key] = Client(api_key, api_secret, testnet=self.testnet, ping=False)
+                c.pooled = True
+                self.scheduler.attach(c)
+                c.timestamp_offset = self.sync.offset_ms()
+        self.sync.ensure(c)  # 第一次借用時同步校正，之後由背景更新
+        return c
+
+    def account(self, acc):
+        """以帳戶檔的一筆資料借出 Client (明文 Key 為 c.API_KEY / c.API_SECRET)"""
+        c = self._accounts.get(acc['api_key'])
+        if c is None:
+            c = self.get(decrypt_text(acc['api_key']), decrypt_text(acc['secret_key']))
+            self._accounts[acc['api_key']] = c
+        return c
+
+    def _apply_offset(self, offset):
+        """TimeSync 更新時間差時呼叫 (背景執行緒)"""
+        with self._lock:
+            for c in self._clients.values():
+                c.timestamp_offset = offset
+
+    def close(self):
+        """程式結束時關閉所有連線"""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+            self._accounts.clear()
+        for c in clients:
+            try:
+                c.close_connection()
+            except Exception:
+                pass
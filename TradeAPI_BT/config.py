@@ -1,3 +1,142 @@
 import os
 
-IS_TESTNET = False # 統一在這裡控制是否為測試網
\ No newline at end of file
+IS_TESTNET = False # 統一在這裡控制是否為測試網
+
+# --- 行情串流 (MarketStream) 斷線監督 ---
+STREAM_STALL_TIMEOUT = 15    # 超過幾秒沒收到任何報價即視為停滯並重連 (markPrice 約 3 秒一筆)
+STREAM_BACKOFF_BASE = 1.0    # 重連退避的起始秒數 (每次失敗加倍)
+STREAM_BACKOFF_MAX = 60.0    # 重連退避的上限秒數
+STREAM_MAX_PER_CONNECTION = 200  # 幣安單一連線可訂閱的串流上限，超過會自動分成多條連線
+
+
+# --- 價格看板 (PriceBoard) ---
+PRICE_HEADER_REFRESH_MS = 250  # 價格標頭重繪間隔 (毫秒)，與報價頻率無關
+
+
+# --- 報價來源 (每個幣種可分別指定進場與停損判斷使用的串流) ---
+# 可選: "markPrice" (3 秒一筆), "markPrice@1s", "aggTrade" (最新成交價),
+#       "bookTicker.mid" (買賣中價), "bookTicker.bid", "bookTicker.ask"
+DEFAULT_PRICE_SOURCE = {"entry": "markPrice", "stop": "markPrice"}
+PRICE_SOURCES = {
+    # "BTCUSDT": {"entry": "aggTrade", "stop": "markPrice@1s"},
+}
+
+
+# --- 行情快速解碼 ---
+# True: 直接讀 WebSocket 並只解析用到的欄位 (有 orjson 時使用 orjson)，不經過 python-binance 的佇列
+# 效能可用 bench_market_stream.py 在本機量測
+STREAM_FAST_DECODE = False
+
+
+# --- 本機行情 daemon (market_daemon.py) ---
+# BT / MA 同時執行時先啟動 python market_daemon.py，兩邊共用同一組幣安連線、每筆報價只從幣安收一次
+# MarketStream 啟動時先嘗試接上 daemon，沒有啟動 (連不上) 時自動改為直接連線
+MARKET_DAEMON = True
+MARKET_DAEMON_HOST = "127.0.0.1"
+MARKET_DAEMON_PORT = 47651
+MARKET_DAEMON_CONNECT_TIMEOUT = 0.5       # 連線 daemon 的逾時秒數
+MARKET_DAEMON_CLIENT_BUFFER = 4 * 2 ** 20 # daemon 對單一 app 的待送資料上限 (bytes)，超過即斷開，避免拖累其他 app
+
+
+# --- 日 K 串流 (kline_1d) ---
+# 換日時直接由串流的日 K 計算新的觸發價位，不再輪詢 REST
+KLINE_BOOK_WINDOW = 60        # 記憶體中保留的已收盤日 K 根數 (回看天數更長時自動加大)
+KLINE_BOOK_GRACE_MS = 5000    # 換日後超過此毫秒數串流仍未帶來新 K 線，改用 REST 輪詢
+
+
+# --- 交易規則快取 (exchange_info_cache.py) ---
+EXCHANGE_INFO_TTL = 3600                       # 背景每隔幾秒重新下載 exchange info (不影響下單)
+EXCHANGE_INFO_RETRY = 60                       # 下載失敗或查無幣種時，最快幾秒後再試
+EXCHANGE_INFO_FILE = "exchange_info_{net}.json"  # 存檔供下次暖啟動，{net} 為 live / testnet
+
+
+# --- 交易所時間校正 (time_sync.py) ---
+# 所有帳戶的 Client (簽名時間戳) 與 Worker (換日判斷) 共用同一個交易所時間估計
+TIME_SYNC_INTERVAL_S = 60      # 背景多久取樣一次伺服器時間 (秒)
+TIME_SYNC_BURST = 3            # 每次取樣連打幾次，只採用往返時間最短的一筆
+TIME_SYNC_WINDOW = 30          # 保留最近幾次取樣，用來估計本機時鐘漂移
+TIME_SYNC_DRIFT_SPAN_S = 600   # 取樣涵蓋超過幾秒才估計漂移
+TIME_SYNC_MAX_DRIFT = 1.0      # 漂移估計上限 (毫秒/秒)，超過視為量測異常
+
+
+# --- REST 權重排程 (rest_scheduler.py) ---
+# 所有合約 REST 請求依回應標頭的已用權重排隊，同一台機器的各行程共用額度 (幣安以 IP 計算)
+REST_WEIGHT_LIMIT = 2400       # 每分鐘 IP 權重上限 (依交易所公告調整)
+REST_ORDER_RESERVE = 400       # 保留給下單車道的權重；日 K、交易規則、帳戶刷新最多用到 上限 - 保留
+REST_ORDER_COUNT_LIMIT = 1200  # 每個帳戶每分鐘的下單數上限
+REST_BAN_DEFAULT_S = 60        # 收到 429/418 但沒有 Retry-After 時暫停幾秒
+
+
+# --- 全市場掃描 (MarketScanner，需要 numpy) ---
+SCANNER_NEAR_PCT = 1.0        # 現價距離觸發價在 N% 以內即列出
+SCANNER_FAST = True           # True: !markPrice@arr@1s (每秒一批)；False: !markPrice@arr (每 3 秒一批)
+SCANNER_SEED_INTERVAL = 0.05  # 補歷史 K 線時每次 REST 呼叫的間隔秒數 (避免觸發權重限制)
+SCANNER_RETRY_S = 60          # 獲取失敗或日 K 尚未換日的幣種隔幾秒重抓；整輪補齊失敗時由此開始加倍退避
+SCANNER_BACKOFF_MAX = 900     # 整輪補齊失敗的退避上限秒數
+# 掃描使用的參數；本策略的天數與緩衝會以主畫面的輸入值覆寫
+SCANNER_PARAMS = {
+    "long_lookback": 20, "short_lookback": 20,       # 突破天數 (同 get_breakout_levels)
+    "long_ma_window": 6, "short_ma_window": 29,      # 均線天數 (同 get_ma_level)
+    "bo_long_buffer": 0.2, "bo_short_buffer": 0.2,   # 突破進場緩衝 %
+    "ma_long_buffer": 9.5, "ma_short_buffer": 1.0,   # 均線進場緩衝 %
+}
+
+
+# --- 逐筆報價紀錄 (TickRecorder) ---
+TICK_RECORD = True            # 把收到的每一筆報價寫入日檔，供重播與分析
+TICK_DIR = "ticks"            # 紀錄檔資料夾
+TICK_FLUSH_INTERVAL = 0.2     # 背景寫入間隔 (秒)
+TICK_ROTATE_MB = 256          # 單一檔案超過此大小即換新檔 (同一天以 _1, _2 ... 區分)
+TICK_COMPRESS = True          # 換檔後把舊檔壓縮成 .tickz (差分 + zlib)
+
+
+# --- Watchdog (報價年齡 / Worker 心跳) ---
+WATCHDOG_INTERVAL_MS = 1000       # 檢查間隔 (毫秒)
+WATCHDOG_TICK_STALE = 10          # 幣種超過幾秒沒有新報價視為過期 (markPrice 約 3 秒一筆)
+WATCHDOG_HEARTBEAT_STALE = 5      # Worker 超過幾秒沒有進入下一輪迴圈視為停滯
+WATCHDOG_LATENCY_WARN_MS = 500    # 單輪迴圈耗時超過此毫秒數即警示
+WATCHDOG_BLOCK_STALE_ENTRY = True # 報價過期時暫停進場，直到收到新報價
+
+
+# --- 逐筆報價帶 (Worker 評估兩次取樣之間的每一筆報價) ---
+TICK_TAPE_MAX = 10000   # 每個 Worker 最多暫存的未處理報價筆數，超過時捨棄最舊的
+
+
+# --- Worker 執行方式 ---
+# "thread": 每個 Worker 一條執行緒 (同步 Client)
+# "async" : 所有 Worker 以協程跑在同一個事件迴圈 (AsyncEngine + AsyncClient)，帳戶多時省下大量執行緒
+ENGINE_MODE = "thread"
+
+
+# --- Worker 喚醒 ---
+WORKER_IDLE_WAKE = 1.0  # Worker 沒有收到新報價時最多等待幾秒就做一次例行檢查 (換日時間到時會提早醒來)
+
+
+# --- Worker 生命週期 (WorkerSupervisor) ---
+WORKER_MAX_THREADS = 200    # 同時執行的 Worker 與一次性工作 (手動測試單) 上限，超過即拒絕啟動
+WORKER_JOIN_TIMEOUT = 5.0   # 停止後超過幾秒執行緒仍未結束即回報滯留；關閉程式時最多等待的秒數
+
+
+# --- 低延遲模式 (latency.py) ---
+LATENCY_MODE = False                   # True: 暖機後凍結長壽物件 (gc.freeze) 並放寬 GC 門檻，Watchdog 顯示每輪新增的記憶體區塊
+LATENCY_WARMUP_S = 30.0                # 最後一個 Worker 啟動後等待幾秒才凍結 (期間再啟動會重新計時)
+LATENCY_GC_THRESHOLD = (20000, 50, 50)  # 凍結後的 gc.set_threshold (預設 700, 10, 10)，減少在判斷路徑上觸發的回收
+
+
+# --- 多行程分片 (ShardPool + SharedPriceBus) ---
+SHARD_PROCESSES = 0     # 0 = 所有 Worker 在 GUI 行程內執行；N = 帳戶分散到 N 個 Worker 行程
+SHARD_BUS_SLOTS = 64    # 共享記憶體價格匯流排可容納的欄位數 (幣種 + 停損專用報價)
+SHARD_BUS_RING = 4096   # 每個欄位保留的逐筆報價筆數
+SHARD_POLL_MS = 1       # shard 行程沒有新報價時，多久再檢查一次共享記憶體
+SHARD_EVENT_MS = 100    # GUI 多久處理一次 shard 回傳的日誌與狀態
+
+
+# --- 引擎/GUI 分離 (engine_host.py) ---
+# True: 行情串流與所有 Worker 在獨立的引擎行程執行，GUI 只經由本機 socket 顯示狀態/日誌並下指令
+#       (GUI 凍結、跳出對話框或關閉都不影響交易；GUI 開啟時若引擎沒有在執行，會自動在背景啟動)
+ENGINE_PROCESS = False
+ENGINE_PORTS = {"BT": 47661, "MA": 47662}  # 各策略引擎監聽的本機埠
+ENGINE_GUI_BUFFER = 8 * 2 ** 20  # 引擎對 GUI 的待送資料上限 (bytes)，GUI 凍結超過即斷開，GUI 恢復後自動重連
+ENGINE_LOG_BACKLOG = 500         # GUI 不在線時暫存的日誌筆數，重新連上時補送
+ENGINE_RECONNECT_MS = 1000       # GUI 連不上引擎時的重試間隔 (毫秒)
+ENGINE_RESPAWN_TRIES = 15        # 自動啟動的引擎連續連不上幾次後視為啟動失敗，重新啟動
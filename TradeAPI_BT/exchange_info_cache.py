@@ -0,0 +1,138 @@
+import json
+import math
+import os
+import threading
+import time
+from binance.client import Client
+import config
+from rest_scheduler import shared_scheduler
+
+def precision_of(step):
+    """步進 (例如 0.001) 對應的小數位數"""
+    return int(round(-math.log10(step), 0)) if step > 0 else 0
+
+def parse_symbol(s):
+    """把 exchange info 中單一幣種的 filters 解析成精簡紀錄 (精度預先算好)"""
+    rec = {
+        'status': s.get('status', ''), 'contractType': s.get('contractType', ''), 'quoteAsset': s.get('quoteAsset', ''),
+        'stepSize': 0.0, 'minQty': 0.0, 'tickSize': 0.0, 'minNotional': 0.0,
+    }
+    for f in s.get('filters', ()):
+        kind = f.get('filterType')
+        if kind == 'LOT_SIZE':
+            rec['stepSize'] = float(f['stepSize'])
+            rec['minQty'] = float(f['minQty'])
+        elif kind == 'PRICE_FILTER':
+            rec['tickSize'] = float(f['tickSize'])
+        elif kind == 'MIN_NOTIONAL':
+            # 期貨為 notional，現貨為 minNotional
+            rec['minNotional'] = float(f.get('notional', f.get('minNotional', 0)))
+    rec['qtyPrecision'] = precision_of(rec['stepSize'])
+    rec['pricePrecision'] = precision_of(rec['tickSize'])
+    return rec
+
+class ExchangeInfoCache:
+    """交易規則快取：exchange info (數百 KB) 只下載並解析一次，存成每個幣種一筆精簡紀錄
+    讀取為一次 dict 查詢 (整份替換，免鎖)；背景每 EXCHANGE_INFO_TTL 秒更新並寫入磁碟，下次啟動直接讀檔
+    """
+
+    def __init__(self, testnet=False, path=None, background=True):
+        self.testnet = testnet
+        self.path = path  # None = 只存在記憶體 (例如 replay)
+        self.background = background
+        self._rules = {}
+        self.updated = 0.0
+        self._lock = threading.Lock()
+        self._last_try = 0.0
+        self._thread = None
+        if path:
+            self.load()
+
+    def get(self, symbol):
+        """O(1)：幣種的精簡紀錄，快取中沒有時回傳 None (回傳的 dict 為共用，不可修改)"""
+        return self._rules.get(symbol)
+
+    def records(self):
+        return self._rules
+
+    def lookup(self, client, symbol):
+        """取得紀錄；冷啟動或新上架的幣種不在快取時，以呼叫端的 client 同步下載一次 (每 EXCHANGE_INFO_RETRY 秒最多一次)"""
+        rec = self._rules.get(symbol)
+        if rec is None:
+            with self._lock:
+                rec = self._rules.get(symbol)
+                if rec is None and time.time() - self._last_try >= config.EXCHANGE_INFO_RETRY:
+                    self._last_try = time.time()
+                    self.refresh(client)
+                    rec = self._rules.get(symbol)
+        self.start()
+        return rec
+
+    def refresh(self, client):
+        """下載並解析 exchange info，整份替換後存檔"""
+        info = client.futures_exchange_info()
+        self._rules = {s['symbol']: parse_symbol(s) for s in info['symbols']}
+        self.updated = time.time()
+        self.save()
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._rules, self.updated = data['symbols'], data['updated']
+        except Exception as e:
+            print(f"[ExchangeInfo] 讀取快取檔失敗，將重新下載: {e}")
+
+    def save(self):
+        if not self.path:
+            return
+        try:
+            # 暫存檔名帶行程與執行緒編號：多個行程 (或背景更新與同步下載) 同時存檔時不會寫到同一個暫存檔
+            tmp = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({'updated': self.updated, 'symbols': self._rules}, f)
+            os.replace(tmp, self.path)
+        except Exception as e:
+            print(f"[ExchangeInfo] 寫入快取檔失敗: {e}")
+
+    def start(self):
+        """啟動背景更新 (第一次被查詢時自動呼叫)"""
+        if not self.background or self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="ExchangeInfo")
+                self._thread.start()
+
+    def _run(self):
+        client = None
+        while True:
+            time.sleep(max(1.0, self.updated + config.EXCHANGE_INFO_TTL - time.time()))
+            try:
+                if client is None:
+                    client = shared_scheduler(self.testnet).attach(Client(testnet=self.testnet))  # 公開資料，不需要 API Key
+                self.refresh(client)
+            except Exception as e:
+                print(f"[ExchangeInfo] 背景更新失敗: {e}")
+                self.updated = time.time() - config.EXCHANGE_INFO_TTL + config.EXCHANGE_INFO_RETRY
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_cache(testnet=False):
+    """同一行程共用的快取 (正式網 / 測試網各一份，分別存檔)"""
+    with _shared_lock:
+        cache = _shared.get(testnet)
+        if cache is None:
+            path = config.EXCHANGE_INFO_FILE.format(net="testnet" if testnet else "live")
+            cache = _shared[testnet] = ExchangeInfoCache(testnet, path)
+        return cache
+
+def cache_for(client):
+    """client 自帶快取時 (例如 replay 的 SimClient) 用它，否則用該 client 所屬網路的共用快取"""
+    cache = getattr(client, 'rules_cache', None)
+    if cache is None:
+        cache = shared_cache(bool(getattr(client, 'testnet', False)))
+    return cache
@@ -0,0 +1,90 @@
+import config
+
+class KlineBook:
+    """日 K 線簿：由 <symbol>@kline_1d 串流維護今日即時高低收，並在記憶體保存已收盤的 K 線視窗
+    K 線格式與 futures_klines 相同：[openTime, open, high, low, close, volume, closeTime]
+    """
+
+    def __init__(self, window=None):
+        self.window = window or config.KLINE_BOOK_WINDOW
+        self._closed = {}  # symbol -> 已收盤 K 線 (舊 -> 新)，每次收盤整份替換，讀取端免鎖
+        self._live = {}    # symbol -> 今日進行中的 K 線
+        self._depth = {}   # symbol -> 需要保留的根數 (依最長的回看天數)
+
+    def has(self, symbol, n=0):
+        return symbol in self._live and len(self._closed.get(symbol, ())) >= n
+
+    def closed(self, symbol):
+        return self._closed.get(symbol, [])
+
+    def live(self, symbol):
+        return self._live.get(symbol)
+
+    def ensure(self, client, symbol, n):
+        """確保至少有 n 根已收盤 K 線；不足時以 REST 補一次歷史 (每個幣種通常只需要一次)"""
+        if self.has(symbol, n):
+            return True
+        self._depth[symbol] = max(self._depth.get(symbol, 0), n)
+        try:
+            klines = client.futures_klines(symbol=symbol, interval='1d', limit=max(n, self.window) + 1)
+        except Exception as e:
+            print(f"[KlineBook] {symbol} 歷史 K 線補齊失敗: {e}")
+            return False
+        self.seed(symbol, klines)
+        return self.has(symbol, n)
+
+    async def ensure_async(self, client, symbol, n):
+        """[新增] ensure 的 AsyncClient 版本 (供 AsyncEngine 上的協程使用)"""
+        if self.has(symbol, n):
+            return True
+        self._depth[symbol] = max(self._depth.get(symbol, 0), n)
+        try:
+            klines = await client.futures_klines(symbol=symbol, interval='1d', limit=max(n, self.window) + 1)
+        except Exception as e:
+            print(f"[KlineBook] {symbol} 歷史 K 線補齊失敗: {e}")
+            return False
+        self.seed(symbol, klines)
+        return self.has(symbol, n)
+
+    def seed(self, symbol, klines):
+        """以 REST 取得的 K 線初始化 (最後一根為今日未收盤)"""
+        if not klines:
+            return
+        rows = [self._row(k) for k in klines]
+        live = self._live.get(symbol)
+        # 串流已經帶來更新的今日 K 線時，保留串流的版本
+        if live is None or live[0] <= rows[-1][0]:
+            self._live[symbol] = rows[-1]
+        self._closed[symbol] = self._trim(symbol, rows[:-1])
+
+    def on_kline(self, symbol, k):
+        """處理串流的 kline 事件 (k 為 payload 中的 'k')
+        :return: 剛收盤的那根 K 線，沒有收盤時回傳 None
+        """
+        row = [k['t'], float(k['o']), float(k['h']), float(k['l']), float(k['c']), float(k['v']), k['T']]
+        if k['x']:
+            self._live[symbol] = row
+            return self._close(symbol, row)
+
+        closed_row = None
+        live = self._live.get(symbol)
+        if live is not None and live[0] < row[0]:
+            # 漏接 x=true 的收盤事件 (例如剛好斷線)，以上一根的最後狀態視為收盤
+            closed_row = self._close(symbol, live)
+        self._live[symbol] = row
+        return closed_row
+
+    def _close(self, symbol, row):
+        closed = self._closed.get(symbol, [])
+        if closed and closed[-1][0] >= row[0]:
+            return None
+        self._closed[symbol] = self._trim(symbol, closed + [row])
+        return row
+
+    def _trim(self, symbol, rows):
+        keep = max(self.window, self._depth.get(symbol, 0))
+        return rows[-keep:]
+
+    @staticmethod
+    def _row(k):
+        return [k[0], float(k[1]), float(k[2]), float(k[3]), float(k[4]), float(k[5]), k[6]]
@@ -1,5 +1,4 @@
 import sys
-import threading
 import time
 import json
 import os
@@ -8,11 +7,29 @@ from datetime import datetime
 from PySide6.QtWidgets import *
 from PySide6.QtGui import *
 from PySide6.QtCore import *
-from binance.client import Client
 import config
 from crypto_utils import encrypt_text, decrypt_text
 from trading_strategy import TradingWorker, STATE_FOLDER
 from market_stream import MarketStream
+from price_board import PriceBoard
+from kline_book import KlineBook
+from tick_recorder import TickRecorder
+from watchdog import Watchdog
+from async_engine import AsyncEngine
+from strategy_group import StrategyGroups
+from shm_price_bus import SharedPriceBus
+from shard_host import ShardPool, RemoteWorker
+from engine_host import EngineLink, account_id
+from qt_bridge import QtInvoker
+from worker_supervisor import WorkerSupervisor
+from client_pool import ClientPool
+from rest_scheduler import nowait, RestBusy
+import latency
+# [新增] 全市場掃描需要 numpy，未安裝時停用該分頁
+try:
+    from market_scanner import MarketScanner
+except ImportError:
+    MarketScanner = None
 
 ACCOUNTS_FILE = "user_accounts.json"
 
@@ -193,19 +210,80 @@ class MainWindow(QMainWindow):
         
         self.prices = {s: 0.0 for s in self.active_symbols}
         self.workers = [None] * len(account_data)
-        self.manual_workers = []
         self._shared_log_cache = {}  # 新增：用於過濾重複的系統 Log
+        self.feed_outages = []  # [新增] 行情中斷窗口紀錄：(開始, 結束, 幣種)
+        self.feed_down = False
+        # [新增] 最新價看板：行情執行緒覆寫、Worker 免鎖讀取、標頭定時重繪
+        self.price_board = PriceBoard()
+        self._header_text = ""
+        # [新增] Worker / 行情串流的事件在各自的執行緒發出，經由 invoker 排回 GUI 主執行緒處理
+        self.invoker = QtInvoker()
+        # [新增] 日 K 線簿：由 kline_1d 串流維護，換日時 Worker 直接由記憶體重算觸發位
+        self.kline_book = KlineBook()
+        # [新增] 策略群組：幣種/策略/參數相同的帳戶共用觸發價計算與進場判斷
+        self.strategy_groups = StrategyGroups(self.price_board)
+        self.scanner = None  # [新增] 全市場掃描 (手動啟動)
+        # [新增] 逐筆報價紀錄：背景執行緒寫入 ticks/YYYYMMDD.tick，供重播與分析
+        self.tick_recorder = None
+        if config.TICK_RECORD and not config.ENGINE_PROCESS:
+            self.tick_recorder = TickRecorder()
+            self.tick_recorder.start()
+
+        # [新增] ENGINE_MODE = "async" 時所有 Worker 以協程跑在同一個事件迴圈
+        self.engine = AsyncEngine() if config.ENGINE_MODE == "async" else None
+        # [新增] Worker 與手動測試單的執行緒統一由 supervisor 啟動、限制數量並在結束後回收連線
+        self.supervisor = WorkerSupervisor(self.engine)
+        # [新增] 每個帳戶一個常駐 Client (保留 keep-alive 連線、共用時間差)，刷新/平倉/下單/Worker 都從這裡借
+        self.client_pool = ClientPool(self.is_testnet)
+        # [新增] LATENCY_MODE 時暖機後凍結長壽物件並放寬 GC 門檻
+        latency.enable(self.invoker.wrap(self.append_log))
+        # [新增] SHARD_PROCESSES > 0 時帳戶分散到多個 Worker 行程，報價經由共享記憶體發佈
+        self.shards = None
+        if config.SHARD_PROCESSES > 0 and not config.ENGINE_PROCESS:
+            self.price_bus = SharedPriceBus(create=True)
+            self.price_board.mirror = self.price_bus
+            self.shards = ShardPool(config.SHARD_PROCESSES, self.price_bus.name, self.is_testnet)
+            self.shards.start()
+            self.shard_timer = QTimer(self)
+            self.shard_timer.timeout.connect(self.shards.dispatch)
+            self.shard_timer.start(config.SHARD_EVENT_MS)
+        # [新增] ENGINE_PROCESS = True 時行情與 Worker 都在引擎行程執行，GUI 只經由本機 socket 顯示與下指令
+        self.engine_link = None
+        if config.ENGINE_PROCESS:
+            self.engine_link = EngineLink("BT", self.is_testnet, self.price_board)
+            self.engine_link.hello.connect(self.on_engine_hello)
+            self.engine_link.engine_log.connect(self.append_log)
+            self.engine_link.feed_lost.connect(self.on_feed_lost)
+            self.engine_link.feed_restored.connect(self.on_feed_restored)
 
         self.main_client = None
         self.init_ui()
+        # [新增] 價格標頭以固定頻率重繪，不再每筆報價都重組字串
+        self.header_timer = QTimer(self)
+        self.header_timer.timeout.connect(self.refresh_price_header)
+        self.header_timer.start(config.PRICE_HEADER_REFRESH_MS)
+        # [新增] Watchdog：定時檢查報價年齡與 Worker 心跳，結果寫入狀態欄
+        self.watchdog = Watchdog(self.price_board)
+        self.watchdog_timer = QTimer(self)
+        self.watchdog_timer.timeout.connect(self.run_watchdog)
+        self.watchdog_timer.start(config.WATCHDOG_INTERVAL_MS)
+        if self.engine_link is not None:
+            self.engine_link.connect_engine()
         QTimer.singleShot(100, self.connect_market_data)
 
     def connect_market_data(self):
+        if self.engine_link is not None:
+            # [新增] 行情由引擎行程負責，這裡只告知需要監控的幣種
+            self.engine_link.set_symbols(self.active_symbols)
+            return
         try:
             if self.account_data:
                 # 啟動 WebSocket 串流
-                self.market_stream = MarketStream(self.active_symbols, self.is_testnet)
-                self.market_stream.price_updated.connect(self.update_price_cache)
+                self.market_stream = MarketStream(self.active_symbols, self.is_testnet, board=self.price_board, kline_book=self.kline_book, recorder=self.tick_recorder)
+                self.market_stream.price_updated.connect(self.invoker.wrap(self.update_price_cache))
+                self.market_stream.feed_lost.connect(self.invoker.wrap(self.on_feed_lost))
+                self.market_stream.feed_restored.connect(self.invoker.wrap(self.on_feed_restored))
+                self.market_stream.candle_closed.connect(self.invoker.wrap(self.on_candle_closed))
                 self.market_stream.start()
                 self.append_log(f"✅ WebSocket 連線成功，監控: {self.active_symbols}")
             else:
@@ -228,6 +306,9 @@ class MainWindow(QMainWindow):
         
         self.tabs.addTab(self.tab_strat, "策略控制中心")
         self.tabs.addTab(self.tab_stat, "帳戶監控面板")
+        self.tab_scan = QWidget()
+        self.setup_scan_tab(QVBoxLayout(self.tab_scan))
+        self.tabs.addTab(self.tab_scan, "全市場掃描")
         
         # [修改] 價格標籤
         self.price_label = QLabel("讀取中...")
@@ -347,6 +428,69 @@ class MainWindow(QMainWindow):
         ctrl_l.addWidget(refresh_btn)
         layout.addLayout(ctrl_l)
 
+    def setup_scan_tab(self, layout):
+        """[新增] 全市場掃描：列出所有距離突破位/均線觸發價在 N% 以內的 USDT 永續合約"""
+        ctrl_l = QHBoxLayout()
+        ctrl_l.addWidget(QLabel("距離觸發價 ≤"))
+        self.scan_near = QDoubleSpinBox()
+        self.scan_near.setRange(0.1, 20)
+        self.scan_near.setValue(config.SCANNER_NEAR_PCT)
+        self.scan_near.setSuffix(" %")
+        self.scan_near.valueChanged.connect(self.on_scan_near_changed)
+        ctrl_l.addWidget(self.scan_near)
+        ctrl_l.addStretch()
+        self.scan_btn = QPushButton("啟動掃描")
+        self.scan_btn.setObjectName("BlueBtn")
+        self.scan_btn.setFixedHeight(40)
+        self.scan_btn.clicked.connect(self.toggle_scanner)
+        if MarketScanner is None:
+            self.scan_btn.setEnabled(False)
+            self.scan_btn.setText("需要安裝 numpy")
+        ctrl_l.addWidget(self.scan_btn)
+        layout.addLayout(ctrl_l)
+
+        self.scan_table = QTableWidget()
+        self.scan_table.setColumnCount(5)
+        self.scan_table.setHorizontalHeaderLabels(["幣種", "現價", "觸發類型", "觸發價", "距離 %"])
+        self.scan_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.scan_table.setStyleSheet("QTableWidget { background: #1a1a1a; color: #eee; border: none; } QHeaderView::section { background: #333; color: #00ff00; }")
+        layout.addWidget(self.scan_table)
+
+    def scanner_params(self):
+        """[新增] 掃描使用本策略目前的天數與緩衝，其餘沿用 config.SCANNER_PARAMS"""
+        p = self.get_params()
+        return {"long_lookback": p['long_lookback'], "short_lookback": p['short_lookback'],
+                "bo_long_buffer": p['long_buffer'], "bo_short_buffer": p['short_buffer']}
+
+    def toggle_scanner(self):
+        if self.scanner is None:
+            self.scanner = MarketScanner(self.scanner_params(), self.scan_near.value(), self.is_testnet)
+            self.scanner.scan_updated.connect(self.update_scan_table)
+            self.scanner.log_update.connect(self.append_log)
+            self.scanner.start()
+            self.scan_btn.setText("停止掃描")
+            self.scan_btn.setObjectName("RedBtn")
+        else:
+            self.scanner.stop()
+            self.scanner = None
+            self.scan_table.setRowCount(0)
+            self.scan_btn.setText("啟動掃描")
+            self.scan_btn.setObjectName("BlueBtn")
+        self.scan_btn.setStyle(self.scan_btn.style())
+
+    def on_scan_near_changed(self, value):
+        if self.scanner is not None:
+            self.scanner.near_pct = value
+
+    def update_scan_table(self, rows):
+        self.scan_table.setRowCount(len(rows))
+        for r, (symbol, price, kind, trigger, dist) in enumerate(rows):
+            self.scan_table.setItem(r, 0, QTableWidgetItem(symbol))
+            self.scan_table.setItem(r, 1, QTableWidgetItem(f"{price:.6g}"))
+            self.scan_table.setItem(r, 2, QTableWidgetItem(kind))
+            self.scan_table.setItem(r, 3, QTableWidgetItem(f"{trigger:.6g}"))
+            self.scan_table.setItem(r, 4, QTableWidgetItem(f"{dist:+.2f}"))
+
     def add_row_to_table(self, i, acc):
         nick = acc.get('nickname', '未命名')
         conf = acc.get('config', {})
@@ -395,13 +539,27 @@ class MainWindow(QMainWindow):
                 self.add_row_to_table(i, acc)
             self.refresh_table_indices()
             # 重新掃描幣種
-            self.active_symbols = set()
-            for acc in self.account_data:
-                conf = acc.get('config', {})
-                self.active_symbols.add(conf.get('symbol', 'BTCUSDT'))
-            self.active_symbols = sorted(list(self.active_symbols))
+            self.sync_stream_symbols()
             self.apply_account_filter()
 
+    def sync_stream_symbols(self):
+        """[新增] 重新掃描帳戶用到的幣種，直接在執行中的串流上增減訂閱 (不需重啟程式)"""
+        self.active_symbols = set()
+        for acc in self.account_data:
+            conf = acc.get('config', {})
+            self.active_symbols.add(conf.get('symbol', 'BTCUSDT'))
+        self.active_symbols = sorted(list(self.active_symbols))
+        for s in self.active_symbols:
+            self.prices.setdefault(s, 0.0)
+
+        if self.engine_link is not None:
+            self.engine_link.set_symbols(self.active_symbols)
+        elif self.market_stream is None:
+            self.connect_market_data()
+        elif sorted(s.upper() for s in self.market_stream.symbols) != self.active_symbols:
+            self.market_stream.set_symbols(self.active_symbols)
+            self.append_log(f"🔄 WebSocket 訂閱更新，監控: {self.active_symbols}")
+
     def update_all_account_status(self):
         for i, acc in enumerate(self.account_data):
             try:
@@ -409,12 +567,12 @@ class MainWindow(QMainWindow):
                 conf = acc.get('config', {})
                 symbol = conf.get('symbol', 'BTCUSDT')
                 
-                api = decrypt_text(acc['api_key'])
-                sec = decrypt_text(acc['secret_key'])
-                c = Client(api, sec, testnet=self.is_testnet)
-                c.timestamp_offset = c.get_server_time()['serverTime'] - int(time.time() * 1000) #程式自動修正時間差
-                ai = c.futures_account()
-                h = hashlib.md5(api.encode()).hexdigest()[:8]
+                # [修改] 從連線池借用常駐 Client，不再每次刷新都重建連線與校正時間
+                # [修正] GUI 執行緒不排隊等額度，額度不足時本輪略過
+                with nowait():
+                    c = self.client_pool.account(acc)
+                    ai = c.futures_account()
+                h = hashlib.md5(c.API_KEY.encode()).hexdigest()[:8]
                 
                 # [修正] 讀取對應 Symbol 的狀態檔
                 sf = os.path.join(STATE_FOLDER, f"state_{h}_{symbol}_BT.json")
@@ -451,6 +609,8 @@ class MainWindow(QMainWindow):
                     if cb:
                         cb.setEnabled(False)
                         cb.setStyleSheet("background: #555; color: #aaa;")
+            except RestBusy:
+                break  # 其餘帳戶等下一次刷新
             except Exception as e:
                 pass
 
@@ -466,16 +626,17 @@ class MainWindow(QMainWindow):
         if self.status_table.cellWidget(idx, 9).text() == "停止":
             self.toggle_individual_account(idx)
         try:
-            raw_api = decrypt_text(acc['api_key'])
-            c = Client(raw_api, decrypt_text(acc['secret_key']), testnet=self.is_testnet)
-            ai = c.futures_account()
-            pos = next((p for p in ai['positions'] if p['symbol'] == symbol), None)
-            if pos and float(pos['positionAmt']) != 0:
-                side = "SELL" if float(pos['positionAmt']) > 0 else "BUY"
-                c.futures_create_order(symbol=symbol, side=side, type='MARKET', quantity=abs(float(pos['positionAmt'])), reduceOnly=True)
-                if self.workers[idx]:
-                    self.workers[idx].clear_state()
-                QTimer.singleShot(1000, self.update_all_account_status)
+            # [修正] GUI 執行緒不排隊等額度，額度不足時直接提示稍後再試
+            with nowait():
+                c = self.client_pool.account(acc)
+                ai = c.futures_account()
+                pos = next((p for p in ai['positions'] if p['symbol'] == symbol), None)
+                if pos and float(pos['positionAmt']) != 0:
+                    side = "SELL" if float(pos['positionAmt']) > 0 else "BUY"
+                    c.futures_create_order(symbol=symbol, side=side, type='MARKET', quantity=abs(float(pos['positionAmt'])), reduceOnly=True)
+                    if self.workers[idx]:
+                        self.workers[idx].clear_state()
+                    QTimer.singleShot(1000, self.update_all_account_status)
         except Exception as e:
             QMessageBox.critical(self, "失敗", str(e))
 
@@ -484,13 +645,14 @@ class MainWindow(QMainWindow):
         if QMessageBox.warning(self, "移除", f"確定移除「{nick}」？", QMessageBox.Yes | QMessageBox.No) == QMessageBox.No:
             return
         if self.workers[idx]:
-            self.workers[idx].stop()
+            self.supervisor.stop(self.workers[idx])
         self.account_data.pop(idx)
         self.workers.pop(idx)
         with open(ACCOUNTS_FILE, "w") as f:
             json.dump(self.account_data, f)
         self.status_table.removeRow(idx)
         self.refresh_table_indices()
+        self.sync_stream_symbols()
 
     def refresh_table_indices(self):
         for i in range(self.status_table.rowCount()):
@@ -517,18 +679,36 @@ class MainWindow(QMainWindow):
         ps['direction'] = target_direction
         
         if btn.text() == "啟動":
-            api = decrypt_text(self.account_data[idx]['api_key'])
-            sec = decrypt_text(self.account_data[idx]['secret_key'])
-            c = Client(api, sec, testnet=self.is_testnet)
-            c.timestamp_offset = c.get_server_time()['serverTime'] - int(time.time() * 1000) #程式自動修正時間差
+            pool = self.engine_link if self.engine_link is not None else self.shards
+            if pool is not None:
+                # [修改] 分片/引擎行程模式：帳戶交給其他行程執行，這裡只保留代理 (日誌/狀態由對方回傳)
+                # [修正] 連線由對方行程建立，這裡只解密 Key，不向本行程的連線池借用 Client
+                api, sec = decrypt_text(self.account_data[idx]['api_key']), decrypt_text(self.account_data[idx]['secret_key'])
+                w = pool.start_account(api, sec, ps, target_symbol, "BT", wait_for_reset)
+                w.on_log = lambda m, n=nick, s=target_symbol: self.append_filtered_log(n, s, m)
+                self.workers[idx] = w
+            else:
+                if self.supervisor.full():
+                    self.append_log(f"⚠️ [{nick}] 同時執行的 Worker 已達上限 ({config.WORKER_MAX_THREADS})，未啟動")
+                    return
+                # [修改] Key 由連線池取得 (同一帳戶只解密一次)；確認未達上限後才借用
+                try:
+                    with nowait():  # [修正] 第一次借用會校正時間，額度不足時不卡住介面
+                        c = self.client_pool.account(self.account_data[idx])
+                except RestBusy as e:
+                    self.append_log(f"⚠️ [{nick}] {e}，未啟動")
+                    return
+                api, sec = c.API_KEY, c.API_SECRET
             
-            # [傳遞] 將 symbol 傳給 Worker
-            w = TradingWorker(c, ps, target_symbol, "BT", wait_for_reset)
-            w.price_update.connect(lambda p, s=target_symbol: self.update_price_cache(s, p)) # 用於更新快取
-            w.log_update.connect(lambda m, n=nick, s=target_symbol: self.append_filtered_log(n, s, m))
+                # [傳遞] 將 symbol 傳給 Worker
+                w = TradingWorker(c, ps, target_symbol, "BT", wait_for_reset, price_board=self.price_board, kline_book=self.kline_book, clock=self.client_pool.clock)
+                w.log_update.connect(self.invoker.wrap(lambda m, n=nick, s=target_symbol: self.append_filtered_log(n, s, m)))
+                group = self.strategy_groups.join(w)
+                if len(group.members) > 1:
+                    self.append_log(f"🔗 [{nick}] 加入 {target_symbol} 策略群組 (共 {len(group.members)} 個帳戶共用觸發價)")
             
-            self.workers[idx] = w
-            threading.Thread(target=w.run, daemon=True).start()
+                self.workers[idx] = w
+                self.supervisor.start(w, api, sec, self.is_testnet)
             
             self.status_table.setItem(idx, 8, QTableWidgetItem("⚡ 運行" if not wait_for_reset else "⏳ 等待同步"))
             btn.setText("停止")
@@ -536,21 +716,119 @@ class MainWindow(QMainWindow):
             btn.setStyle(btn.style())
         else:
             if self.workers[idx]:
-                self.workers[idx].stop()
+                self.supervisor.stop(self.workers[idx])
+                self.watchdog.forget(self.workers[idx])
             self.status_table.setItem(idx, 8, QTableWidgetItem("⏹️ 停止"))
             btn.setText("啟動")
             btn.setObjectName("GreenBtn")
             btn.setStyle(btn.style())
 
+    def closeEvent(self, event):
+        """[新增] 關閉視窗時停止本行程的 Worker 並等待執行緒結束 (引擎行程模式的帳戶留在引擎繼續運作)"""
+        self.supervisor.shutdown()
+        self.client_pool.close()
+        super().closeEvent(event)
+
     def update_price_cache(self, symbol, price):
-        self.prices[symbol] = price
-        display_str = " | ".join([f"{s.replace('USDT','')}: {p:,.2f}" for s, p in self.prices.items() if p > 0])
-        QMetaObject.invokeMethod(self.price_label, "setText", Qt.QueuedConnection, Q_ARG(str, display_str))
-        # [新增] 將價格同步給正在運行的 Worker
+        # [修改] 先確認通知再讀看板，期間寫入的新價會觸發下一次訊號，不會遺漏
+        # Worker 會自行從 PriceBoard 讀取最新價，這裡不再逐一推送
+        self.price_board.ack(symbol)
+        self.prices[symbol] = self.price_board.get(symbol) or price
+
+    def refresh_price_header(self):
+        """[新增] 由計時器以固定頻率呼叫，只在內容變動時重繪價格標頭"""
+        if self.feed_down:
+            return
+        prices = self.price_board.prices()
+        display_str = " | ".join([f"{s.replace('USDT','')}: {prices[s]:,.2f}" for s in self.active_symbols if prices.get(s, 0) > 0])
+        if display_str and display_str != self._header_text:
+            self._header_text = display_str
+            self.price_label.setText(display_str)
+
+    def run_watchdog(self):
+        """[新增] 檢查每個運行中的 Worker，把心跳/報價/迴圈耗時寫到狀態欄 (第 8 欄)"""
+        now = time.time()
+        # [新增] 執行緒與 Worker 物件數量，長時間反覆啟停後應維持穩定
+        running, stopping, threads, objects = self.supervisor.stats()
+        self.statusBar().showMessage(f"Worker 執行中 {running} | 停止中 {stopping} | 存活 Worker 物件 {objects} | 執行緒 {threads}")
+        for name in self.supervisor.reap(now):
+            self.append_log(f"⚠️ Worker {name} 停止超過 {config.WORKER_JOIN_TIMEOUT:.0f} 秒仍未結束 (可能卡在 REST 請求)")
+        for i, worker in enumerate(self.workers):
+            if worker is None or not worker.is_running:
+                continue
+            if isinstance(worker, RemoteWorker):
+                # [新增] shard 內的 Worker 由該行程自己的 Watchdog 檢查，這裡只顯示回報結果
+                text, abnormal, alert = worker.take_status()
+                if text is None:
+                    continue
+            else:
+                text, abnormal, alert = self.watchdog.check(worker, now)
+            item = self.status_table.item(i, 8)
+            if item is None or item.text() != text:
+                item = QTableWidgetItem(text)
+                if abnormal:
+                    item.setForeground(QColor("#ff4d4d"))
+                self.status_table.setItem(i, 8, item)
+            if alert:
+                nick = self.account_data[i].get('nickname', '未命名')
+                self.append_log(f"[{nick}] {alert}")
+
+    def on_feed_lost(self, start_ts, symbols):
+        """[新增] 行情中斷：暫停相關幣種的進場，直到收到新報價"""
+        start_str = datetime.fromtimestamp(start_ts).strftime("%H:%M:%S")
+        self.append_log(f"🚨 WebSocket 行情中斷 (最後報價 {start_str})，暫停進場並重新連線: {symbols}")
+        self.feed_down = True
+        self._header_text = ""
+        self.price_label.setText("⚠️ 行情中斷，重新連線中...")
+        if self.engine_link is not None:
+            return  # 引擎行程已自行暫停相關 Worker 的進場
         for worker in self.workers:
-            if worker and worker.symbol == symbol:
-                worker.update_price(price)
-
+            if worker and worker.symbol in symbols:
+                worker.mark_feed_stale()
+
+    def on_feed_restored(self, start_ts, end_ts, symbols):
+        """[新增] 行情恢復：記錄並回報這次的中斷窗口"""
+        self.feed_outages.append((start_ts, end_ts, symbols))
+        self.feed_down = False
+        start_str = datetime.fromtimestamp(start_ts).strftime("%H:%M:%S")
+        end_str = datetime.fromtimestamp(end_ts).strftime("%H:%M:%S")
+        self.append_log(f"✅ WebSocket 行情恢復 | 中斷窗口 {start_str} ~ {end_str} ({end_ts - start_ts:.1f} 秒) | 幣種: {symbols}")
+
+    def on_engine_hello(self, is_testnet, running):
+        """[新增] 連上引擎行程：接回仍在運作的帳戶；介面上運作中但引擎沒有的帳戶 (引擎重啟過) 重新送出啟動"""
+        if is_testnet != self.is_testnet:
+            self.append_log("🚨 引擎行程的環境 (測試網/正式網) 與介面不同，請先結束引擎行程再重新開啟")
+            return
+        self.append_log(f"🔌 已連上交易引擎，運作中帳戶 {len(running)} 個")
+        for idx, acc in enumerate(self.account_data):
+            btn = self.status_table.cellWidget(idx, 9)
+            nick = acc.get('nickname', '未命名')
+            symbol = acc.get('config', {}).get('symbol', 'BTCUSDT')
+            api = decrypt_text(acc['api_key'])
+            key = account_id(api, symbol, "BT")
+            if key in running:
+                w = self.engine_link.adopt(key, symbol)
+            elif btn.text() == "停止":
+                ps = self.get_params()
+                ps['direction'] = acc.get('config', {}).get('direction', 'BOTH')
+                w = self.engine_link.start_account(api, decrypt_text(acc['secret_key']), ps, symbol, "BT")
+            else:
+                continue
+            w.on_log = lambda m, n=nick, s=symbol: self.append_filtered_log(n, s, m)
+            self.workers[idx] = w
+            if btn.text() == "啟動":
+                self.status_table.setItem(idx, 8, QTableWidgetItem("⚡ 運行"))
+                btn.setText("停止")
+                btn.setObjectName("RedBtn")
+                btn.setStyle(btn.style())
+
+    def on_candle_closed(self, symbol, open_ms):
+        """[新增] 日 K 收盤 (由串流得知)，各 Worker 會在下一輪自行換日"""
+        rows = self.kline_book.closed(symbol)
+        if rows and rows[-1][0] == open_ms:
+            _, _, high, low, close, _, _ = rows[-1]
+            day = datetime.fromtimestamp(open_ms / 1000).strftime("%Y-%m-%d")
+            self.append_log(f"📅 [{symbol}] {day} 日 K 收盤 | 高 {high} | 低 {low} | 收 {close}")
 
     def append_log(self, m):
         now = datetime.now().strftime("%H:%M:%S")
@@ -592,36 +870,31 @@ class MainWindow(QMainWindow):
     def manual_trade(self, side):
         params = self.get_params()
         self.append_log(f"🚀 開始執行多帳戶手動 {side} 測試...")
-        
-        self.manual_workers = [w for w in self.manual_workers if w.is_running]
-
         for acc in self.account_data:
             nick = acc.get('nickname', '未命名')
-            # [修正] 讀取該帳戶設定
-            conf = acc.get('config', {})
-            symbol = conf.get('symbol', 'BTCUSDT')
-            
-            try:
-                client = Client(decrypt_text(acc['api_key']), decrypt_text(acc['secret_key']), testnet=self.is_testnet)
-                # [修正] 傳入正確的 Symbol
-                w = TradingWorker(client, params, symbol, "BT_MANUAL")
-                w.log_update.connect(lambda m, n=nick: self.append_log(f"【{n}】 {m}"))
-                self.manual_workers.append(w)
-                
-                # 取得當前價格 (若緩存有則用緩存，否則即時抓)
-                price = self.prices.get(symbol, 0.0)
-                if price <= 0:
-                     ticker = client.futures_symbol_ticker(symbol=symbol)
-                     price = float(ticker['price'])
-
-                w.is_running = True 
-                threading.Thread(target=self._run_manual_task, args=(w, price, side), daemon=True).start()
-            except Exception as e:
-                self.append_log(f"❌ 【{nick}】初始化失敗: {e}")
+            # [修改] 下單在 supervisor 的執行緒完成，不再累積 manual_workers；連線借自帳戶連線池
+            if not self.supervisor.run_task(f"manual-{nick}", self._run_manual_task, acc, params, side):
+                self.append_log(f"⚠️ 【{nick}】同時執行的工作已達上限 ({config.WORKER_MAX_THREADS})，略過")
 
-    def _run_manual_task(self, worker, price, side):
-        worker.execute_entry(price, side, True)
-        worker.is_running = False
+    def _run_manual_task(self, acc, params, side):
+        nick = acc.get('nickname', '未命名')
+        # [修正] 讀取該帳戶設定
+        symbol = acc.get('config', {}).get('symbol', 'BTCUSDT')
+        log = self.invoker.wrap(self.append_log)
+        try:
+            client = self.client_pool.account(acc)
+            # [修正] 傳入正確的 Symbol
+            w = TradingWorker(client, params, symbol, "BT_MANUAL")
+            w.log_update.connect(lambda m, n=nick: log(f"【{n}】 {m}"))
+            # 取得當前價格 (若緩存有則用緩存，否則即時抓)
+            price = self.price_board.get(symbol)
+            if price <= 0:
+                price = float(client.futures_symbol_ticker(symbol=symbol)['price'])
+            w.is_running = True
+            w.execute_entry(price, side, True)
+            w.is_running = False
+        except Exception as e:
+            log(f"❌ 【{nick}】初始化失敗: {e}")
 
     def get_params(self):
         p = {k: float(v.text()) for k, v in self.inputs.items()}
@@ -1,47 +1,463 @@
 import asyncio
+import json
+import random
 import threading
-from PySide6.QtCore import QObject, Signal
+import time
+from types import SimpleNamespace
 from binance import AsyncClient, BinanceSocketManager
+import config
+from events import EventSignal
 
-class MarketStream(QObject):
+# [新增] 快速解碼路徑的選用套件：有 orjson 就用，沒有則改用欄位掃描
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import websockets
+except ImportError:
+    websockets = None
+
+FSTREAM_URL = "wss://fstream.binance.com/"
+FSTREAM_TESTNET_URL = "wss://fstream.binancefuture.com/"
+from price_board import PriceBoard, SOURCE_STREAMS, get_price_sources, board_key
+
+class StreamStalled(Exception):
+    """行情串流斷線或停滯 (超過時限沒有收到報價)"""
+    pass
+
+def extract_price(source, data):
+    """依報價來源從串流資料取出價格"""
+    if source == "bookTicker.mid":
+        return (float(data['b']) + float(data['a'])) / 2
+    if source == "bookTicker.bid":
+        return float(data['b'])
+    if source == "bookTicker.ask":
+        return float(data['a'])
+    return float(data['p'])  # markPrice / markPrice@1s / aggTrade 的價格欄位都是 'p'
+
+def scan_str(raw, key, start=0):
+    """[新增] 不做完整 JSON 解碼，直接從原始訊息切出字串欄位；key 需含引號，例如 '"p":"'"""
+    i = raw.find(key, start)
+    if i < 0:
+        return None
+    i += len(key)
+    return raw[i:raw.index('"', i)]
+
+def scan_int(raw, key, start=0):
+    """[新增] 同 scan_str，切出數字欄位；key 例如 '"E":'"""
+    i = raw.find(key, start)
+    if i < 0:
+        return 0
+    i += len(key)
+    j = raw.find(',', i)
+    k = raw.find('}', i)
+    if j < 0 or 0 <= k < j:
+        j = k
+    return int(raw[i:j])
+
+def extract_price_raw(source, raw):
+    """[新增] extract_price 的原始字串版本，只掃描需要的欄位"""
+    if source == "bookTicker.mid":
+        return (float(scan_str(raw, '"b":"')) + float(scan_str(raw, '"a":"'))) / 2
+    if source == "bookTicker.bid":
+        return float(scan_str(raw, '"b":"'))
+    if source == "bookTicker.ask":
+        return float(scan_str(raw, '"a":"'))
+    return float(scan_str(raw, '"p":"'))
+
+class StreamShard:
+    """[新增] 一條 WebSocket 連線及其負責的串流 (超過單一連線上限時分多條)"""
+
+    def __init__(self, shard_id, streams):
+        self.id = shard_id
+        self.streams = set(streams)
+        self.conn = None           # 連線中的 socket，可直接送 SUBSCRIBE/UNSUBSCRIBE
+        self.task = None
+        self.active = True
+        self.received = False      # 本次連線是否已收到報價
+        self.outage_start = 0.0    # 目前斷線窗口的開始時間，0 代表連線正常
+        self.last_msg_time = 0.0   # 這條連線最後一次收到報價的時間
+        self.via_daemon = False    # [新增] True 代表這條連線是接到本機行情 daemon，而不是幣安
+
+    def symbols(self):
+        return sorted({st.split('@')[0].upper() for st in self.streams})
+
+class MarketStream:
+    # [修改] 訊號改用 EventSignal (在行情執行緒直接呼叫)，GUI 端經由 QtInvoker 回到主執行緒
     # 當任何幣種價格更新時發射：(symbol, price)
-    price_updated = Signal(str, float)
+    price_updated = EventSignal(str, float)
+    # [新增] 偵測到斷線/停滯時發射：(斷線開始時間戳, 受影響幣種)
+    feed_lost = EventSignal(float, list)
+    # [新增] 報價恢復時發射：(斷線開始時間戳, 恢復時間戳, 受影響幣種)
+    feed_restored = EventSignal(float, float, list)
+    # [新增] 日 K 收盤時發射：(symbol, 收盤那根 K 線的開盤時間 ms)
+    candle_closed = EventSignal(str, int)
 
-    def __init__(self, symbols, is_testnet=False):
-        super().__init__()
+    def __init__(self, symbols, is_testnet=False, board=None, stream_url=None, kline_book=None, recorder=None):
         self.symbols = [s.lower() for s in symbols]
         self.is_testnet = is_testnet
+        self.stream_url = stream_url  # [新增] 覆寫 WebSocket 位址 (壓力測試用本機伺服器)
+        # [新增] 最新價看板：每筆報價只覆寫一格，訊號只在 GUI 消化完後才再發
+        self.board = board if board is not None else PriceBoard()
+        # [新增] 日 K 線簿：有提供時一併訂閱 <symbol>@kline_1d，換日不再需要 REST
+        self.kline_book = kline_book
+        self._kline_routes = {}
+        # [新增] 逐筆報價紀錄 (TickRecorder)，只做一次佇列 append，不影響熱路徑
+        self.recorder = recorder
+        # [新增] 串流名稱 -> [(看板欄位, 報價來源, 是否為進場價)]
+        self._routes = self._build_routes()
         self._running = False
+        self._loop = None
+        self._shards = []
+        self._next_shard_id = 0
+        self._next_msg_id = 0
+        self.last_msg_time = 0.0  # 最後一次收到任何報價的時間
+        # [新增] 先嘗試接上本機行情 daemon (market_daemon.py)，沒有啟動時才直接連幣安
+        self.use_daemon = config.MARKET_DAEMON and stream_url is None
 
     def start(self):
         self._running = True
         # 在獨立執行緒啟動事件迴圈
         threading.Thread(target=self._run_loop, daemon=True).start()
 
+    def _build_routes(self):
+        """[新增] 依 config.PRICE_SOURCES 建立每個串流要寫入哪些看板欄位"""
+        routes, streams = {}, set()
+        for s in self.symbols:
+            symbol = s.upper()
+            sources = get_price_sources(symbol)
+            for role, src in sources.items():
+                # 停損來源與進場相同時不另開欄位，Worker 直接沿用進場價
+                if role != "entry" and src == sources["entry"]:
+                    continue
+                stream = f"{s}@{SOURCE_STREAMS[src]}"
+                streams.add(stream)
+                route = routes.setdefault(stream.lower(), [])
+                route.append((board_key(symbol, role), src, role == "entry"))
+                # 原始大小寫也指向同一份路由，熱路徑可省掉每筆 lower()
+                routes[stream] = route
+        # [新增] 日 K 串流另外記錄，不寫入看板
+        self._kline_routes = {}
+        if self.kline_book is not None:
+            for s in self.symbols:
+                stream = f"{s}@kline_1d"
+                streams.add(stream)
+                self._kline_routes[stream] = s.upper()
+        self.streams = sorted(streams)
+        # [新增] 預先配置看板欄位，之後每筆報價只就地改寫
+        self.board.reserve(key for route in routes.values() for key, _, _ in route)
+        return routes
+
+    # --- [新增] 執行中增減訂閱 ---
+    def set_symbols(self, symbols):
+        """更新監控幣種：在現有連線上送 SUBSCRIBE/UNSUBSCRIBE，不需重啟串流 (可由任何執行緒呼叫)"""
+        symbols = sorted({s.lower() for s in symbols})
+        if self._loop is None or not self._running:
+            self.symbols = symbols
+            self._routes = self._build_routes()
+            return
+        asyncio.run_coroutine_threadsafe(self._apply_symbols(symbols), self._loop)
+
+    def add_symbols(self, symbols):
+        self.set_symbols(set(self.symbols) | {s.lower() for s in symbols})
+
+    def remove_symbols(self, symbols):
+        self.set_symbols(set(self.symbols) - {s.lower() for s in symbols})
+
+    async def _apply_symbols(self, symbols):
+        old_streams = set(self.streams)
+        self.symbols = symbols
+        self._routes = self._build_routes()
+        added = sorted(set(self.streams) - old_streams)
+        removed = old_streams - set(self.streams)
+
+        # [新增] 接在 daemon 上時只有一條本機連線，直接送出完整的串流清單
+        daemon = next((s for s in self._shards if s.via_daemon), None)
+        if daemon is not None:
+            daemon.streams = set(self.streams)
+            await self._send_daemon(daemon)
+            print(f"[MarketStream] 訂閱更新，目前 {len(self.streams)} 個串流 (經由行情 daemon)")
+            return
+
+        for shard in list(self._shards):
+            gone = shard.streams & removed
+            shard.streams -= gone
+            if shard.streams:
+                await self._send(shard, "UNSUBSCRIBE", sorted(gone))
+            else:
+                # 這條連線已經沒有任何串流，直接關閉
+                shard.active = False
+                self._shards.remove(shard)
+                if shard.task:
+                    shard.task.cancel()
+
+        # 新增的串流先塞進還有空位的連線，超過上限再開新連線
+        limit = config.STREAM_MAX_PER_CONNECTION
+        for shard in self._shards:
+            room = limit - len(shard.streams)
+            if added and room > 0:
+                batch, added = added[:room], added[room:]
+                shard.streams.update(batch)
+                await self._send(shard, "SUBSCRIBE", batch)
+        while added:
+            batch, added = added[:limit], added[limit:]
+            self._start_shard(batch)
+
+        print(f"[MarketStream] 訂閱更新，目前 {len(self.streams)} 個串流 / {len(self._shards)} 條連線")
+
+    async def _send(self, shard, method, streams):
+        """在連線上送出訂閱指令；連線中斷時略過，重連時會以 shard.streams 重新訂閱"""
+        if not streams or shard.conn is None or shard.conn.ws is None:
+            return
+        self._next_msg_id += 1
+        try:
+            await shard.conn.ws.send(json.dumps({"method": method, "params": streams, "id": self._next_msg_id}))
+        except Exception as e:
+            print(f"[MarketStream] {method} 送出失敗，等待重連時重新訂閱: {e}")
+
+    # --- 連線監督 ---
     def _run_loop(self):
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
-        loop.run_until_complete(self._listen_prices())
+        self._loop = loop
+        loop.run_until_complete(self._run_shards())
+
+    def _start_shard(self, streams, via_daemon=False):
+        shard = StreamShard(self._next_shard_id, streams)
+        shard.via_daemon = via_daemon
+        self._next_shard_id += 1
+        self._shards.append(shard)
+        shard.task = asyncio.ensure_future(self._supervise(shard))
+        return shard
+
+    async def _run_shards(self):
+        # [新增] 單一連線的串流數有上限，超過就分成多條連線
+        limit = config.STREAM_MAX_PER_CONNECTION
+        if self.use_daemon:
+            # [新增] 全部串流交給 daemon 轉送；連不上時 _listen_daemon 會改回直接連線
+            self._start_shard(self.streams, via_daemon=True)
+        else:
+            for i in range(0, len(self.streams), limit):
+                self._start_shard(self.streams[i:i + limit])
+        while self._running:
+            await asyncio.sleep(0.5)
+        for shard in self._shards:
+            if shard.task:
+                shard.task.cancel()
+        await asyncio.gather(*[s.task for s in self._shards if s.task], return_exceptions=True)
+
+    async def _supervise(self, shard):
+        """監督連線：斷線或停滯時以抖動退避重連，每次都重建 AsyncClient"""
+        attempt = 0
+        while self._running and shard.active:
+            shard.received = False
+            try:
+                await self._listen_prices(shard)
+            except Exception as e:
+                if not self._running or not shard.active:
+                    break
+                self._mark_outage(shard, e)
+
+            if not self._running or not shard.active:
+                break
+
+            # 這次連線曾經成功收到報價，就重置退避次數
+            if shard.received:
+                attempt = 0
+            delay = min(config.STREAM_BACKOFF_MAX, config.STREAM_BACKOFF_BASE * (2 ** attempt))
+            delay *= random.uniform(0.5, 1.0)  # 抖動，避免多個程式同時重連
+            attempt += 1
+            print(f"[MarketStream] 連線 #{shard.id} {delay:.1f} 秒後重新連線 (第 {attempt} 次)")
+            await asyncio.sleep(delay)
+
+    async def _listen_prices(self, shard):
+        if shard.via_daemon:
+            return await self._listen_daemon(shard)
+        # [新增] 快速路徑：直接讀 WebSocket，跳過 python-binance 的佇列與通用解碼
+        if config.STREAM_FAST_DECODE and websockets is not None:
+            return await self._listen_raw(shard)
 
-    async def _listen_prices(self):
         client = await AsyncClient.create(testnet=self.is_testnet)
-        bsm = BinanceSocketManager(client)
-        
-        # 建立多幣種流 (Combined Streams)
-        # 格式: <symbol>@markPrice 或 <symbol>@ticker
-        streams = [f"{s}@markPrice" for s in self.symbols]
-        ts = bsm.futures_multiplex_socket(streams)
-
-        async with ts as tscm:
-            while self._running:
-                res = await tscm.recv()
-                if res and 'data' in res:
-                    data = res['data']
-                    symbol = data['s']
-                    price = float(data['p']) # 'p' 標記價格
-                    self.price_updated.emit(symbol, price)
-
-        await client.close_connection()
+        try:
+            bsm = BinanceSocketManager(client)
+            if self.stream_url:
+                bsm.FSTREAM_URL = bsm.FSTREAM_TESTNET_URL = self.stream_url
+
+            # 建立多幣種流 (Combined Streams)
+            # [修改] 每個幣種依設定訂閱 markPrice / markPrice@1s / bookTicker / aggTrade
+            ts = bsm.futures_multiplex_socket(sorted(shard.streams))
+
+            async with ts as tscm:
+                shard.conn = tscm
+                while self._running:
+                    try:
+                        res = await asyncio.wait_for(tscm.recv(), timeout=config.STREAM_STALL_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        raise StreamStalled(f"{config.STREAM_STALL_TIMEOUT} 秒內沒有收到任何報價")
+
+                    # python-binance 會把連線錯誤包成 {'e': 'error'} 放進佇列，必須視為斷線
+                    if res and res.get('e') == 'error':
+                        raise StreamStalled(f"{res.get('type')}: {res.get('m')}")
+
+                    if res and 'data' in res:
+                        stream = res.get('stream', '')
+                        routes = self._routes.get(stream)
+                        kline_symbol = None if routes else self._kline_routes.get(stream)
+                        if not routes and not kline_symbol:
+                            continue
+                        data = res['data']
+                        shard.last_msg_time = self.last_msg_time = time.time()
+                        shard.received = True
+                        if shard.outage_start:
+                            self._mark_restored(shard)
+                        if kline_symbol:
+                            self._on_kline(kline_symbol, data['k'])
+                            continue
+                        event_ms = data.get('E', 0)
+                        for key, src, is_entry in routes:
+                            price = extract_price(src, data)
+                            # [修改] 合併發送：同一幣種已有待處理的訊號時只覆寫看板，不再排隊
+                            # price_updated 維持 (symbol, 進場價) 的格式
+                            if self.board.publish(key, price, event_ms, notify=is_entry):
+                                self.price_updated.emit(key, price)
+                            if self.recorder is not None:
+                                self.recorder.record(key, price, event_ms)
+        finally:
+            shard.conn = None
+            await client.close_connection()
+
+    async def _listen_raw(self, shard):
+        """[新增] 快速路徑：只取用到的欄位 (stream / 價格 / E)，直接寫入預先配置的看板欄位"""
+        base = self.stream_url or (FSTREAM_TESTNET_URL if self.is_testnet else FSTREAM_URL)
+        initial = set(shard.streams)
+        url = f"{base}stream?streams={'/'.join(sorted(initial))}"
+        async with websockets.connect(url, close_timeout=0.1, max_size=2 ** 20) as ws:
+            shard.conn = SimpleNamespace(ws=ws)
+            try:
+                await self._catch_up(shard, initial)
+                await self._pump_raw(shard, ws.recv)
+            finally:
+                shard.conn = None
+
+    async def _catch_up(self, shard, initial):
+        """[新增] 連線建立期間 (shard.conn 還是 None) 增減的串流不會送出指令，連上後補送"""
+        await self._send(shard, "SUBSCRIBE", sorted(shard.streams - initial))
+        await self._send(shard, "UNSUBSCRIBE", sorted(initial - shard.streams))
+
+    async def _pump_raw(self, shard, recv):
+        """[修改] 原始訊息的處理迴圈，直接連線與 daemon 轉送共用
+        :param recv: 回傳下一則 {"stream":...,"data":...} 原始字串的協程函式
+        """
+        publish = self.board.publish
+        record = self.recorder.record if self.recorder is not None else None
+        while self._running:
+            try:
+                raw = await asyncio.wait_for(recv(), timeout=config.STREAM_STALL_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise StreamStalled(f"{config.STREAM_STALL_TIMEOUT} 秒內沒有收到任何報價")
+
+            if orjson is not None:
+                msg = orjson.loads(raw)
+                data = msg.get('data')
+                if data is None:
+                    continue  # SUBSCRIBE/UNSUBSCRIBE 的回覆
+                stream = msg['stream']
+                routes = self._routes.get(stream)
+                event_ms = data.get('E', 0)
+                extract = extract_price
+            else:
+                # 訊息格式固定為 {"stream":"...","data":{...}}，沒有 stream 欄位的是指令回覆
+                stream = scan_str(raw, '"stream":"')
+                if stream is None:
+                    continue
+                routes = self._routes.get(stream)
+                data = raw
+                event_ms = scan_int(raw, '"E":')
+                extract = extract_price_raw
+            kline_symbol = None if routes else self._kline_routes.get(stream)
+            if not routes and not kline_symbol:
+                continue
+
+            shard.last_msg_time = self.last_msg_time = time.time()
+            shard.received = True
+            if shard.outage_start:
+                self._mark_restored(shard)
+            if kline_symbol:
+                # 日 K 訊息欄位較多，直接完整解碼
+                k = (data if orjson is not None else json.loads(raw)['data'])['k']
+                self._on_kline(kline_symbol, k)
+                continue
+            for key, src, is_entry in routes:
+                price = extract(src, data)
+                if publish(key, price, event_ms, is_entry):
+                    self.price_updated.emit(key, price)
+                if record is not None:
+                    record(key, price, event_ms)
+
+    # --- [新增] 本機行情 daemon ---
+    async def _listen_daemon(self, shard):
+        """向 daemon 訂閱並接收它轉送的原始訊息；daemon 沒有啟動時改回直接連線幣安"""
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(config.MARKET_DAEMON_HOST, config.MARKET_DAEMON_PORT, limit=2 ** 20),
+                timeout=config.MARKET_DAEMON_CONNECT_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            self._fallback_direct(shard, e)
+            return
+
+        async def recv():
+            line = await reader.readline()
+            if not line:
+                raise StreamStalled("行情 daemon 已關閉連線")
+            return line.decode()
+
+        shard.conn = SimpleNamespace(ws=None, writer=writer)
+        try:
+            await self._send_daemon(shard)
+            print(f"[MarketStream] 已接上行情 daemon，{len(shard.streams)} 個串流")
+            await self._pump_raw(shard, recv)
+        finally:
+            shard.conn = None
+            writer.close()
+
+    async def _send_daemon(self, shard):
+        """送出這個 app 需要的完整串流清單 (daemon 依此增減上游訂閱)"""
+        if shard.conn is None:
+            return
+        msg = {"op": "streams", "testnet": self.is_testnet, "streams": sorted(shard.streams)}
+        shard.conn.writer.write(json.dumps(msg).encode() + b"\n")
+        await shard.conn.writer.drain()
+
+    def _fallback_direct(self, shard, reason):
+        """daemon 連不上：關掉 daemon 連線，改以一般方式直接連幣安 (斷線窗口延續到新連線收到報價為止)"""
+        print(f"[MarketStream] 未連上行情 daemon ({reason})，改為直接連線")
+        shard.active = False
+        self._shards.remove(shard)
+        streams = sorted(shard.streams)
+        limit = config.STREAM_MAX_PER_CONNECTION
+        for i in range(0, len(streams), limit):
+            new = self._start_shard(streams[i:i + limit])
+            new.outage_start, new.last_msg_time = shard.outage_start, shard.last_msg_time
+
+    def _on_kline(self, symbol, k):
+        """[新增] 更新日 K 線簿，有 K 線收盤時通知"""
+        row = self.kline_book.on_kline(symbol, k)
+        if row is not None:
+            self.candle_closed.emit(symbol, int(row[0]))
+
+    def _mark_outage(self, shard, reason):
+        """記錄斷線窗口的開始，只在第一次偵測到時通知"""
+        print(f"[MarketStream] 連線 #{shard.id} 串流中斷: {reason}")
+        if shard.outage_start == 0.0:
+            # 以最後一筆報價時間作為斷線起點，較能反映實際的價格空窗
+            shard.outage_start = shard.last_msg_time or time.time()
+            self.feed_lost.emit(shard.outage_start, shard.symbols())
+
+    def _mark_restored(self, shard):
+        start, end = shard.outage_start, time.time()
+        shard.outage_start = 0.0
+        self.feed_restored.emit(start, end, shard.symbols())
 
     def stop(self):
-        self._running = False
\ No newline at end of file
+        self._running = False
@@ -1,5 +1,6 @@
 from binance.client import Client
 import math
+from exchange_info_cache import cache_for
 
 def get_breakout_levels(client, symbol, lookback, check_time=None):
     try:
@@ -16,28 +17,24 @@ def get_breakout_levels(client, symbol, lookback, check_time=None):
                 return None, None
 
         # [:-1] 排除掉最後一根（今天），只取前面已完成的 K 線
-        closed_klines = klines[:-1]
-        
-        highs = [float(k[2]) for k in closed_klines]
-        lows = [float(k[3]) for k in closed_klines]
-        
-        return max(highs), min(lows)
+        return calc_breakout_levels(klines[:-1], lookback)
     except:
         return None, None
+
+def calc_breakout_levels(closed_klines, lookback):
+    """[新增] 純計算：由已收盤的 K 線 (舊 -> 新) 取最近 lookback 根的最高價與最低價"""
+    if lookback <= 0 or len(closed_klines) < lookback:
+        return None, None
+    window = closed_klines[-lookback:]
+    return max(float(k[2]) for k in window), min(float(k[3]) for k in window)
     
 def get_quantity_precision(client, symbol):
-    """從幣安獲取該幣種的數量精度與最小步進"""
+    """從交易規則快取取得該幣種的最小步進與數量精度"""
     try:
-        info = client.futures_exchange_info()
-        for s in info['symbols']:
-            if s['symbol'] == symbol:
-                for f in s['filters']:
-                    if f['filterType'] == 'LOT_SIZE':
-                        step_size = float(f['stepSize'])
-                        # 計算小數位數 (例如 0.001 -> 3)
-                        precision = int(round(-math.log10(step_size), 0))
-                        return step_size, precision
-        return None, None
+        rec = cache_for(client).lookup(client, symbol)
+        if rec is None:
+            return None, None
+        return rec['stepSize'], rec['qtyPrecision']
     except Exception as e:
         print(f"獲取精度失敗: {e}")
         return None, None
@@ -53,36 +50,22 @@ def floor_to_precision(value, precision):
     factor = 10 ** precision
     return math.floor(value * factor) / factor
 
-def get_symbol_rules(client, symbol):
+def get_symbol_rules(client, symbol, price=None):
+    """[修改] 由全行程共用的交易規則快取取得 (記憶體查詢，不再每次下載 exchange info 與查詢現價)
+    :param price: 用來換算以金額計的最小數量 (actualMinQty)；未傳入時不計算
+    """
     try:
-        info = client.futures_exchange_info()
-        ticker = client.futures_symbol_ticker(symbol=symbol)
-        curr_price = float(ticker['price'])
-        
-        for s in info['symbols']:
-            if s['symbol'] == symbol:
-                rules = {'price': curr_price}
-                for f in s['filters']:
-                    if f['filterType'] == 'LOT_SIZE':
-                        rules['minQty'] = float(f['minQty'])
-                        rules['stepSize'] = float(f['stepSize'])
-                        rules['qtyPrecision'] = int(round(-math.log10(rules['stepSize']), 0))
-                    
-                    if f['filterType'] == 'MIN_NOTIONAL':
-                        # 這是「最小需下單多少 USDT」
-                        rules['minNotional'] = float(f['notional'])
-                
-                # 計算基於金額的最小數量： $MinQty_{money} = \frac{MinNotional}{Price}$
-                min_qty_by_money = rules['minNotional'] / curr_price
-                
-                # 真正的最小量 = max(數量限制, 金額限制)
-                rules['actualMinQty'] = max(rules['minQty'], min_qty_by_money)
-                
-                # 根據步進單位進行向上取整，確保符合規則
-                rules['actualMinQty'] = math.ceil(rules['actualMinQty'] / rules['stepSize']) * rules['stepSize']
-                
-                return rules
-        return None
+        rec = cache_for(client).lookup(client, symbol)
+        if rec is None:
+            return None
+        rules = dict(rec)
+        if price:
+            rules['price'] = price
+            # 計算基於金額的最小數量： $MinQty_{money} = \frac{MinNotional}{Price}$
+            min_qty_by_money = rules['minNotional'] / price
+            # 真正的最小量 = max(數量限制, 金額限制)，並依步進單位向上取整
+            rules['actualMinQty'] = math.ceil(max(rules['minQty'], min_qty_by_money) / rules['stepSize']) * rules['stepSize']
+        return rules
     except Exception as e:
         print(f"獲取規則失敗: {e}")
-        return None
\ No newline at end of file
+        return None
@@ -0,0 +1,202 @@
+import atexit
+import itertools
+import multiprocessing as mp
+import queue
+import threading
+import time
+import config
+import latency
+
+class RemoteWorker:
+    """GUI 端的 shard Worker 代理：介面與 TradingWorker 在 MainWindow 用到的部分相同"""
+
+    def __init__(self, pool, shard, key, symbol):
+        self.pool = pool
+        self.shard = shard
+        self.key = key
+        self.symbol = symbol
+        self.is_running = True
+        self.on_log = None    # 由 MainWindow 設定：收到 shard 的日誌時呼叫
+        self._status = None   # 最近一次的 (狀態欄文字, 是否異常)
+        self._alerts = []
+
+    def stop(self):
+        self.pool.send(self, "stop")
+
+    def clear_state(self):
+        self.pool.send(self, "clear")
+
+    def mark_feed_stale(self):
+        self.pool.send(self, "stale")
+
+    def take_status(self):
+        """取出最新狀態與累積的告警：(文字, 是否異常, 告警或 None)；shard 尚未回報時文字為 None"""
+        text, abnormal = self._status or (None, False)
+        alert = "\n".join(self._alerts) if self._alerts else None
+        self._alerts = []
+        return text, abnormal, alert
+
+class ShardPool:
+    """把帳戶分散到多個 Worker 行程 (每個行程各自一顆 GIL)
+    報價由 SharedPriceBus 共享記憶體提供，日誌與狀態經由 Queue 回到 GUI
+    """
+
+    def __init__(self, n, bus_name, is_testnet=False):
+        self.n = n
+        self.bus_name = bus_name
+        self.is_testnet = is_testnet
+        # spawn：與 Windows 行為一致，子行程不繼承 Qt 狀態
+        self._ctx = mp.get_context("spawn")
+        self._events = self._ctx.Queue()
+        self._cmds = []
+        self._procs = []
+        self._load = [0] * n
+        self._remotes = {}
+        self._keys = itertools.count(1)
+
+    def start(self):
+        for i in range(self.n):
+            cmds = self._ctx.Queue()
+            p = self._ctx.Process(target=shard_main, args=(i, self.bus_name, cmds, self._events, self.is_testnet), daemon=True)
+            p.start()
+            self._cmds.append(cmds)
+            self._procs.append(p)
+        atexit.register(self.close)
+
+    def start_account(self, api_key, api_secret, params, symbol, strategy_name, wait_for_reset=False):
+        """交給目前帳戶數最少的 shard 執行，回傳 RemoteWorker"""
+        shard = self._load.index(min(self._load))
+        remote = RemoteWorker(self, shard, next(self._keys), symbol)
+        self._remotes[remote.key] = remote
+        self._load[shard] += 1
+        self._cmds[shard].put(("start", remote.key, api_key, api_secret, params, symbol, strategy_name, wait_for_reset))
+        return remote
+
+    def send(self, remote, cmd):
+        self._cmds[remote.shard].put((cmd, remote.key))
+
+    def dispatch(self, limit=1000):
+        """由 GUI 計時器呼叫：處理 shard 回傳的日誌/狀態 (每次最多 limit 筆，避免卡住畫面)"""
+        for _ in range(limit):
+            try:
+                kind, key, *data = self._events.get_nowait()
+            except queue.Empty:
+                break
+            remote = self._remotes.get(key)
+            if remote is None:
+                continue
+            if kind == "log":
+                if remote.on_log is not None:
+                    remote.on_log(data[0])
+            elif kind == "status":
+                text, abnormal, alert = data
+                remote._status = (text, abnormal)
+                if alert:
+                    remote._alerts.append(alert)
+            elif kind == "finished":
+                remote.is_running = False
+                self._load[remote.shard] -= 1
+                del self._remotes[key]
+
+    def close(self, timeout=3):
+        for cmds in self._cmds:
+            cmds.put(("quit", 0))
+        for p in self._procs:
+            p.join(timeout)
+            if p.is_alive():
+                p.terminate()
+        self._cmds, self._procs = [], []
+
+# --- 以下在 shard 行程內執行 ---
+def shard_main(shard_id, bus_name, cmds, events, is_testnet):
+    from price_board import PriceBoard
+    from shm_price_bus import SharedPriceBus, BusReader
+    from strategy_group import StrategyGroups
+    from trading_strategy import TradingWorker
+    from watchdog import Watchdog
+    from client_pool import ClientPool
+
+    board = PriceBoard()
+    clients = ClientPool(is_testnet)  # 本 shard 的帳戶連線池 (反覆啟停同一帳戶不重建連線)
+    groups = StrategyGroups(board)
+    watchdog = Watchdog(board)
+    latency.enable()
+    bus = SharedPriceBus(bus_name)
+    workers = {}
+    cancelled = set()  # 還在連線初始化時就被要求停止的帳戶
+    running = [True]
+
+    def pump():
+        """把共享記憶體的新報價逐筆寫入本行程的看板 (觸發價索引/報價帶照常運作)"""
+        reader = BusReader(bus)
+        interval = config.SHARD_POLL_MS / 1000
+        while running[0]:
+            batch = reader.poll()
+            for key, prices, event_ms in batch:
+                for price in prices:
+                    board.publish(key, price, event_ms, notify=False)
+            if not batch:
+                time.sleep(interval)
+        reader.close()
+
+    def run_account(key, api_key, api_secret, params, symbol, strategy_name, wait_for_reset):
+        # Worker 的事件在發出的執行緒直接呼叫 (EventSignal)，Queue 本身可跨執行緒使用
+        try:
+            c = clients.get(api_key, api_secret)
+            # shard 沒有日 K 串流，換日時走 REST (同組帳戶只會查一次)
+            w = TradingWorker(c, params, symbol, strategy_name, wait_for_reset, price_board=board, clock=clients.clock)
+            w.log_update.connect(lambda m: events.put(("log", key, m)))
+            if key in cancelled or not running[0]:
+                return
+            groups.join(w)
+            workers[key] = w
+            latency.schedule_freeze()
+            w.run()
+        except Exception as e:
+            events.put(("log", key, f"❌ [Shard {shard_id}] Worker 啟動失敗: {e}"))
+        finally:
+            workers.pop(key, None)
+            events.put(("finished", key))
+
+    pump_thread = threading.Thread(target=pump, daemon=True)
+    pump_thread.start()
+    last_text = {}
+    next_check = 0.0
+    while True:
+        try:
+            cmd, key, *args = cmds.get(timeout=config.WATCHDOG_INTERVAL_MS / 1000)
+        except queue.Empty:
+            cmd = None
+        if cmd == "quit":
+            break
+        if cmd == "start":
+            threading.Thread(target=run_account, args=(key, *args), daemon=True).start()
+        elif cmd == "stop" and key not in workers:
+            cancelled.add(key)
+        elif cmd in ("stop", "clear", "stale") and key in workers:
+            w = workers[key]
+            if cmd == "stop":
+                w.stop()
+                watchdog.forget(w)
+            elif cmd == "clear":
+                w.clear_state()
+            else:
+                w.mark_feed_stale()
+
+        now = time.time()
+        if now >= next_check:
+            next_check = now + config.WATCHDOG_INTERVAL_MS / 1000
+            for key, w in list(workers.items()):
+                if not w.is_running:
+                    continue
+                text, abnormal, alert = watchdog.check(w, now)
+                if alert or last_text.get(key) != text:
+                    last_text[key] = text
+                    events.put(("status", key, text, abnormal, alert))
+
+    running[0] = False
+    for w in list(workers.values()):
+        w.stop()
+    pump_thread.join(timeout=1)
+    clients.close()
+    bus.close()
@@ -0,0 +1,156 @@
+import atexit
+import struct
+import time
+from multiprocessing import shared_memory
+import config
+
+# 共享記憶體配置：
+#   標頭 | 欄位名稱表 (每格 KEY_SIZE bytes) | 每個欄位一格 (seqlock 標頭 + 逐筆報價環形緩衝)
+HEADER = struct.Struct('<8sIII')  # 識別碼, 欄位上限, 環形緩衝筆數, 已登記欄位數
+MAGIC = b'PXBUS001'
+KEY_SIZE = 32
+SEQ = struct.Struct('<Q')
+# 序號之後：累計筆數, 最新價, 交易所事件時間 ms, 寫入時間
+SLOT = struct.Struct('<Qdqd')
+SLOT_HEAD = SEQ.size + SLOT.size
+
+class SharedPriceBus:
+    """跨行程的最新價看板：行情行程寫入、各 shard 行程直接讀共享記憶體 (不經過 pickle / Queue)
+    每個欄位以 seqlock 保護 (序號為奇數代表寫入中)，另附一段環形緩衝保存最近的逐筆報價
+    """
+
+    def __init__(self, name=None, create=False, slots=None, ring=None):
+        if create:
+            slots = slots or config.SHARD_BUS_SLOTS
+            ring = ring or config.SHARD_BUS_RING
+            size = HEADER.size + slots * KEY_SIZE + slots * (SLOT_HEAD + ring * 8)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+            self.shm.buf[:size] = bytes(size)
+            HEADER.pack_into(self.shm.buf, 0, MAGIC, slots, ring, 0)
+            atexit.register(self.close)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            magic, slots, ring, _ = HEADER.unpack_from(self.shm.buf, 0)
+            if magic != MAGIC:
+                raise ValueError(f"不是價格匯流排: {name}")
+        self.name = self.shm.name
+        self.slots = slots
+        self.ring = ring
+        self.owner = create
+        self._buf = self.shm.buf
+        self._index = {}  # key -> 欄位編號
+        self._seqs = [0] * slots    # 寫入端自己記住的序號與筆數，不必回讀共享記憶體
+        self._counts = [0] * slots
+
+    def _slot_offset(self, i):
+        return HEADER.size + self.slots * KEY_SIZE + i * (SLOT_HEAD + self.ring * 8)
+
+    # --- 寫入端 (只應由行情執行緒呼叫) ---
+    def write(self, key, price, event_ms=0):
+        i = self._index.get(key)
+        if i is None:
+            i = self._register(key)
+            if i is None:
+                return
+        buf, off = self._buf, self._slot_offset(i)
+        seq = self._seqs[i] + 1
+        count = self._counts[i]
+        SEQ.pack_into(buf, off, seq)  # 奇數：寫入中
+        struct.pack_into('<d', buf, off + SLOT_HEAD + (count % self.ring) * 8, price)
+        SLOT.pack_into(buf, off + SEQ.size, count + 1, price, event_ms, time.time())
+        SEQ.pack_into(buf, off, seq + 1)
+        self._seqs[i] = seq + 1
+        self._counts[i] = count + 1
+
+    def _register(self, key):
+        n = len(self._index)
+        if n >= self.slots:
+            print(f"[PriceBus] 欄位已滿，{key} 不會發佈到 shard")
+            self._index[key] = None
+            return None
+        name = key.encode()[:KEY_SIZE]
+        self._buf[HEADER.size + n * KEY_SIZE:HEADER.size + n * KEY_SIZE + len(name)] = name
+        self._index[key] = n
+        # 名稱寫好之後才增加欄位數，讀取端看到新欄位時名稱一定完整
+        HEADER.pack_into(self._buf, 0, MAGIC, self.slots, self.ring, n + 1)
+        return n
+
+    # --- 讀取端 ---
+    def keys(self):
+        """目前已登記的欄位 (依編號排列)"""
+        n = HEADER.unpack_from(self._buf, 0)[3]
+        out = []
+        for i in range(n):
+            raw = bytes(self._buf[HEADER.size + i * KEY_SIZE:HEADER.size + (i + 1) * KEY_SIZE])
+            out.append(raw.rstrip(b'\x00').decode())
+        return out
+
+    def read(self, i):
+        """以 seqlock 讀取一格：(累計筆數, 最新價, 交易所事件時間 ms, 寫入時間)"""
+        buf, off = self._buf, self._slot_offset(i)
+        while True:
+            seq = SEQ.unpack_from(buf, off)[0]
+            if seq & 1:
+                continue
+            values = SLOT.unpack_from(buf, off + SEQ.size)
+            if SEQ.unpack_from(buf, off)[0] == seq:
+                return values
+
+    def ring_view(self, i):
+        """環形緩衝的零複製 double 視圖 (用完須 release)"""
+        off = self._slot_offset(i) + SLOT_HEAD
+        with self._buf[off:off + self.ring * 8] as raw:
+            return raw.cast('d')
+
+    def close(self):
+        if self._buf is None:
+            return
+        self._buf = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+
+class BusReader:
+    """shard 行程端：追蹤每個欄位讀到哪一筆，poll() 取出新的逐筆報價"""
+
+    def __init__(self, bus):
+        self.bus = bus
+        self._keys = []
+        self._views = []
+        self._pos = []
+
+    def poll(self):
+        """回傳 [(key, [新報價 舊->新], 最新一筆的交易所時間 ms)]"""
+        bus = self.bus
+        if HEADER.unpack_from(bus._buf, 0)[3] != len(self._keys):
+            keys = bus.keys()
+            for i in range(len(self._keys), len(keys)):
+                self._views.append(bus.ring_view(i))
+                # 新 shard 從目前這一筆開始讀，不重播舊報價
+                self._pos.append(max(0, bus.read(i)[0] - 1))
+            self._keys = keys
+        out = []
+        ring = bus.ring
+        for i, key in enumerate(self._keys):
+            count, price, event_ms, _ = bus.read(i)
+            pos = self._pos[i]
+            if count == pos:
+                continue
+            n = min(count - pos, ring)
+            start = (count - n) % ring
+            view = self._views[i]
+            if start + n <= ring:
+                prices = view[start:start + n].tolist()
+            else:
+                prices = view[start:].tolist() + view[:start + n - ring].tolist()
+            # 讀取期間被寫入端追上 (落後超過整圈) 的舊資料不可靠，只保留最新價
+            if bus.read(i)[0] - (count - n) > ring:
+                prices = [price]
+            self._pos[i] = count
+            out.append((key, prices, event_ms))
+        return out
+
+    def close(self):
+        for view in self._views:
+            view.release()
+        self._views = []
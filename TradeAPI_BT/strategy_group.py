@@ -0,0 +1,99 @@
+import threading
+import time
+
+# 只影響下單數量或個別帳戶的參數，不影響觸發價與進場判斷，分組時忽略
+ACCOUNT_PARAMS = ("direction", "order_mode", "fixed_qty", "trade_pct")
+DAY_MS = 86400000
+
+def group_key(worker):
+    """(幣種, 策略, 參數) 相同的 Worker 屬於同一組"""
+    params = tuple(sorted((k, v) for k, v in worker.params.items() if k not in ACCOUNT_PARAMS))
+    return (worker.symbol, worker.strategy_name, params)
+
+class StrategyGroup:
+    """同組帳戶共用一份觸發價與進場判斷：每天只算一次觸發價，每筆穿越只判斷一次，再把進場訊號分送給空手的成員
+    每個成員仍各自保有持倉、停損與移停狀態，也各自依方向設定過濾訊號
+    """
+
+    def __init__(self, key, board, tolerance):
+        self.key = key
+        self.symbol = key[0]
+        self.board = board
+        self.tolerance = tolerance
+        self.members = []  # 整份替換，行情執行緒迭代時免鎖
+        self.long_trigger = float('inf')
+        self.short_trigger = 0.0
+        self._levels = None
+        self._day = None
+        self._lock = threading.Lock()
+        self._tape = board.subscribe(self.symbol)
+
+    def add(self, worker):
+        with self._lock:
+            self.members = self.members + [worker]
+
+    def remove(self, worker):
+        with self._lock:
+            self.members = [w for w in self.members if w is not worker]
+            if not self.members and self._tape is not None:
+                self.board.triggers.disarm(self.symbol, self.wake)
+                self.board.unsubscribe(self.symbol, self._tape)
+                self._tape = None
+
+    def levels(self, compute, now=None):
+        """同一天只由第一個成員計算 (REST/日 K 簿)，其餘成員直接沿用
+        :param compute: 成員自己的計算函式，回傳 (多單觸發價, 空單觸發價) 或 None (資料未同步)
+        :param now: [新增] 成員時鐘的目前時間 (秒)，replay 時為行情時間；未傳入時用系統時間
+        """
+        day = int((now or time.time()) * 1000) // DAY_MS
+        with self._lock:
+            if self._levels is None or self._day != day:
+                levels = compute()
+                if levels is None:
+                    return None
+                self._levels, self._day = levels, day
+                self.long_trigger, self.short_trigger = levels
+                if self._tape is not None:
+                    # [修正] 丟棄登記新觸發價之前的報價，wake() 只判斷之後的報價 (否則舊報價可能被當成反向穿越)
+                    self._tape.drain()
+                    tol = self.tolerance
+                    self.board.triggers.arm(self.symbol, self.wake, [self.long_trigger, self.long_trigger * (1 + tol), self.short_trigger * (1 - tol), self.short_trigger])
+            return self._levels
+
+    def wake(self):
+        """觸發價被穿越時由行情執行緒呼叫：判斷一次進場條件，分送給空手且方向相符的成員"""
+        ticks = self._tape.drain() if self._tape is not None else []
+        long_t, short_t, tol = self.long_trigger, self.short_trigger, self.tolerance
+        long_hit = short_hit = None
+        for i, price in enumerate(ticks):
+            if long_hit is None and long_t <= price <= long_t * (1 + tol):
+                long_hit = (i, price, "BUY")
+            if short_hit is None and short_t * (1 - tol) <= price <= short_t:
+                short_hit = (i, price, "SELL")
+        if long_hit is None and short_hit is None:
+            return
+        for worker in self.members:
+            if worker.in_position:
+                continue
+            hits = [h for h, ok in ((long_hit, worker.can_long), (short_hit, worker.can_short)) if h and ok]
+            if hits:
+                _, price, side = min(hits)
+                worker.offer_signal(price, side)
+
+class StrategyGroups:
+    """分組登記表 (每個 MainWindow 一份)"""
+
+    def __init__(self, board):
+        self.board = board
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def join(self, worker):
+        key = group_key(worker)
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None or group._tape is None:
+                group = self._groups[key] = StrategyGroup(key, self.board, worker.ENTRY_TOLERANCE)
+            group.add(worker)
+        worker.group = group
+        return group
@@ -0,0 +1,26 @@
+from price_board import PriceBoard
+from strategy_group import StrategyGroup
+
+class Member:
+    """只記錄收到的進場訊號的成員"""
+    in_position = False
+    can_long = True
+    can_short = True
+
+    def __init__(self):
+        self.signals = []
+
+    def offer_signal(self, price, side):
+        self.signals.append((side, price))
+
+def test_ticks_before_levels_are_not_evaluated():
+    """登記觸發價之前的報價不可在之後第一次穿越時被當成訊號 (曾送出反方向的 SELL @ 100.0)"""
+    board = PriceBoard()
+    group = StrategyGroup(("BTCUSDT", "BT", ()), board, 0.0001)
+    member = Member()
+    group.add(member)
+    for price in (150.0, 100.0, 150.0, 180.0):
+        board.publish("BTCUSDT", price)
+    group.levels(lambda: (200.0, 100.0), now=0)
+    board.publish("BTCUSDT", 200.01)
+    assert member.signals == [("BUY", 200.01)]
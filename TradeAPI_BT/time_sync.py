@@ -0,0 +1,132 @@
+import collections
+import threading
+import time
+from datetime import datetime
+from binance.client import Client
+import config
+from clock import RealClock
+
+class TimeSync:
+    """交易所時間校正服務：背景每 TIME_SYNC_INTERVAL_S 秒取樣伺服器時間，全行程共用一個估計值
+    每次取樣連打 TIME_SYNC_BURST 次，只留往返時間 (RTT) 最短的一筆，時間差以請求送出與收到的中點計算 (扣掉單程延遲)
+    最近 TIME_SYNC_WINDOW 筆中 RTT 最短者為基準，再以整個視窗的線性回歸估計本機時鐘漂移，兩次取樣之間依漂移外推
+    """
+
+    def __init__(self, testnet=False):
+        self.testnet = testnet
+        self._samples = collections.deque(maxlen=config.TIME_SYNC_WINDOW)  # (本機時間 秒, 時間差 毫秒, RTT 毫秒)
+        self._model = (0.0, 0.0, 0.0)  # (基準本機時間 秒, 基準時間差 毫秒, 漂移 毫秒/秒)，整組替換，讀取免鎖
+        self._lock = threading.Lock()
+        self._first = threading.Lock()  # 第一次校正只做一次
+        self._listeners = []
+        self._thread = None
+        self.rtt_ms = 0.0
+        self.synced = 0.0  # 上次成功取樣的時間，0 = 尚未校正
+
+    def offset_ms(self, t=None):
+        """交易所時間 - 本機時間 (毫秒)，含漂移外推"""
+        ref, base, drift = self._model
+        return base + drift * ((time.time() if t is None else t) - ref)
+
+    def time(self):
+        """目前的交易所時間 (秒)"""
+        t = time.time()
+        ref, base, drift = self._model
+        return t + (base + drift * (t - ref)) / 1000
+
+    def sample(self, client):
+        """取樣一輪並更新估計值 (可由任何執行緒呼叫)"""
+        best = None
+        for _ in range(config.TIME_SYNC_BURST):
+            t0 = time.time()
+            server_ms = client.futures_time()['serverTime']
+            t1 = time.time()
+            rtt = (t1 - t0) * 1000
+            if best is None or rtt < best[2]:
+                best = ((t0 + t1) / 2, server_ms - (t0 + t1) * 500, rtt)
+        with self._lock:
+            self._samples.append(best)
+            self._model = self._fit(list(self._samples))
+            self.rtt_ms = best[2]
+            self.synced = time.time()
+            listeners = list(self._listeners)
+        offset = self.offset_ms()
+        for fn in listeners:
+            fn(offset)
+        return offset
+
+    @staticmethod
+    def _fit(samples):
+        """RTT 最短的取樣為基準；取樣涵蓋 TIME_SYNC_DRIFT_SPAN_S 秒以上才估計漂移 (太短的區間誤差比漂移本身大)"""
+        ref, base, min_rtt = min(samples, key=lambda s: s[2])
+        drift = 0.0
+        # 排除 RTT 明顯偏長的取樣 (網路壅塞時中點估計不準)
+        good = [s for s in samples if s[2] <= 2 * min_rtt + 1]
+        if len(good) >= 3 and good[-1][0] - good[0][0] >= config.TIME_SYNC_DRIFT_SPAN_S:
+            n = len(good)
+            mt = sum(s[0] for s in good) / n
+            mo = sum(s[1] for s in good) / n
+            var = sum((s[0] - mt) ** 2 for s in good)
+            if var > 0:
+                drift = sum((s[0] - mt) * (s[1] - mo) for s in good) / var
+                drift = max(-config.TIME_SYNC_MAX_DRIFT, min(config.TIME_SYNC_MAX_DRIFT, drift))
+        return ref, base, drift
+
+    def listen(self, fn):
+        """註冊時間差更新通知 fn(offset_ms)，註冊時立即以目前的值呼叫一次"""
+        with self._lock:
+            self._listeners.append(fn)
+        fn(self.offset_ms())
+
+    def ensure(self, client):
+        """尚未校正過時以呼叫端的 client 同步取樣一次，並啟動背景校正"""
+        if not self.synced:
+            with self._first:
+                if not self.synced:
+                    self.sample(client)
+        self.start()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="TimeSync")
+                self._thread.start()
+
+    def _run(self):
+        client = None
+        due = self.synced + config.TIME_SYNC_INTERVAL_S
+        while True:
+            time.sleep(max(1.0, due - time.time()))
+            try:
+                if client is None:
+                    client = Client(testnet=self.testnet, ping=False)  # 公開資料，不需要 API Key
+                self.sample(client)
+                due = time.time() + config.TIME_SYNC_INTERVAL_S
+            except Exception as e:
+                print(f"[TimeSync] 校正失敗，沿用目前估計值: {e}")
+                due = time.time() + 5
+
+class ExchangeClock(RealClock):
+    """以交易所時間運作的實盤時鐘：換日判斷與等待都對齊交易所的日 K 邊界，不受本機時鐘誤差影響"""
+
+    def __init__(self, sync):
+        self.sync = sync
+
+    def time(self):
+        return self.sync.time()
+
+    def now(self):
+        return datetime.fromtimestamp(self.sync.time())
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_sync(testnet=False):
+    """同一行程共用的校正服務 (正式網 / 測試網各一份)"""
+    with _shared_lock:
+        sync = _shared.get(testnet)
+        if sync is None:
+            sync = _shared[testnet] = TimeSync(testnet)
+        return sync
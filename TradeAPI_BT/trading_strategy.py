@@ -1,26 +1,67 @@
+import asyncio
+import threading
 import time
 import json
 import os
 import hashlib
-from datetime import datetime
-from PySide6.QtCore import QObject, Signal
-from market_utils import get_breakout_levels, get_symbol_rules, round_step_size
+from datetime import datetime, timedelta
+from events import EventSignal
+import config
+from latency import allocated_blocks
+from clock import REAL_CLOCK
+from rest_scheduler import urgent
+from exchange_info_cache import cache_for
+from market_utils import get_breakout_levels, calc_breakout_levels, get_symbol_rules, round_step_size
+from price_board import get_price_sources, board_key
 
 STATE_FOLDER = "position_states"
 
-class TradingWorker(QObject):
-    price_update = Signal(float)
-    log_update = Signal(str)
-    finished = Signal()
+class TradingWorker:
+    # [修改] 改用純 Python 的 EventSignal，策略核心不再依賴 PySide6 (GUI 端經由 QtInvoker 回到主執行緒)
+    price_update = EventSignal(float)
+    log_update = EventSignal(str)
+    finished = EventSignal()
+    ENTRY_TOLERANCE = 0.0001  # [新增] 進場容許範圍 (觸發價之後多少比例內才進場)
 
-    def __init__(self, client, params, symbol, strategy_name="BT", wait_for_reset=False):
-        super().__init__()
+    def __init__(self, client, params, symbol, strategy_name="BT", wait_for_reset=False, price_board=None, kline_book=None, clock=None):
         self.client = client
         self.params = params
+        self.prepare_params()
+        # [新增] 所有時間判斷 (換日、每日次數重置、等待) 都經由時鐘，replay 時換成 VirtualClock 即可快轉
+        self.clock = clock or REAL_CLOCK
         self.symbol = symbol
         self.strategy_name = strategy_name # 儲存策略名稱
         self.is_running = False
         self.curr_price = 0.0
+        self.feed_stale = False  # [新增] 行情中斷時暫停進場，直到收到新報價
+        self.price_board = price_board  # [新增] 共用最新價看板 (免鎖讀取)
+        self._board_seq = 0
+        # [新增] 停損/移停可使用與進場不同的報價來源 (見 config.PRICE_SOURCES)
+        sources = get_price_sources(symbol)
+        self._stop_key = board_key(symbol, "stop") if sources["stop"] != sources["entry"] else None
+        self.stop_price = 0.0
+        self._stop_seq = 0
+        # [新增] 報價喚醒：行情執行緒寫入報價帶後通知，Worker 以等待取代固定 sleep
+        self._wake = threading.Event()
+        self._aio_loop = None  # 協程版執行中的事件迴圈
+        self._aio_wake = None
+        # [新增] 逐筆報價帶：兩次評估之間的每一筆報價都會拿來判斷進場與移停，不再只看取樣價
+        self._tape = price_board.subscribe(symbol) if price_board is not None else None
+        self._stop_tape = price_board.subscribe(self._stop_key) if price_board is not None and self._stop_key else None
+        self.kline_book = kline_book  # [新增] 串流日 K 簿，換日時免 REST
+        # [新增] 策略群組：同參數帳戶共用觸發價與進場判斷 (由 StrategyGroups.join 設定)
+        self.group = None
+        self._group_signal = None
+        # [新增] Watchdog 監控用的心跳與迴圈耗時
+        self.heartbeat = 0.0     # 最近一次進入迴圈的時間
+        self.loop_latency = 0.0  # 單輪耗時 (秒，指數平均，不含 sleep)
+        self.loop_max = 0.0      # 單輪耗時最大值 (Watchdog 讀取後歸零)
+        self.loop_errors = 0     # 迴圈例外次數
+        # [新增] 低延遲模式：每輪新增的記憶體區塊 (指數平均 / 最大值，Watchdog 讀取後歸零)
+        self.loop_allocs = 0.0
+        self.loop_alloc_max = 0
+        self._blocks = 0
+        self._next_day_ts = 0.0  # [新增] 下一次本地換日 (午夜) 的時間戳，到了才重新格式化日期
         
         if not os.path.exists(STATE_FOLDER):
             os.makedirs(STATE_FOLDER)
@@ -55,7 +96,7 @@ class TradingWorker(QObject):
         self.init_rules()
 
     def init_rules(self):
-        """[優化] 預先獲取並快取交易規則"""
+        """[優化] 預先載入交易規則 (共用快取冷啟動時才下載一次)"""
         try:
             self.symbol_rules = get_symbol_rules(self.client, self.symbol)
             if self.symbol_rules:
@@ -65,6 +106,21 @@ class TradingWorker(QObject):
         except Exception as e:
             self.safe_emit_log(f"⚠️ 初始化規則失敗: {e}")
 
+    def prepare_params(self):
+        """[新增] 把判斷路徑每輪都會用到的參數先換算成倍率 (之後不再查字典與做除法)；更換 params 後需重新呼叫"""
+        p = self.params
+        direction = p.get('direction', 'BOTH')
+        self.can_long = direction in ("BOTH", "LONG")
+        self.can_short = direction in ("BOTH", "SHORT")
+        # 進場區間：多單 [觸發價, 觸發價 × long_tol]，空單 [觸發價 × short_tol, 觸發價]
+        self.long_tol = 1 + self.ENTRY_TOLERANCE
+        self.short_tol = 1 - self.ENTRY_TOLERANCE
+        # 依方向：(硬停損, 移停啟動, 移停回撤) 相對於參考價/極值的倍率
+        self.exit_mults = {
+            "BUY": (1 - p['long_sl'] / 100, 1 + p['long_ttp_trig'] / 100, 1 - p['long_ttp_call'] / 100),
+            "SELL": (1 + p['short_sl'] / 100, 1 - p['short_ttp_trig'] / 100, 1 + p['short_ttp_call'] / 100),
+        }
+
     def safe_emit_log(self, msg):
         try:
             self.log_update.emit(msg)
@@ -100,7 +156,7 @@ class TradingWorker(QObject):
                     self.sl_price = data.get("sl_price", 0.0)
                     self.last_trade_date = data.get("last_trade_date", "")
                     
-                    today = datetime.now().strftime("%Y-%m-%d")
+                    today = self.clock.now().strftime("%Y-%m-%d")
                     if self.last_trade_date != today:
                         self.daily_trades = 0
                         self.last_trade_date = today
@@ -123,94 +179,294 @@ class TradingWorker(QObject):
         self.extreme_price = 0.0
         self.ttp_active = False
         self.sl_price = 0.0
+        self._group_signal = None
         self.save_state()
         self.safe_emit_log(">>> [系統] 持倉標記已重置")
 
     def run(self):
         self.is_running = True
         while self.is_running:
+            loop_start = self.beat()
             try:
-                # 1. 檢查換日邏輯 (原本就有，保留)
-                today = datetime.now().strftime("%Y-%m-%d")
-                if self.last_trade_date != today:
-                    self.last_trade_date = today
-                    self.daily_trades = 0
-                    self.save_state()
-
-                # 2. 換日 K 線精準對齊與輪詢邏輯
-                now_ms = int(time.time() * 1000)
-                # 如果尚未初始化換日時間，先抓一次目前的 K 線結束時間作為目標
-                if self.next_rollover_ms == 0:
-                    klines = self.client.futures_klines(symbol=self.symbol, interval='1d', limit=1)
-                    if klines:
-                        # 這是為了讓你一啟動就能看到目前的突破位
-                        self.last_candle_open_time = klines[0][0]
-                        self.update_breakout_levels()
-                        # 設定下一次精準換日的目標時間 (closeTime + 1ms)
-                        self.next_rollover_ms = klines[0][6] + 1 # closeTime + 1ms 就是換日時間
-                        self.safe_emit_log(f"🚀 [系統] 策略已啟動，目標換日時間: {datetime.fromtimestamp(self.next_rollover_ms/1000).strftime('%Y-%m-%d %H:%M:%S')}")
+                if not self.step():
+                    self.wait_tick(0.5) # 若還沒收到第一次價格，先等待
+                    continue
+                self.note_loop(loop_start)
                 
-                # 當系統時間到達或超過預期的換日時間時，開始向幣安「輪詢」
-                if now_ms >= self.next_rollover_ms:
-                    # 請求最新一根 K 線，確認它的 openTime 是否已經跳轉
-                    klines = self.client.futures_klines(symbol=self.symbol, interval='1d', limit=1)
-                    
-                    # 必須確認 K 線的 Open Time 確實大於等於目標時間
-                    if klines and klines[0][0] >= self.next_rollover_ms:
-                        
-                        # [修正] 只有 update_breakout_levels 回傳 True (資料驗證成功) 才推進時間
-                        if self.update_breakout_levels():
-                            self.last_candle_open_time = klines[0][0]
-                            self.next_rollover_ms = klines[0][6] + 1 # 設定明天的換日目標
-                            self.safe_emit_log(f"⏰ [系統] 偵測到換日成功，已重新計算策略邊界 ({self.symbol})")
-                        else:
-                            # 資料還沒同步，休息 1 秒後重試
-                            time.sleep(1)
-                            
-                    else:
-                        # 幣安 API 尚未產出新 K 線，繼續輪詢
-                        pass
+                # [修改] 等到下一筆報價才評估 (沒有報價時最多等到例行檢查或換日時間)，不再固定 sleep 1 秒
+                self.wait_tick()
+            except Exception as e:
+                self.loop_errors += 1
+                self.safe_emit_log(f"循環異常: {e}")
+                self.clock.sleep(2)
+        self.finished.emit()
+
+    def step(self):
+        """[新增] 主迴圈的一輪 (不含等待)：換日 → 讀取報價 → 進出場判斷；尚未收到任何報價時回傳 False
+        replay.py 以虛擬時鐘逐筆呼叫，回測與實盤走同一段程式
+        """
+        # 1. 檢查換日邏輯 (原本就有，保留)
+        self.roll_trade_date()
+
+        # 2. 換日 K 線精準對齊與輪詢邏輯
+        now_ms = int(self.clock.time() * 1000)
+        # 如果尚未初始化換日時間，先抓一次目前的 K 線結束時間作為目標
+        if self.next_rollover_ms == 0:
+            # [修改] 優先使用串流日 K 簿 (資料不足時由簿補一次歷史)，沒有才呼叫 REST
+            klines = self.book_klines() or self.client.futures_klines(symbol=self.symbol, interval='1d', limit=1)
+            if klines:
+                self.start_levels(klines)
+        
+        # 當系統時間到達或超過預期的換日時間時，開始向幣安「輪詢」
+        if now_ms >= self.next_rollover_ms:
+            # [修改] 先看串流日 K 簿是否已換日 (不耗 REST 權重)
+            klines, need_rest = self.book_rollover(now_ms)
+            if need_rest:
+                # 請求最新一根 K 線，確認它的 openTime 是否已經跳轉
+                klines = self.client.futures_klines(symbol=self.symbol, interval='1d', limit=1)
+            
+            # 必須確認 K 線的 Open Time 確實大於等於目標時間
+            if klines and klines[0][0] >= self.next_rollover_ms:
                 
-                # 3. [核心修改] 獲取價格：不再呼叫 API，改用緩存的價格
+                # [修正] 只有 update_breakout_levels 回傳 True (資料驗證成功) 才推進時間
+                if self.update_breakout_levels():
+                    self.advance_rollover(klines)
+                else:
+                    # 資料還沒同步，休息 1 秒後重試
+                    self.clock.sleep(1)
+                    
+            else:
+                # 幣安 API 尚未產出新 K 線，繼續輪詢
+                pass
+        
+        # 3. [核心修改] 獲取價格：不再呼叫 API，改用緩存的價格
+        self.pull_board_price()
+        if self.curr_price <= 0:
+            return False
+        curr_price = self.curr_price
+        # 原有的訊號與策略邏輯
+        self.price_update.emit(curr_price)
+        
+        entry_ticks, stop_ticks = self.drain_ticks(curr_price)
+        if not self.in_position:
+            signal = self.check_entry(entry_ticks)
+            if signal:
+                with urgent():  # [新增] 進出場的請求 (含下單前查餘額) 走下單車道
+                    self.execute_entry(*signal)
+        else:
+            # [修改] 每一筆報價都更新極值與停損，出場後其餘較舊的報價不再使用
+            for price in stop_ticks:
+                if self.manage_position(price):
+                    with urgent():  # [新增] 平倉走下單車道
+                        self.close_position()
+                    break
+        self.arm_triggers()  # [新增] 只在關注的價位被穿越時才被喚醒
+        return True
+
+    async def run_async(self, aclient):
+        """[新增] 協程版主迴圈 (由 AsyncEngine 在共用事件迴圈上執行)
+        判斷邏輯與 run() 共用，REST 改用 AsyncClient，等待報價改用 asyncio.Event
+        """
+        self._aio_wake = asyncio.Event()
+        self._aio_loop = asyncio.get_running_loop()
+        self.is_running = True
+        while self.is_running:
+            loop_start = self.beat()
+            try:
+                self.roll_trade_date()
+                await self.check_rollover_async(aclient, int(self.clock.time() * 1000))
+
+                self.pull_board_price()
                 if self.curr_price <= 0:
-                    time.sleep(0.5) # 若還沒收到第一次價格，先等待
+                    await self.wait_tick_async(0.5)
                     continue
                 curr_price = self.curr_price
-                # 原有的訊號與策略邏輯
                 try:
                     self.price_update.emit(curr_price)
                 except RuntimeError:
                     break
-                
+
+                entry_ticks, stop_ticks = self.drain_ticks(curr_price)
                 if not self.in_position:
-                    if self.wait_for_reset:
-                        if self.check_global_clear():
-                            self.wait_for_reset = False
-                    
-                    if not self.wait_for_reset:
-                        direction = self.params.get('direction', 'BOTH')
-                        # 0.01% 的極小容許範圍判斷進場
-                        tolerance = 0.0001 
-                        
-                        can_long = direction in ["BOTH", "LONG"]
-                        can_short = direction in ["BOTH", "SHORT"]
-                        
-                        if can_long and (self.long_trigger <= curr_price <= (self.long_trigger * (1 + tolerance))):
-                            self.execute_entry(curr_price, "BUY")
-                        elif can_short and ((self.short_trigger * (1 - tolerance)) <= curr_price <= self.short_trigger):
-                            self.execute_entry(curr_price, "SELL")
+                    signal = self.check_entry(entry_ticks)
+                    if signal:
+                        with urgent():  # [新增] 進出場的請求 (含下單前查餘額) 走下單車道
+                            await self.execute_entry_async(aclient, *signal)
                 else:
-                    self.manage_position(curr_price)
-                
-                for _ in range(10): # 1秒的 sleep 分割成 10 次，提高響應速度
-                    if not self.is_running:
-                        break
-                    time.sleep(0.1)
+                    for price in stop_ticks:
+                        if self.manage_position(price):
+                            with urgent():  # [新增] 平倉走下單車道
+                                await self.close_position_async(aclient)
+                            break
+                self.arm_triggers()  # [新增] 只在關注的價位被穿越時才被喚醒
+                self.note_loop(loop_start)
+                await self.wait_tick_async()
             except Exception as e:
+                self.loop_errors += 1
                 self.safe_emit_log(f"循環異常: {e}")
-                time.sleep(2)
+                await asyncio.sleep(2)
+        self._aio_loop = None
         self.finished.emit()
 
+    async def check_rollover_async(self, aclient, now_ms):
+        """[新增] 換日邏輯的協程版本：日 K 簿優先，需要 REST 時以 AsyncClient 一次抓齊回看天數"""
+        need = self.lookback_days()
+        ready = self.kline_book is not None and await self.kline_book.ensure_async(aclient, self.symbol, need)
+        klines = [self.kline_book.live(self.symbol)] if ready else None
+        closed = self.book_closed() if ready else None
+
+        if self.next_rollover_ms == 0:
+            if not ready:
+                rows = await aclient.futures_klines(symbol=self.symbol, interval='1d', limit=need + 1)
+                klines, closed = rows[-1:], rows[:-1]
+            if klines:
+                self.start_levels(klines, closed)
+            return
+
+        if now_ms >= self.next_rollover_ms:
+            if not (klines and klines[0][0] >= self.next_rollover_ms):
+                if ready and now_ms < self.next_rollover_ms + config.KLINE_BOOK_GRACE_MS:
+                    return  # 串流通常在換日後數百毫秒內帶來新 K 線，先等待
+                rows = await aclient.futures_klines(symbol=self.symbol, interval='1d', limit=need + 1)
+                klines, closed = rows[-1:], rows[:-1]
+            if klines and klines[0][0] >= self.next_rollover_ms:
+                # 日 K 簿尚未收到換日前最後一根時不改走同步 REST，視為資料未同步，下一輪再試
+                if self.update_breakout_levels(closed if closed is not None else []):
+                    self.advance_rollover(klines)
+                else:
+                    await asyncio.sleep(1)
+
+    async def execute_entry_async(self, aclient, price, side):
+        """[新增] execute_entry 的 AsyncClient 版本 (不支援測試單)"""
+        try:
+            acc_info = await aclient.futures_account()
+            if self.takeover_position(acc_info, price, side):
+                return
+            if cache_for(self.client).get(self.symbol) is not None:
+                rules = get_symbol_rules(self.client, self.symbol, price)
+            else:
+                # [修正] 快取未命中會同步下載 exchange info，移到執行緒，不卡住共用的事件迴圈
+                rules = await asyncio.to_thread(get_symbol_rules, self.client, self.symbol, price)
+            if not rules:
+                self.safe_emit_log(f"❌ 無法獲取交易規則，取消下單")
+                return
+            qty = self.entry_qty(acc_info, price, rules)
+            await aclient.futures_create_order(symbol=self.symbol, side=side, type='MARKET', quantity=qty)
+            self.record_entry(price, side, qty)
+        except Exception as e:
+            self.safe_emit_log(f"❌ 進場失敗: {e}")
+
+    async def close_position_async(self, aclient):
+        """[新增] close_position 的 AsyncClient 版本"""
+        try:
+            side_to_close = "SELL" if self.current_side == "BUY" else "BUY"
+            await aclient.futures_create_order(symbol=self.symbol, side=side_to_close, type='MARKET', quantity=self.position_qty, reduceOnly=True)
+            self.clear_state()
+            self.safe_emit_log("⏹️ 【策略已平倉】")
+        except Exception as e:
+            self.safe_emit_log(f"❌ 平倉失敗: {e}")
+
+    # --- [新增] 同步/協程版共用的判斷邏輯 (不呼叫 REST) ---
+    def roll_trade_date(self):
+        # [修改] 平常每輪只比較一次時間戳，跨過本地午夜才格式化日期 (不在每輪產生 datetime/字串)
+        if self.clock.time() < self._next_day_ts:
+            return
+        now = self.clock.now()
+        self._next_day_ts = datetime.combine(now.date() + timedelta(days=1), datetime.min.time()).timestamp()
+        today = now.strftime("%Y-%m-%d")
+        if self.last_trade_date != today:
+            self.last_trade_date = today
+            self.daily_trades = 0
+            self.save_state()
+
+    def start_levels(self, klines, closed=None):
+        """以今日 K 線初始化突破位與下一次換日時間"""
+        # 這是為了讓你一啟動就能看到目前的突破位
+        self.last_candle_open_time = klines[0][0]
+        self.update_breakout_levels(closed)
+        # 設定下一次精準換日的目標時間 (closeTime + 1ms)
+        self.next_rollover_ms = klines[0][6] + 1 # closeTime + 1ms 就是換日時間
+        self.safe_emit_log(f"🚀 [系統] 策略已啟動，目標換日時間: {datetime.fromtimestamp(self.next_rollover_ms/1000).strftime('%Y-%m-%d %H:%M:%S')}")
+
+    def book_rollover(self, now_ms):
+        """換日時先看日 K 簿：回傳 (今日 K 線或 None, 是否需要改用 REST 查詢)"""
+        klines = self.book_klines()
+        if klines and klines[0][0] >= self.next_rollover_ms:
+            return klines, False
+        # 串流通常在換日後數百毫秒內帶來新 K 線，寬限期內先等待
+        waiting = self.kline_book is not None and now_ms < self.next_rollover_ms + config.KLINE_BOOK_GRACE_MS
+        return None, not waiting
+
+    def advance_rollover(self, klines):
+        self.last_candle_open_time = klines[0][0]
+        self.next_rollover_ms = klines[0][6] + 1 # 設定明天的換日目標
+        self.safe_emit_log(f"⏰ [系統] 偵測到換日成功，已重新計算策略邊界 ({self.symbol})")
+
+    def check_entry(self, entry_ticks):
+        """逐筆檢查進場條件，回傳 (價格, 方向) 或 None"""
+        if self.wait_for_reset:
+            if self.check_global_clear():
+                self.wait_for_reset = False
+
+        # [新增] 同組帳戶由策略群組判斷進場，這裡只取用分送過來的訊號
+        signal, self._group_signal = self._group_signal, None
+
+        # [新增] 行情中斷後尚未收到新報價時，不做進場判斷
+        if self.wait_for_reset or self.feed_stale:
+            return None
+        if self.group is not None:
+            return signal
+        # 0.01% 的極小容許範圍判斷進場 (倍率已由 prepare_params 預先算好)
+        can_long, can_short = self.can_long, self.can_short
+        long_lo, short_hi = self.long_trigger, self.short_trigger
+        long_hi, short_lo = long_lo * self.long_tol, short_hi * self.short_tol
+        
+        # [修改] 逐筆檢查上次評估後的所有報價，區間內的穿越不會因取樣而漏掉
+        for price in entry_ticks:
+            if can_long and (long_lo <= price <= long_hi):
+                return price, "BUY"
+            elif can_short and (short_lo <= price <= short_hi):
+                return price, "SELL"
+        return None
+
+    def takeover_position(self, acc_info, price, side):
+        """交易所已有同方向倉位時直接接管，回傳 True 代表不需下單"""
+        existing_pos = next((p for p in acc_info['positions'] if p['symbol'] == self.symbol), None)
+        if existing_pos and float(existing_pos['positionAmt']) != 0:
+            current_amt = float(existing_pos['positionAmt'])
+            if (side == "BUY" and current_amt > 0) or (side == "SELL" and current_amt < 0):
+                self.safe_emit_log("⚠️ 偵測到已有倉位，自動接管。")
+                self.in_position = True
+                self.current_side = side
+                self.position_qty = abs(current_amt)
+                ref = self.long_trigger if (side=="BUY" and self.long_trigger != float('inf')) else (self.short_trigger if (side=="SELL" and self.short_trigger != 0) else price)
+                self.entry_price = ref
+                self.extreme_price = price
+                self.sl_price = ref * self.exit_mults[side][0]
+                self.save_state()
+                return True
+        return False
+
+    def entry_qty(self, acc_info, price, rules):
+        if self.params['order_mode'] == "FIXED":
+            return round_step_size(self.params['fixed_qty'], rules['stepSize'])
+        bal = next(float(a['walletBalance']) for a in acc_info['assets'] if a['asset'] == 'USDT')
+        return round_step_size((bal * (self.params['trade_pct'] / 100) * 20.0) / price, rules['stepSize'])
+
+    def record_entry(self, price, side, qty):
+        """下單成功後更新統計與持倉狀態"""
+        self.daily_trades += 1
+        self.total_trades += 1
+        self.last_trade_date = self.clock.now().strftime("%Y-%m-%d")
+        
+        ref = self.long_trigger if (side=="BUY" and self.long_trigger != float('inf')) else (self.short_trigger if (side=="SELL" and self.short_trigger != 0) else price)
+        self.sl_price = ref * self.exit_mults[side][0]
+        
+        self.in_position, self.current_side, self.position_qty = True, side, qty
+        self.entry_price, self.extreme_price, self.ttp_active = ref, price, False
+        self.save_state()
+        self.safe_emit_log(f"✅ 【成功進場】停損位:{self.sl_price:.2f}")
+
     def check_global_clear(self):
         """[修改] 只檢查自己的策略是否清空，不影響 MA 策略進場"""
         if os.path.exists(self.state_file):
@@ -218,25 +474,25 @@ class TradingWorker(QObject):
                 return not json.load(j).get("in_position", False)
         return True
 
-    def update_breakout_levels(self):
-        """計算突破位 - 嚴格驗證版"""
+    def update_breakout_levels(self, closed=None):
+        """計算突破位 - 嚴格驗證版
+        :param closed: [新增] 已收盤的日 K (協程版自行抓取後傳入)；未傳入時先看日 K 簿，再退回 REST
+        """
         try:
-            l = int(self.params['long_lookback'])
-            s = int(self.params['short_lookback'])
-            
-            # [修正] 傳入 self.next_rollover_ms 進行驗證
-            h, _ = get_breakout_levels(self.client, self.symbol, l, self.next_rollover_ms)
-            _, low = get_breakout_levels(self.client, self.symbol, s, self.next_rollover_ms)
+            # [新增] 同組帳戶 (幣種/策略/參數相同) 每天只由一個成員計算
+            if self.group is not None:
+                levels = self.group.levels(lambda: self.calc_trigger_levels(closed), self.clock.time())
+            else:
+                levels = self.calc_trigger_levels(closed)
             
             # 若獲取失敗 (None) 或資料過舊，回傳 False
-            if h is None or low is None:
+            if levels is None:
                 self.safe_emit_log(f"⚠️ 數據同步中，稍後重試...")
                 return False
 
-            self.long_trigger = h * (1 + self.params['long_buffer'] / 100)
-            self.short_trigger = low * (1 - self.params['short_buffer'] / 100)
+            self.long_trigger, self.short_trigger = levels
             
-            now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            now_str = self.clock.now().strftime("%Y-%m-%d %H:%M:%S")
             self.safe_emit_log(f"📅 [{now_str}] 每日換日更新 | 多單觸發: {self.long_trigger:.2f} | 空單觸發: {self.short_trigger:.2f}")
             return True # 更新成功
             
@@ -244,104 +500,115 @@ class TradingWorker(QObject):
             self.safe_emit_log(f"⚠️ 更新失敗: {e}")
             return False
 
+    def calc_trigger_levels(self, closed=None):
+        """[新增] 計算 (多單觸發價, 空單觸發價)，資料獲取失敗或過舊時回傳 None"""
+        l = int(self.params['long_lookback'])
+        s = int(self.params['short_lookback'])
+        
+        if closed is None:
+            closed = self.book_closed()
+        if closed is not None:
+            # [新增] 直接由記憶體中的已收盤日 K 計算
+            h, _ = calc_breakout_levels(closed, l)
+            _, low = calc_breakout_levels(closed, s)
+        else:
+            # [修正] 傳入 self.next_rollover_ms 進行驗證
+            h, _ = get_breakout_levels(self.client, self.symbol, l, self.next_rollover_ms)
+            _, low = get_breakout_levels(self.client, self.symbol, s, self.next_rollover_ms)
+        if h is None or low is None:
+            return None
+        return h * (1 + self.params['long_buffer'] / 100), low * (1 - self.params['short_buffer'] / 100)
+
+    def book_klines(self):
+        """[新增] 從日 K 簿取得今日 K 線 (格式同 futures_klines limit=1)，沒有日 K 簿時回傳 None"""
+        if self.kline_book is None:
+            return None
+        if not self.kline_book.ensure(self.client, self.symbol, self.lookback_days()):
+            return None
+        return [self.kline_book.live(self.symbol)]
+
+    def lookback_days(self):
+        """[新增] 計算觸發位需要的已收盤日 K 根數"""
+        return max(int(self.params['long_lookback']), int(self.params['short_lookback']))
+
+    def book_closed(self):
+        """[新增] 日 K 簿中的已收盤 K 線；尚未包含換日前最後一根時回傳 None (改走 REST)"""
+        if self.kline_book is None or not self.kline_book.has(self.symbol):
+            return None
+        closed = self.kline_book.closed(self.symbol)
+        if self.next_rollover_ms and (not closed or closed[-1][6] + 1 < self.next_rollover_ms):
+            return None
+        return closed
+
     def execute_entry(self, price, side, test_mode=False):
         try:
             acc_info = self.client.futures_account()
             
             # 非測試模式才檢查舊有倉位接管
-            if not test_mode:
-                existing_pos = next((p for p in acc_info['positions'] if p['symbol'] == self.symbol), None)
-                if existing_pos and float(existing_pos['positionAmt']) != 0:
-                    current_amt = float(existing_pos['positionAmt'])
-                    if (side == "BUY" and current_amt > 0) or (side == "SELL" and current_amt < 0):
-                        self.safe_emit_log("⚠️ 偵測到已有倉位，自動接管。")
-                        self.in_position = True
-                        self.current_side = side
-                        self.position_qty = abs(current_amt)
-                        ref = self.long_trigger if (side=="BUY" and self.long_trigger != float('inf')) else (self.short_trigger if (side=="SELL" and self.short_trigger != 0) else price)
-                        self.entry_price = ref
-                        self.extreme_price = price
-                        sl_pct = self.params['long_sl'] if side == "BUY" else self.params['short_sl']
-                        self.sl_price = ref * (1 - sl_pct/100) if side == "BUY" else ref * (1 + sl_pct/100)
-                        self.save_state()
-                        return
-
-            # [優化] 使用快取的規則
-            rules = self.symbol_rules or get_symbol_rules(self.client, self.symbol)
+            if not test_mode and self.takeover_position(acc_info, price, side):
+                return
+
+            # [修改] 交易規則由全行程共用快取查詢 (記憶體查詢，不下載 exchange info)
+            rules = get_symbol_rules(self.client, self.symbol, price)
             if not rules: return
             
             if not rules:
                  self.safe_emit_log(f"❌ 無法獲取交易規則，取消下單")
                  return
 
-            if self.params['order_mode'] == "FIXED":
-                qty = round_step_size(self.params['fixed_qty'], rules['stepSize'])
-            else:
-                bal = next(float(a['walletBalance']) for a in acc_info['assets'] if a['asset'] == 'USDT')
-                qty = round_step_size((bal * (self.params['trade_pct'] / 100) * 20.0) / price, rules['stepSize'])
+            qty = self.entry_qty(acc_info, price, rules)
             
             # 下單 (這會增加場上的總部位，例如 MA 0.002 + BT 0.002 = 0.004)
             self.client.futures_create_order(symbol=self.symbol, side=side, type='MARKET', quantity=qty)
             
             if test_mode:
-                now_str = datetime.now().strftime("%H:%M:%S")
+                now_str = self.clock.now().strftime("%H:%M:%S")
                 self.safe_emit_log(f"🧪 【測試單成交】 {side} {qty} @ {price:.2f} (未寫入狀態)")
                 return
 
-            self.daily_trades += 1
-            self.total_trades += 1
-            self.last_trade_date = datetime.now().strftime("%Y-%m-%d")
-            
-            ref = self.long_trigger if (side=="BUY" and self.long_trigger != float('inf')) else (self.short_trigger if (side=="SELL" and self.short_trigger != 0) else price)
-            sl_pct = self.params['long_sl'] if side == "BUY" else self.params['short_sl']
-            self.sl_price = ref * (1 - sl_pct/100) if side == "BUY" else ref * (1 + sl_pct/100)
-            
-            self.in_position, self.current_side, self.position_qty = True, side, qty
-            self.entry_price, self.extreme_price, self.ttp_active = ref, price, False
-            self.save_state()
-            self.safe_emit_log(f"✅ 【成功進場】停損位:{self.sl_price:.2f}")
+            self.record_entry(price, side, qty)
         except Exception as e:
             self.safe_emit_log(f"❌ 進場失敗: {e}")
 
     def manage_position(self, curr_price):
+        """[修改] 只做判斷，需要出場時回傳 True，由呼叫端執行平倉 (同步/協程版共用)"""
         side, ref = self.current_side, self.entry_price
-        sl_pct = self.params['long_sl'] if side == "BUY" else self.params['short_sl']
-        trig_pct = self.params['long_ttp_trig'] if side == "BUY" else self.params['short_ttp_trig']
-        call_pct = self.params['long_ttp_call'] if side == "BUY" else self.params['short_ttp_call']
+        sl_mult, trig_mult, call_mult = self.exit_mults[side]
 
-        if (side == "BUY" and curr_price <= ref * (1 - sl_pct/100)) or (side == "SELL" and curr_price >= ref * (1 + sl_pct/100)):
+        if (side == "BUY" and curr_price <= ref * sl_mult) or (side == "SELL" and curr_price >= ref * sl_mult):
             self.safe_emit_log(f"🚨 【硬停損觸發】現價 {curr_price:.2f}")
-            self.close_position()
-            return
+            return True
 
         if side == "BUY":
             if curr_price > self.extreme_price:
                 self.extreme_price = curr_price
                 if self.ttp_active:
-                    self.sl_price = self.extreme_price * (1 - call_pct/100)
+                    self.sl_price = self.extreme_price * call_mult
                 self.save_state()
-            if not self.ttp_active and curr_price >= ref * (1 + trig_pct/100):
+            if not self.ttp_active and curr_price >= ref * trig_mult:
                 self.ttp_active = True
-                self.sl_price = self.extreme_price * (1 - call_pct/100)
+                self.sl_price = self.extreme_price * call_mult
                 self.save_state()
                 self.safe_emit_log(f"🔥 【移停啟動】開始追蹤！")
             if self.ttp_active and curr_price <= self.sl_price:
                 self.safe_emit_log(f"💰 【移停獲利】出場: {curr_price:.2f}")
-                self.close_position()
+                return True
         else:
             if curr_price < self.extreme_price or self.extreme_price == 0:
                 self.extreme_price = curr_price
                 if self.ttp_active:
-                    self.sl_price = self.extreme_price * (1 + call_pct/100)
+                    self.sl_price = self.extreme_price * call_mult
                 self.save_state()
-            if not self.ttp_active and curr_price <= ref * (1 - trig_pct/100):
+            if not self.ttp_active and curr_price <= ref * trig_mult:
                 self.ttp_active = True
-                self.sl_price = self.extreme_price * (1 + call_pct/100)
+                self.sl_price = self.extreme_price * call_mult
                 self.save_state()
                 self.safe_emit_log(f"🔥 【移停啟動】開始追蹤！")
             if self.ttp_active and curr_price >= self.sl_price:
                 self.safe_emit_log(f"💰 【移停獲利】出場: {curr_price:.2f}")
-                self.close_position()
+                return True
+
+        return False
 
     def close_position(self):
         try:
@@ -352,9 +619,142 @@ class TradingWorker(QObject):
         except Exception as e:
             self.safe_emit_log(f"❌ 平倉失敗: {e}")
 
+    def beat(self):
+        """[新增] 迴圈心跳，回傳本輪開始時間"""
+        self.heartbeat = time.time()  # [修正] 心跳固定用本機時間，與 Watchdog 的 time.time() 同一基準 (Worker 時鐘可能是交易所時間)
+        self._blocks = allocated_blocks()
+        return time.perf_counter()
+
+    def note_loop(self, loop_start):
+        """[新增] 記錄本輪迴圈耗時 (不含 sleep)"""
+        cost = time.perf_counter() - loop_start
+        self.loop_latency = cost if self.loop_latency == 0 else self.loop_latency * 0.9 + cost * 0.1
+        if cost > self.loop_max:
+            self.loop_max = cost
+        if self._blocks:
+            # [新增] 低延遲模式：本輪新增的記憶體區塊 (全行程淨增量，其他執行緒同時配置也會計入)
+            grown = allocated_blocks() - self._blocks
+            self.loop_allocs = self.loop_allocs * 0.9 + grown * 0.1
+            if grown > self.loop_alloc_max:
+                self.loop_alloc_max = grown
+
     def stop(self):
         self.is_running = False
+        self.wake()  # [新增] 立刻結束等待
+        if self.group is not None:
+            self.group.remove(self)
+        # [新增] 取消訂閱報價帶
+        if self._tape is not None:
+            self.price_board.unsubscribe(self.symbol, self._tape)
+            self.price_board.triggers.disarm(self.symbol, self.wake)
+        if self._stop_tape is not None:
+            self.price_board.unsubscribe(self._stop_key, self._stop_tape)
+            self.price_board.triggers.disarm(self._stop_key, self.wake)
+
+    def offer_signal(self, price, side):
+        """[新增] 策略群組分送的進場訊號 (由行情執行緒呼叫)"""
+        self._group_signal = (price, side)
+        self.wake()
+
+    def wake(self):
+        """[新增] 有新報價 (或要求停止) 時喚醒 Worker，可由任何執行緒呼叫"""
+        self._wake.set()
+        loop = self._aio_loop
+        if loop is not None and not self._aio_wake.is_set():
+            loop.call_soon_threadsafe(self._aio_wake.set)
+
+    def pending(self):
+        """[新增] 是否有尚未處理的喚醒 (觸發價被穿越、群組訊號或停止要求)；replay 以此決定何時跑一輪"""
+        return self._wake.is_set()
+
+    def idle_timeout(self):
+        """[新增] 沒有新報價時最多等待幾秒：固定的例行檢查間隔，且不超過下一次換日時間"""
+        timeout = config.WORKER_IDLE_WAKE
+        remaining = self.next_rollover_ms / 1000 - self.clock.time()
+        if 0 < remaining < timeout:
+            timeout = remaining
+        return timeout
+
+    def wait_tick(self, timeout=None):
+        """[新增] 等待下一筆報價、換日時間或停止要求 (取代固定 sleep)"""
+        if self.is_running:
+            self.clock.wait(self._wake, self.idle_timeout() if timeout is None else timeout)
+        # 先清旗標再讀報價帶，清除之後寫入的報價會再次喚醒
+        self._wake.clear()
+
+    async def wait_tick_async(self, timeout=None):
+        """[新增] wait_tick 的協程版本"""
+        if self.is_running:
+            try:
+                await asyncio.wait_for(self._aio_wake.wait(), self.idle_timeout() if timeout is None else timeout)
+            except asyncio.TimeoutError:
+                pass
+        self._aio_wake.clear()
+
+    def drain_ticks(self, curr_price):
+        """[新增] 取出上次評估之後的每一筆報價：(進場判斷用, 停損判斷用)，依時間先後排列
+        沒有訂閱報價帶 (例如手動下單的 Worker) 時退回只用目前的取樣價
+        """
+        if self._tape is None:
+            return [curr_price], [self.get_stop_price(curr_price)]
+        entry_ticks = self._tape.drain()
+        stop_ticks = self._stop_tape.drain() if self._stop_tape is not None else entry_ticks
+        return entry_ticks, stop_ticks
+
+    def trigger_levels(self):
+        """[新增] 目前需要被喚醒的價位：(進場報價的價位, 停損報價的價位)
+        空手時為進場區間的兩端；持倉時為硬停損、移停啟動價、移停出場價與目前極值 (創新高/新低要更新移停)
+        """
+        if not self.in_position:
+            if self.group is not None:
+                return [], []  # 進場價位由策略群組統一登記
+            levels = []
+            if self.can_long:
+                levels += [self.long_trigger, self.long_trigger * self.long_tol]
+            if self.can_short:
+                levels += [self.short_trigger * self.short_tol, self.short_trigger]
+            return levels, []
+        ref = self.entry_price
+        sl_mult, trig_mult, _ = self.exit_mults[self.current_side]
+        return [], [ref * sl_mult, self.extreme_price, self.sl_price if self.ttp_active else ref * trig_mult]
+
+    def arm_triggers(self):
+        """[新增] 把目前關注的價位登記到看板的觸發價索引 (價位沒變時不重建)"""
+        if self._tape is None:
+            return
+        entry_levels, stop_levels = self.trigger_levels()
+        triggers = self.price_board.triggers
+        if self._stop_key:
+            triggers.arm(self.symbol, self.wake, entry_levels)
+            triggers.arm(self._stop_key, self.wake, stop_levels)
+        else:
+            triggers.arm(self.symbol, self.wake, entry_levels or stop_levels)
 
     def update_price(self, price):
         """[新增] 由外部呼叫，更新當前價格"""
-        self.curr_price = price
\ No newline at end of file
+        self.curr_price = price
+        self.feed_stale = False
+
+    def pull_board_price(self):
+        """[新增] 從 PriceBoard 讀取最新價，只有序號變動 (真的有新報價) 才更新"""
+        if self.price_board is None:
+            return
+        slot = self.price_board.snapshot(self.symbol)
+        if slot and slot[3] != self._board_seq:
+            self._board_seq = slot[3]
+            self.update_price(slot[0])
+        if self._stop_key:
+            slot = self.price_board.snapshot(self._stop_key)
+            if slot and slot[3] != self._stop_seq:
+                self._stop_seq = slot[3]
+                self.stop_price = slot[0]
+
+    def get_stop_price(self, curr_price):
+        """[新增] 停損/移停判斷用的價格；未另外設定停損來源時與進場價相同"""
+        if self._stop_key and self.stop_price > 0:
+            return self.stop_price
+        return curr_price
+
+    def mark_feed_stale(self):
+        """[新增] 行情串流中斷時由外部呼叫，收到下一筆新報價前暫停進場"""
+        self.feed_stale = True
\ No newline at end of file
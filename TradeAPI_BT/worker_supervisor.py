@@ -0,0 +1,140 @@
+import itertools
+import threading
+import time
+import traceback
+import weakref
+import config
+import latency
+
+class WorkerSupervisor:
+    """Worker 生命週期管理：統一啟動 (執行緒或 AsyncEngine)、限制同時執行數量、停止後回收執行緒與連線
+    stop() 不會卡住呼叫端 (GUI)；結束超過 WORKER_JOIN_TIMEOUT 仍未退出的由 reap() 回報
+    """
+
+    def __init__(self, engine=None, max_workers=None):
+        self.engine = engine
+        self.max_workers = max_workers or config.WORKER_MAX_THREADS
+        self._jobs = {}     # 編號 -> [worker 或 None, 執行緒或 future, 停止時間 (0 = 執行中), 名稱]
+        self._by_worker = {}  # id(worker) -> 編號
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._objects = weakref.WeakSet()  # 所有交給過本物件的 Worker，回收後會自動消失
+        self.started = 0
+        self.finished = 0
+
+    def full(self):
+        return len(self._jobs) >= self.max_workers
+
+    def start(self, worker, api_key=None, api_secret=None, testnet=False):
+        """啟動常駐 Worker；已達上限時不啟動並回傳 False"""
+        job = self._register(worker, f"{worker.symbol}-{worker.strategy_name}")
+        if job is None:
+            return False
+        if self.engine is not None:
+            future = self.engine.submit(worker, api_key, api_secret, testnet)
+            self._jobs[job][1] = future
+            future.add_done_callback(lambda f, j=job: self._finish(j))
+        else:
+            self._spawn(job, worker.run)
+        latency.schedule_freeze()  # 低延遲模式：暖機結束後連同這個 Worker 一起凍結
+        return True
+
+    def run_task(self, name, fn, *args):
+        """一次性工作 (例如手動測試單)：與常駐 Worker 共用上限，做完即回收"""
+        job = self._register(None, name)
+        if job is None:
+            return False
+        self._spawn(job, fn, *args)
+        return True
+
+    def _register(self, worker, name):
+        with self._lock:
+            if self.full():
+                return None
+            job = next(self._ids)
+            self._jobs[job] = [worker, None, 0.0, name]
+            if worker is not None:
+                self._by_worker[id(worker)] = job
+                self._objects.add(worker)
+            self.started += 1
+            return job
+
+    def _spawn(self, job, fn, *args):
+        thread = threading.Thread(target=self._run, args=(job, fn) + args, daemon=True, name=f"Worker-{self._jobs[job][3]}")
+        self._jobs[job][1] = thread
+        thread.start()
+
+    def _run(self, job, fn, *args):
+        try:
+            fn(*args)
+        except Exception:
+            traceback.print_exc()
+        finally:
+            self._finish(job)
+
+    def _finish(self, job):
+        """執行緒/協程結束：移出清單並釋放 Worker 持有的連線"""
+        with self._lock:
+            entry = self._jobs.pop(job, None)
+            if entry is None:
+                return
+            worker = entry[0]
+            if worker is not None:
+                self._by_worker.pop(id(worker), None)
+            self.finished += 1
+        if worker is not None:
+            release(worker)
+
+    def stop(self, worker):
+        """停止 Worker (不等待)；不是本物件啟動的 (例如 RemoteWorker) 也照常呼叫 stop()"""
+        worker.stop()
+        with self._lock:
+            job = self._by_worker.get(id(worker))
+            if job is not None and not self._jobs[job][2]:
+                self._jobs[job][2] = time.time()
+
+    def reap(self, now=None):
+        """回報停止後超過 WORKER_JOIN_TIMEOUT 仍未結束的 Worker 名稱 (每個只回報一次)"""
+        now = now or time.time()
+        late = []
+        with self._lock:
+            for entry in self._jobs.values():
+                stopped = entry[2]
+                if stopped > 0 and now - stopped > config.WORKER_JOIN_TIMEOUT:
+                    late.append(entry[3])
+                    entry[2] = -1  # 已回報
+        return late
+
+    def shutdown(self, timeout=None):
+        """停止全部並等待結束 (程式關閉時呼叫)，總等待時間不超過 timeout 秒"""
+        timeout = config.WORKER_JOIN_TIMEOUT if timeout is None else timeout
+        deadline = time.time() + timeout
+        with self._lock:
+            entries = list(self._jobs.values())
+        for worker, _, _, _ in entries:
+            if worker is not None:
+                worker.stop()
+        for _, handle, _, _ in entries:
+            if isinstance(handle, threading.Thread):
+                handle.join(max(0.0, deadline - time.time()))
+        if self.engine is not None:
+            self.engine.stop(max(0.0, deadline - time.time()))
+        return len(self._jobs)
+
+    def stats(self):
+        """目前的執行數量：(執行中, 停止中, 行程執行緒數, 記憶體中仍存活的 Worker 物件數)"""
+        with self._lock:
+            stopping = sum(1 for e in self._jobs.values() if e[2])
+            running = len(self._jobs) - stopping
+        return running, stopping, threading.active_count(), len(self._objects)
+
+def release(worker):
+    """釋放 Worker 結束後不再需要的 REST 連線 (requests.Session 的連線池)；借自 ClientPool 的 Client 留給帳戶下次使用"""
+    if getattr(worker.client, 'pooled', False):
+        return
+    close = getattr(worker.client, 'close_connection', None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+from binance import AsyncClient
+from rest_scheduler import shared_scheduler
+
+class AsyncEngine:
+    """單一事件迴圈承載所有 TradingWorker：每個 Worker 是一個協程，不再各佔一條執行緒
+    REST 改用 AsyncClient (同一帳戶的請求共用連線池)，等待時讓出事件迴圈給其他 Worker
+    """
+
+    def __init__(self):
+        self.loop = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._tasks = {}  # id(worker) -> (worker, concurrent.futures.Future)
+        self._clients = {}  # API Key -> AsyncClient (同一帳戶重新啟動時沿用連線)
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run_loop, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self._ready.set()
+        self.loop.run_forever()
+
+    def submit(self, worker, api_key, api_secret, testnet=False):
+        """把 Worker 排入事件迴圈 (可由任何執行緒呼叫)；停止方式與執行緒版相同：worker.stop()"""
+        self.start()
+        future = asyncio.run_coroutine_threadsafe(self._run_worker(worker, api_key, api_secret, testnet), self.loop)
+        self._tasks[id(worker)] = (worker, future)
+        future.add_done_callback(lambda f, key=id(worker): self._tasks.pop(key, None))
+        return future
+
+    async def _run_worker(self, worker, api_key, api_secret, testnet):
+        # [修改] 每個帳戶一個常駐 AsyncClient，直接建立不另外 ping / 查伺服器時間
+        client = self._clients.get(api_key)
+        if client is None:
+            client = self._clients[api_key] = AsyncClient(api_key, api_secret, testnet=testnet, loop=self.loop)
+            shared_scheduler(testnet).attach_async(client)  # [新增] 與同步 Client 共用權重額度，下單優先
+            sync = getattr(worker.clock, 'sync', None)
+            if sync is not None:
+                # [修改] 時間差隨 TimeSync 的背景校正更新，避免簽名請求被判定時間戳過期
+                sync.listen(lambda offset, c=client: setattr(c, 'timestamp_offset', offset))
+            else:
+                client.timestamp_offset = getattr(worker.client, 'timestamp_offset', 0)
+        try:
+            await worker.run_async(client)
+        except Exception as e:
+            worker.safe_emit_log(f"❌ [Engine] Worker 異常結束: {e}")
+
+    @property
+    def worker_count(self):
+        return len(self._tasks)
+
+    def stop(self, timeout=5):
+        """停止所有 Worker 後關閉事件迴圈"""
+        if self.loop is None:
+            return
+        tasks = list(self._tasks.values())
+        for worker, _ in tasks:
+            worker.stop()
+        for _, future in tasks:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                future.cancel()
+        clients = list(self._clients.values())
+        self._clients.clear()
+        for client in clients:
+            try:
+                asyncio.run_coroutine_threadsafe(client.close_connection(), self.loop).result(timeout=timeout)
+            except Exception:
+                pass
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=timeout)
+        self._thread = None
@@ -0,0 +1,106 @@
+# bench_market_stream.py
+# 量測 MarketStream 的解碼成本與快速路徑 (STREAM_FAST_DECODE) 的吞吐量
+# 用法: python bench_market_stream.py [幣種數量=200] [訊息數量=200000]
+import asyncio
+import json
+import multiprocessing
+import sys
+import time
+import timeit
+import config
+import market_stream
+from market_stream import MarketStream, StreamShard, extract_price_raw, scan_str, scan_int
+
+HOST, PORT = "127.0.0.1", 18765
+
+def make_messages(n_symbols):
+    """產生與幣安 combined stream 相同格式的 markPrice 訊息"""
+    msgs = []
+    for i in range(n_symbols):
+        sym = f"SYM{i:03d}USDT"
+        data = {"e": "markPriceUpdate", "E": 1700000000000 + i, "s": sym, "p": f"{100 + i * 0.01:.8f}",
+                "i": "100.00000000", "P": "100.00000000", "r": "0.00010000", "T": 1700003600000}
+        msgs.append(json.dumps({"stream": f"{sym.lower()}@markPrice", "data": data}, separators=(',', ':')))
+    return msgs
+
+def bench_decode(msgs):
+    """單筆解碼成本：python-binance 的通用解碼 vs 快速路徑"""
+    raw = msgs[0]
+
+    def generic():
+        res = json.loads(raw)
+        data = res['data']
+        return data['s'], float(data['p']), data['E']
+
+    def scan():
+        return scan_str(raw, '"stream":"'), extract_price_raw("markPrice", raw), scan_int(raw, '"E":')
+
+    cases = [("json.loads (python-binance)", generic), ("欄位掃描", scan)]
+    if market_stream.orjson is not None:
+        orjson = market_stream.orjson
+
+        def fast():
+            res = orjson.loads(raw)
+            data = res['data']
+            return res['stream'], float(data['p']), data['E']
+        cases.append(("orjson", fast))
+
+    n = 200000
+    for name, fn in cases:
+        cost = timeit.timeit(fn, number=n) / n * 1e6
+        print(f"  {name:<28} {cost:6.2f} µs/筆")
+
+def run_server(n_symbols, n_messages, ready):
+    import websockets
+    msgs = make_messages(n_symbols)
+
+    async def handler(ws, *args):
+        for i in range(n_messages):
+            await ws.send(msgs[i % len(msgs)])
+        await ws.close()
+
+    async def main():
+        async with websockets.serve(handler, HOST, PORT):
+            ready.set()
+            await asyncio.sleep(3600)
+
+    asyncio.run(main())
+
+def bench_stream(n_symbols, n_messages):
+    """端到端：本機 WebSocket 伺服器狂送訊息，量測快速路徑的吞吐量與本行程 CPU 時間"""
+    ready = multiprocessing.Event()
+    server = multiprocessing.Process(target=run_server, args=(n_symbols, n_messages, ready), daemon=True)
+    server.start()
+    ready.wait(10)
+
+    config.STREAM_FAST_DECODE = True
+    config.STREAM_STALL_TIMEOUT = 5
+    symbols = [f"SYM{i:03d}USDT" for i in range(n_symbols)]
+    stream = MarketStream(symbols, stream_url=f"ws://{HOST}:{PORT}/")
+    stream._running = True
+    shard = StreamShard(0, stream.streams)
+
+    async def consume():
+        try:
+            await stream._listen_raw(shard)
+        except Exception:
+            pass  # 伺服器送完後關閉連線
+
+    wall, cpu = time.perf_counter(), time.process_time()
+    asyncio.run(consume())
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    server.terminate()
+
+    received = stream.board._seq
+    per_msg = cpu / max(received, 1) * 1e6
+    print(f"  收到 {received} 筆，耗時 {wall:.2f} 秒 ({received / wall:,.0f} 筆/秒)")
+    print(f"  CPU {per_msg:.2f} µs/筆；{n_symbols} 個幣種 markPrice@1s (每秒 {n_symbols} 筆) 約佔單核 {n_symbols * per_msg / 1e4:.2f}%")
+
+if __name__ == "__main__":
+    n_symbols = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    n_messages = int(sys.argv[2]) if len(sys.argv) > 2 else 200000
+    msgs = make_messages(n_symbols)
+    print(f"[解碼] orjson: {'有' if market_stream.orjson is not None else '無 (改用欄位掃描)'}")
+    bench_decode(msgs)
+    print(f"[串流] 本機 WebSocket，{n_symbols} 個幣種 / {n_messages} 筆")
+    bench_stream(n_symbols, n_messages)
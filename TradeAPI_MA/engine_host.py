@@ -0,0 +1,387 @@
+# engine_host.py
+# 交易引擎行程：執行 MarketStream 與所有 TradingWorker，GUI 只經由本機 socket 顯示狀態、日誌並下指令
+# GUI 凍結、跳出對話框或當掉都不影響引擎；GUI 重新開啟時會接回運作中的帳戶
+# 用法: python engine_host.py <BT|MA> [--testnet]   (config.ENGINE_PROCESS = True 時 GUI 會自動在背景啟動)
+import collections
+import hashlib
+import json
+import os
+import signal
+import subprocess
+import sys
+import time
+from datetime import datetime
+from PySide6.QtCore import QCoreApplication, QObject, QTimer, Signal
+from PySide6.QtNetwork import QHostAddress, QTcpServer, QTcpSocket
+import config
+from crypto_utils import encrypt_text, decrypt_text
+from trading_strategy import TradingWorker
+from market_stream import MarketStream
+from price_board import PriceBoard
+from kline_book import KlineBook
+from tick_recorder import TickRecorder
+from watchdog import Watchdog
+from async_engine import AsyncEngine
+from strategy_group import StrategyGroups
+from shard_host import RemoteWorker
+from qt_bridge import QtInvoker
+from worker_supervisor import WorkerSupervisor
+from client_pool import ClientPool
+import latency
+
+def account_id(api_key, symbol, strategy_name):
+    """帳戶在引擎中的識別碼 (與狀態檔相同的 API 雜湊 + 幣種 + 策略)，GUI 重開後據此接回"""
+    return f"{hashlib.md5(api_key.encode()).hexdigest()[:8]}_{symbol}_{strategy_name}"
+
+def encode(msg):
+    """每則訊息一行 JSON"""
+    return json.dumps(msg, ensure_ascii=False).encode() + b"\n"
+
+def read_lines(sock):
+    """取出 socket 目前已收到的完整行並解碼"""
+    out = []
+    while sock.canReadLine():
+        line = bytes(sock.readLine()).strip()
+        if line:
+            out.append(json.loads(line))
+    return out
+
+# --- 引擎行程 ---
+class TradingEngine(QObject):
+    """引擎本體：原本 MainWindow 擁有的行情、看板、Worker 與 Watchdog 都搬到這裡
+    Worker 與行情串流的事件經由 QtInvoker 排入本行程的 Qt 事件迴圈，再轉送給 GUI
+    """
+
+    def __init__(self, strategy_name, is_testnet):
+        super().__init__()
+        self.strategy_name = strategy_name
+        self.is_testnet = is_testnet
+        self.price_board = PriceBoard()
+        self.invoker = QtInvoker()
+        self.kline_book = KlineBook()
+        self.strategy_groups = StrategyGroups(self.price_board)
+        self.watchdog = Watchdog(self.price_board)
+        self.tick_recorder = None
+        if config.TICK_RECORD:
+            self.tick_recorder = TickRecorder()
+            self.tick_recorder.start()
+        self.engine = AsyncEngine() if config.ENGINE_MODE == "async" else None
+        self.supervisor = WorkerSupervisor(self.engine)
+        self.client_pool = ClientPool(is_testnet)  # [新增] 同一帳戶重新啟動時沿用連線與時間差
+        latency.enable(self.invoker.wrap(self.log))
+        self.market_stream = None
+        self.workers = {}  # 帳戶識別碼 -> TradingWorker
+        self.gui = None    # 目前連線的 GUI (同時只接受一個)
+        # GUI 不在線時的日誌先留著，下次連入時補送
+        self.backlog = collections.deque(maxlen=config.ENGINE_LOG_BACKLOG)
+        self._last_status = {}
+        self._last_prices = {}
+
+        self.server = QTcpServer(self)
+        self.server.newConnection.connect(self.on_connection)
+        self.watchdog_timer = QTimer(self)
+        self.watchdog_timer.timeout.connect(self.run_watchdog)
+        self.watchdog_timer.start(config.WATCHDOG_INTERVAL_MS)
+        self.price_timer = QTimer(self)
+        self.price_timer.timeout.connect(self.push_prices)
+        self.price_timer.start(config.PRICE_HEADER_REFRESH_MS)
+
+    def listen(self):
+        port = config.ENGINE_PORTS[self.strategy_name]
+        if not self.server.listen(QHostAddress(QHostAddress.LocalHost), port):
+            raise SystemExit(f"[Engine] 無法監聽本機埠 {port}: {self.server.errorString()}")
+        env = "測試網" if self.is_testnet else "正式網"
+        print(f"[Engine] {self.strategy_name} 引擎啟動 ({env})，監聽 127.0.0.1:{port}")
+
+    # --- GUI 連線 ---
+    def on_connection(self):
+        sock = self.server.nextPendingConnection()
+        if self.gui is not None:
+            # 新開的 GUI 取代舊連線 (舊的可能已凍結)
+            self.gui.abort()
+        self.gui = sock
+        sock.readyRead.connect(lambda s=sock: self.on_ready_read(s))
+        sock.disconnected.connect(lambda s=sock: self.on_disconnected(s))
+        self._last_status = {}
+        self._last_prices = {}
+        running = {key: w.symbol for key, w in self.workers.items() if w.is_running}
+        self.send({"ev": "hello", "testnet": self.is_testnet, "running": running})
+        for msg in self.backlog:
+            self.send(msg)
+        self.backlog.clear()  # [修正] 已補送，下次連入不再重送
+        print(f"[Engine] GUI 已連線，運作中帳戶 {len(running)} 個")
+
+    def on_disconnected(self, sock):
+        if sock is self.gui:
+            self.gui = None
+            print("[Engine] GUI 已離線，帳戶繼續運作")
+        sock.deleteLater()
+
+    def send(self, msg):
+        sock = self.gui
+        if sock is None:
+            return
+        if sock.bytesToWrite() > config.ENGINE_GUI_BUFFER:
+            # GUI 太久沒有讀取 (凍結)，斷開連線，不讓待送資料佔滿引擎記憶體
+            print("[Engine] GUI 積壓過多，中斷連線 (GUI 恢復後會自動重連)")
+            self.gui = None
+            sock.abort()
+            return
+        sock.write(encode(msg))
+
+    def log(self, msg, key=None):
+        ev = {"ev": "log", "id": key, "msg": msg}
+        self.send(ev)
+        if self.gui is None:
+            self.backlog.append(ev)  # [修正] 只暫存 GUI 不在線 (或剛因積壓被斷開) 時的日誌
+
+    def on_ready_read(self, sock):
+        try:
+            for msg in read_lines(sock):
+                self.handle(msg)
+        except ValueError as e:
+            print(f"[Engine] 無法解析 GUI 指令: {e}")
+
+    def handle(self, msg):
+        op, key = msg.get("op"), msg.get("id")
+        if op == "symbols":
+            self.set_symbols(msg["symbols"])
+        elif op == "start":
+            self.start_account(key, msg)
+        elif op in ("stop", "clear", "stale") and key in self.workers:
+            w = self.workers[key]
+            if op == "stop":
+                self.stop_account(key)
+            elif op == "clear":
+                w.clear_state()
+            else:
+                w.mark_feed_stale()
+
+    # --- 行情 ---
+    def set_symbols(self, symbols):
+        symbols = sorted(symbols)
+        if self.market_stream is None:
+            if not symbols:
+                return
+            self.market_stream = MarketStream(symbols, self.is_testnet, board=self.price_board, kline_book=self.kline_book, recorder=self.tick_recorder)
+            # 引擎沒有畫面，通知在行情執行緒直接確認即可
+            self.market_stream.price_updated.connect(lambda symbol, price: self.price_board.ack(symbol))
+            self.market_stream.feed_lost.connect(self.invoker.wrap(self.on_feed_lost))
+            self.market_stream.feed_restored.connect(self.invoker.wrap(self.on_feed_restored))
+            self.market_stream.candle_closed.connect(self.invoker.wrap(self.on_candle_closed))
+            self.market_stream.start()
+            self.log(f"✅ WebSocket 連線成功 (引擎)，監控: {symbols}")
+        elif sorted(s.upper() for s in self.market_stream.symbols) != symbols:
+            self.market_stream.set_symbols(symbols)
+            self.log(f"🔄 WebSocket 訂閱更新 (引擎)，監控: {symbols}")
+
+    def push_prices(self):
+        prices = self.price_board.prices()
+        changed = {s: p for s, p in prices.items() if self._last_prices.get(s) != p}
+        if changed:
+            self._last_prices.update(changed)
+            self.send({"ev": "prices", "prices": changed})
+
+    def on_feed_lost(self, start_ts, symbols):
+        # 引擎自己暫停進場，不必等 GUI 轉達
+        for w in self.workers.values():
+            if w.symbol in symbols:
+                w.mark_feed_stale()
+        self.send({"ev": "feed_lost", "start": start_ts, "symbols": symbols})
+
+    def on_feed_restored(self, start_ts, end_ts, symbols):
+        self.send({"ev": "feed_restored", "start": start_ts, "end": end_ts, "symbols": symbols})
+
+    def on_candle_closed(self, symbol, open_ms):
+        rows = self.kline_book.closed(symbol)
+        if rows and rows[-1][0] == open_ms:
+            _, _, high, low, close, _, _ = rows[-1]
+            day = datetime.fromtimestamp(open_ms / 1000).strftime("%Y-%m-%d")
+            self.log(f"📅 [{symbol}] {day} 日 K 收盤 | 高 {high} | 低 {low} | 收 {close}")
+
+    # --- 帳戶 ---
+    def start_account(self, key, msg):
+        old = self.workers.get(key)
+        if old is not None and old.is_running:
+            return  # 已在運作 (GUI 重連後重送)
+        symbol = msg["symbol"]
+        if self.supervisor.full():
+            self.log(f"⚠️ 同時執行的 Worker 已達上限 ({config.WORKER_MAX_THREADS})，未啟動", key)
+            self.send({"ev": "finished", "id": key})
+            return
+        try:
+            api, sec = decrypt_text(msg["api"]), decrypt_text(msg["sec"])
+            c = self.client_pool.get(api, sec)
+            w = TradingWorker(c, msg["params"], symbol, self.strategy_name, msg.get("wait_for_reset", False), price_board=self.price_board, kline_book=self.kline_book, clock=self.client_pool.clock)
+            w.log_update.connect(self.invoker.wrap(lambda m, k=key: self.log(m, k)))
+            group = self.strategy_groups.join(w)
+            if len(group.members) > 1:
+                self.log(f"🔗 {symbol} 策略群組共 {len(group.members)} 個帳戶共用觸發價", key)
+            self.workers[key] = w
+            self.supervisor.start(w, api, sec, self.is_testnet)
+        except Exception as e:
+            self.log(f"❌ Worker 啟動失敗: {e}", key)
+            self.send({"ev": "finished", "id": key})
+
+    def stop_account(self, key):
+        w = self.workers.pop(key, None)
+        if w is not None:
+            self.supervisor.stop(w)
+            self.watchdog.forget(w)
+        self._last_status.pop(key, None)
+        self.send({"ev": "finished", "id": key})
+
+    def run_watchdog(self):
+        now = time.time()
+        for name in self.supervisor.reap(now):
+            self.log(f"⚠️ Worker {name} 停止超過 {config.WORKER_JOIN_TIMEOUT:.0f} 秒仍未結束 (可能卡在 REST 請求)")
+        for key, w in list(self.workers.items()):
+            if not w.is_running:
+                # Worker 自行結束 (例如初始化失敗)
+                self.stop_account(key)
+                continue
+            text, abnormal, alert = self.watchdog.check(w, now)
+            if alert or self._last_status.get(key) != text:
+                self._last_status[key] = text
+                self.send({"ev": "status", "id": key, "text": text, "abnormal": abnormal, "alert": alert})
+
+# --- GUI 端 ---
+class EngineLink(QObject):
+    """GUI 與引擎行程的連線，介面與 ShardPool 相同 (start_account / send)，帳戶以 RemoteWorker 代理
+    連不上時自動在背景啟動引擎；斷線後定時重連，重連成功時由 hello 接回運作中的帳戶
+    """
+    # 連上引擎時發射：(是否測試網, {帳戶識別碼: 幣種})
+    hello = Signal(bool, dict)
+    # 引擎本身 (不屬於任何帳戶) 的日誌
+    engine_log = Signal(str)
+    feed_lost = Signal(float, list)
+    feed_restored = Signal(float, float, list)
+
+    def __init__(self, strategy_name, is_testnet, board):
+        super().__init__()
+        self.strategy_name = strategy_name
+        self.is_testnet = is_testnet
+        self.board = board
+        self.port = config.ENGINE_PORTS[strategy_name]
+        self._remotes = {}
+        self._pending = []   # 尚未連上時的指令，連上後依序送出
+        self._symbols = None
+        self._spawned = False
+        self._failures = 0   # 啟動引擎後連續連線失敗的次數
+        self._connected = False
+        self.sock = QTcpSocket(self)
+        self.sock.connected.connect(self.on_connected)
+        self.sock.readyRead.connect(self.on_ready_read)
+        self.sock.disconnected.connect(self.on_disconnected)
+        self.sock.errorOccurred.connect(self.on_error)
+
+    def connect_engine(self):
+        self.sock.connectToHost(QHostAddress(QHostAddress.LocalHost), self.port)
+
+    def spawn_engine(self):
+        """在背景啟動引擎行程 (與 GUI 脫離，GUI 關閉後仍繼續執行)"""
+        self._spawned = True
+        self._failures = 0
+        args = [sys.executable, os.path.abspath(__file__), self.strategy_name] + (["--testnet"] if self.is_testnet else [])
+        log = open(f"engine_{self.strategy_name}.log", "a")
+        if os.name == "nt":
+            flags = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+            subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT, creationflags=flags)
+        else:
+            subprocess.Popen(args, stdout=log, stderr=subprocess.STDOUT, start_new_session=True)
+        self.engine_log.emit(f"🚀 已在背景啟動 {self.strategy_name} 引擎行程 (日誌: engine_{self.strategy_name}.log)")
+
+    def on_connected(self):
+        self._connected = True
+        self._spawned = False  # [修正] 引擎之後若異常結束，重連失敗時會再自動啟動
+        if self._symbols is not None:
+            self.sock.write(encode({"op": "symbols", "symbols": self._symbols}))
+        for data in self._pending:
+            self.sock.write(data)
+        self._pending = []
+
+    def on_error(self, error):
+        if self._connected:
+            return  # 連線中途斷開，由 on_disconnected 處理重連
+        if self._spawned:
+            self._failures += 1
+            if self._failures >= config.ENGINE_RESPAWN_TRIES:
+                self._spawned = False  # [修正] 啟動的引擎一直連不上 (可能啟動失敗)，重新啟動
+        if not self._spawned:
+            self.spawn_engine()
+        QTimer.singleShot(config.ENGINE_RECONNECT_MS, self.connect_engine)
+
+    def on_disconnected(self):
+        self._connected = False
+        for remote in self._remotes.values():
+            remote._status = ("⚠️ 引擎斷線", True)
+        self.engine_log.emit("🚨 與交易引擎斷線，重新連線中...")
+        QTimer.singleShot(config.ENGINE_RECONNECT_MS, self.connect_engine)
+
+    def _write(self, msg):
+        data = encode(msg)
+        if self._connected:
+            self.sock.write(data)
+        else:
+            self._pending.append(data)
+
+    # --- 與 ShardPool 相同的介面 ---
+    def start_account(self, api_key, api_secret, params, symbol, strategy_name, wait_for_reset=False):
+        remote = self.adopt(account_id(api_key, symbol, strategy_name), symbol)
+        self._write({"op": "start", "id": remote.key, "api": encrypt_text(api_key), "sec": encrypt_text(api_secret),
+                     "params": params, "symbol": symbol, "wait_for_reset": wait_for_reset})
+        return remote
+
+    def adopt(self, key, symbol):
+        """為引擎中的帳戶建立代理 (新啟動或 GUI 重開後接回)"""
+        remote = RemoteWorker(self, 0, key, symbol)
+        self._remotes[key] = remote
+        return remote
+
+    def send(self, remote, cmd):
+        self._write({"op": cmd, "id": remote.key})
+
+    def set_symbols(self, symbols):
+        self._symbols = sorted(symbols)
+        if self._connected:
+            self.sock.write(encode({"op": "symbols", "symbols": self._symbols}))
+
+    def on_ready_read(self):
+        try:
+            msgs = read_lines(self.sock)
+        except ValueError as e:
+            self.engine_log.emit(f"❌ 無法解析引擎訊息: {e}")
+            return
+        for msg in msgs:
+            ev = msg.get("ev")
+            remote = self._remotes.get(msg.get("id"))
+            if ev == "hello":
+                self.hello.emit(msg["testnet"], msg["running"])
+            elif ev == "log":
+                if remote is not None and remote.on_log is not None:
+                    remote.on_log(msg["msg"])
+                elif msg.get("id") is None:
+                    self.engine_log.emit(msg["msg"])
+            elif ev == "status" and remote is not None:
+                remote._status = (msg["text"], msg["abnormal"])
+                if msg["alert"]:
+                    remote._alerts.append(msg["alert"])
+            elif ev == "finished" and remote is not None:
+                remote.is_running = False
+                del self._remotes[remote.key]
+            elif ev == "prices":
+                for symbol, price in msg["prices"].items():
+                    self.board.publish(symbol, price, notify=False)
+            elif ev == "feed_lost":
+                self.feed_lost.emit(msg["start"], msg["symbols"])
+            elif ev == "feed_restored":
+                self.feed_restored.emit(msg["start"], msg["end"], msg["symbols"])
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in config.ENGINE_PORTS:
+        raise SystemExit(f"用法: python engine_host.py <{'|'.join(config.ENGINE_PORTS)}> [--testnet]")
+    app = QCoreApplication(sys.argv)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)  # Ctrl+C 直接結束
+    engine = TradingEngine(sys.argv[1], "--testnet" in sys.argv)
+    engine.listen()
+    sys.exit(app.exec())
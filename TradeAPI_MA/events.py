@@ -0,0 +1,45 @@
+import threading
+import traceback
+
+class BoundEvent:
+    """單一物件上的事件：connect / disconnect / emit，用法與 Qt Signal 相同"""
+
+    def __init__(self):
+        self._slots = ()  # 整份替換，emit 時免鎖迭代
+        self._lock = threading.Lock()
+
+    def connect(self, slot):
+        with self._lock:
+            self._slots = self._slots + (slot,)
+
+    def disconnect(self, slot=None):
+        with self._lock:
+            self._slots = () if slot is None else tuple(s for s in self._slots if s is not slot)
+
+    def emit(self, *args):
+        for slot in self._slots:
+            try:
+                slot(*args)
+            except Exception:
+                # 與 Qt 相同：slot 的例外只印出，不影響發送端 (Worker 迴圈 / 下單流程)
+                traceback.print_exc()
+
+class EventSignal:
+    """純 Python 的訊號 (不需要 PySide6 / QApplication)：在類別上宣告，每個實例各有一份 BoundEvent
+    emit 會在呼叫端的執行緒直接呼叫所有 slot；要回到 Qt 主執行緒處理時，slot 先經過 qt_bridge.QtInvoker.wrap()
+    """
+
+    def __init__(self, *types):
+        self.types = types
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = f"_event_{name}"
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        bound = obj.__dict__.get(self.name)
+        if bound is None:
+            bound = obj.__dict__.setdefault(self.name, BoundEvent())
+        return bound
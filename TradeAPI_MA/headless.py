@@ -0,0 +1,129 @@
+# headless.py
+# 無介面模式：不載入 PySide6，依 user_accounts.json 與參數檔直接執行所有帳戶 (適合沒有桌面環境的伺服器)
+# 用法: python headless.py [參數檔=headless_params.json] [--testnet]
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+import config
+from crypto_utils import decrypt_text
+from trading_strategy import TradingWorker
+from market_stream import MarketStream
+from price_board import PriceBoard
+from kline_book import KlineBook
+from tick_recorder import TickRecorder
+from watchdog import Watchdog
+from async_engine import AsyncEngine
+from strategy_group import StrategyGroups
+import latency
+from client_pool import ClientPool
+
+ACCOUNTS_FILE = "user_accounts.json"
+PARAMS_FILE = "headless_params.json"
+STRATEGY_NAME = "MA"
+# 與主畫面輸入框的預設值相同 (多單 MA 6 / 空單 MA 29)；方向由各帳戶設定覆寫
+DEFAULT_PARAMS = {
+    "long_ma_window": 6.0, "long_buffer": 9.5, "long_sl": 3.5, "long_ttp_trig": 20.0, "long_ttp_call": 1.5,
+    "short_ma_window": 29.0, "short_buffer": 1.0, "short_sl": 2.0, "short_ttp_trig": 10.0, "short_ttp_call": 2.0,
+    "order_mode": "PERCENT", "fixed_qty": 0.005, "trade_pct": 10.0, "direction": "BOTH",
+}
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}", flush=True)
+
+def load_params(path):
+    """讀取參數檔；檔案不存在時以預設值建立一份，方便之後修改"""
+    params = dict(DEFAULT_PARAMS)
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            params.update(json.load(f))
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(DEFAULT_PARAMS, f, indent=2)
+        log(f"⚠️ 找不到參數檔，已用預設參數建立 {path}")
+    return params
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    is_testnet = config.IS_TESTNET or "--testnet" in sys.argv
+    if not os.path.exists(ACCOUNTS_FILE):
+        raise SystemExit(f"找不到 {ACCOUNTS_FILE}，請先用介面版的帳戶管理中心新增帳戶")
+    with open(ACCOUNTS_FILE, "r") as f:
+        accounts = json.load(f)
+    params = load_params(args[0] if args else PARAMS_FILE)
+
+    board = PriceBoard()
+    kline_book = KlineBook()
+    groups = StrategyGroups(board)
+    watchdog = Watchdog(board)
+    recorder = TickRecorder() if config.TICK_RECORD else None
+    if recorder is not None:
+        recorder.start()
+    clients = ClientPool(is_testnet)  # 時間差只量測一次，所有帳戶共用
+    engine = AsyncEngine() if config.ENGINE_MODE == "async" else None
+    workers = []  # (暱稱, TradingWorker)
+
+    def on_feed_lost(start_ts, symbols):
+        log(f"🚨 WebSocket 行情中斷 (最後報價 {datetime.fromtimestamp(start_ts).strftime('%H:%M:%S')})，暫停進場: {symbols}")
+        for _, w in workers:
+            if w.symbol in symbols:
+                w.mark_feed_stale()
+
+    def on_feed_restored(start_ts, end_ts, symbols):
+        log(f"✅ WebSocket 行情恢復 | 中斷 {end_ts - start_ts:.1f} 秒 | 幣種: {symbols}")
+
+    symbols = sorted({acc.get('config', {}).get('symbol', 'BTCUSDT') for acc in accounts})
+    stream = MarketStream(symbols, is_testnet, board=board, kline_book=kline_book, recorder=recorder)
+    # 沒有畫面要更新，通知在行情執行緒直接確認
+    stream.price_updated.connect(lambda symbol, price: board.ack(symbol))
+    stream.feed_lost.connect(on_feed_lost)
+    stream.feed_restored.connect(on_feed_restored)
+    stream.start()
+    log(f"✅ WebSocket 啟動，監控: {symbols}")
+
+    for acc in accounts:
+        nick = acc.get('nickname', '未命名')
+        conf = acc.get('config', {})
+        symbol = conf.get('symbol', 'BTCUSDT')
+        ps = dict(params)
+        ps['direction'] = conf.get('direction', 'BOTH')
+        try:
+            api, sec = decrypt_text(acc['api_key']), decrypt_text(acc['secret_key'])
+            c = clients.get(api, sec)
+            w = TradingWorker(c, ps, symbol, STRATEGY_NAME, price_board=board, kline_book=kline_book, clock=clients.clock)
+            w.log_update.connect(lambda m, n=nick: log(f"【{n}】 {m}"))
+            groups.join(w)
+            workers.append((nick, w))
+            if engine is not None:
+                engine.submit(w, api, sec, is_testnet)
+            else:
+                threading.Thread(target=w.run, daemon=True).start()
+        except Exception as e:
+            log(f"❌ 【{nick}】啟動失敗: {e}")
+    latency.enable(log)
+    log(f"🚀 無介面模式已啟動 {len(workers)} 個帳戶 ({'測試網' if is_testnet else '正式網'})，Ctrl+C 結束")
+
+    try:
+        while True:
+            time.sleep(config.WATCHDOG_INTERVAL_MS / 1000)
+            now = time.time()
+            for nick, w in workers:
+                if w.is_running:
+                    _, _, alert = watchdog.check(w, now)
+                    if alert:
+                        log(f"[{nick}] {alert}")
+    except KeyboardInterrupt:
+        log("⏹️ 收到中斷，停止所有帳戶...")
+    for _, w in workers:
+        w.stop()
+    if engine is not None:
+        engine.stop()
+    stream.stop()
+    clients.close()
+    if recorder is not None:
+        recorder.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+import gc
+import sys
+import threading
+import config
+
+_lock = threading.Lock()
+_timer = None
+_log = None
+
+def enable(log=None):
+    """程式啟動時呼叫：LATENCY_MODE 開啟時排定暖機後凍結，回傳是否啟用
+    :param log: 凍結完成後的通知 (可由任何執行緒呼叫)
+    """
+    global _log
+    if not config.LATENCY_MODE:
+        return False
+    _log = log
+    schedule_freeze()
+    return True
+
+def schedule_freeze():
+    """每次啟動 Worker 後呼叫：LATENCY_WARMUP_S 秒內沒有新的 Worker 啟動才凍結 (重新計時)"""
+    global _timer
+    if not config.LATENCY_MODE:
+        return
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
+        _timer = threading.Timer(config.LATENCY_WARMUP_S, freeze)
+        _timer.daemon = True
+        _timer.start()
+
+def freeze():
+    """把目前存活的物件 (連線、規則快取、看板、Worker 本身) 移到永久代，之後的回收不再掃描它們
+    gc.freeze 可重複呼叫，後來啟動的 Worker 會在下一次凍結時一併移入
+    """
+    gc.collect()
+    gc.freeze()
+    gc.set_threshold(*config.LATENCY_GC_THRESHOLD)
+    if _log is not None:
+        _log(f"🧊 [低延遲] 已凍結 {gc.get_freeze_count()} 個長壽物件，GC 門檻 {config.LATENCY_GC_THRESHOLD}")
+
+def allocated_blocks():
+    """目前配置中的記憶體區塊數 (全行程)；LATENCY_MODE 關閉時回傳 0，不計量"""
+    return sys.getallocatedblocks() if config.LATENCY_MODE else 0
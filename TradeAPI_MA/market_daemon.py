@@ -0,0 +1,141 @@
+# market_daemon.py
+# 本機行情 daemon：BT / MA 等多個 app 同時執行時，只由這裡維持幣安 WebSocket 連線，
+# 各 app 的 MarketStream 改向 daemon 訂閱 (config.MARKET_DAEMON)，收到的原始訊息原封不動轉送
+# 用法: python market_daemon.py
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+import config
+from market_stream import MarketStream, StreamStalled, scan_str, websockets, FSTREAM_URL, FSTREAM_TESTNET_URL
+
+class RelayStream(MarketStream):
+    """daemon 的上游連線：沿用 MarketStream 的分連線、重連退避與動態訂閱，但不解碼報價
+    每則訊息只切出串流名稱，原始字串交給 sink 轉送給訂閱的 app
+    """
+
+    def __init__(self, is_testnet, sink):
+        super().__init__([], is_testnet)
+        self.use_daemon = False
+        self.sink = sink
+        self.wanted = set()
+
+    def _build_routes(self):
+        # 串流清單由所有 app 的訂閱合併而來，不寫入看板
+        self.streams = sorted(getattr(self, 'wanted', ()))
+        self._kline_routes = {}
+        return {}
+
+    def attach(self, loop):
+        """在 daemon 自己的事件迴圈上運作 (不另開執行緒)"""
+        self._loop = loop
+        self._running = True
+
+    async def _listen_prices(self, shard):
+        base = FSTREAM_TESTNET_URL if self.is_testnet else FSTREAM_URL
+        initial = set(shard.streams)
+        url = f"{base}stream?streams={'/'.join(sorted(initial))}"
+        async with websockets.connect(url, close_timeout=0.1, max_size=2 ** 20) as ws:
+            shard.conn = SimpleNamespace(ws=ws)
+            try:
+                await self._catch_up(shard, initial)
+                while self._running:
+                    try:
+                        raw = await asyncio.wait_for(ws.recv(), timeout=config.STREAM_STALL_TIMEOUT)
+                    except asyncio.TimeoutError:
+                        raise StreamStalled(f"{config.STREAM_STALL_TIMEOUT} 秒內沒有收到任何報價")
+                    stream = scan_str(raw, '"stream":"')
+                    if stream is None:
+                        continue  # SUBSCRIBE/UNSUBSCRIBE 的回覆
+                    shard.last_msg_time = self.last_msg_time = time.time()
+                    shard.received = True
+                    if shard.outage_start:
+                        self._mark_restored(shard)
+                    self.sink(stream, raw)
+            finally:
+                shard.conn = None
+
+class MarketDaemon:
+    """接受 app 的訂閱 (每行一則 JSON：{"op": "streams", "testnet": bool, "streams": [...]})，
+    依所有 app 的訂閱聯集增減上游串流，再把每則原始訊息轉送給有訂閱該串流的 app (每行一則)
+    """
+
+    def __init__(self):
+        self.relays = {}   # is_testnet -> RelayStream
+        self.routes = {}   # is_testnet -> {串流: (訂閱的 writer, ...)}，整份替換，轉送時免鎖
+        self.clients = {}  # writer -> (is_testnet, 串流集合)
+        self._lock = asyncio.Lock()
+
+    async def serve(self):
+        server = await asyncio.start_server(self.handle, config.MARKET_DAEMON_HOST, config.MARKET_DAEMON_PORT)
+        print(f"[MarketDaemon] 監聽 {config.MARKET_DAEMON_HOST}:{config.MARKET_DAEMON_PORT}")
+        async with server:
+            await server.serve_forever()
+
+    async def handle(self, reader, writer):
+        peer = writer.get_extra_info('peername')
+        print(f"[MarketDaemon] app 連入: {peer}")
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                msg = json.loads(line)
+                if msg.get("op") == "streams":
+                    await self.update(writer, bool(msg.get("testnet")), msg.get("streams", []))
+        except (ConnectionError, ValueError) as e:
+            print(f"[MarketDaemon] app {peer} 連線錯誤: {e}")
+        finally:
+            await self.update(writer, None, [])
+            writer.close()
+            print(f"[MarketDaemon] app 離線: {peer}")
+
+    async def update(self, writer, is_testnet, streams):
+        """更新某個 app 的訂閱 (streams 為空代表離線)，再同步上游連線"""
+        old = self.clients.pop(writer, None)
+        changed = set()
+        if old is not None:
+            changed.add(old[0])
+        if streams:
+            self.clients[writer] = (is_testnet, set(streams))
+            changed.add(is_testnet)
+        for net in changed:
+            routes = {}
+            for w, (t, subs) in self.clients.items():
+                if t == net:
+                    for st in subs:
+                        routes[st] = routes.get(st, ()) + (w,)
+            self.routes[net] = routes
+            await self.sync_upstream(net)
+
+    async def sync_upstream(self, is_testnet):
+        async with self._lock:
+            relay = self.relays.get(is_testnet)
+            if relay is None:
+                relay = self.relays[is_testnet] = RelayStream(is_testnet, lambda st, raw: self.fanout(is_testnet, st, raw))
+                relay.attach(asyncio.get_running_loop())
+            relay.wanted = set(self.routes[is_testnet])
+            await relay._apply_symbols([])
+
+    def fanout(self, is_testnet, stream, raw):
+        writers = self.routes[is_testnet].get(stream)
+        if not writers:
+            return
+        data = (raw + "\n").encode()
+        for w in writers:
+            if w.is_closing():
+                continue
+            if w.transport.get_write_buffer_size() > config.MARKET_DAEMON_CLIENT_BUFFER:
+                # 讀太慢的 app 直接斷開，由它的 MarketStream 重新連線
+                print(f"[MarketDaemon] app {w.get_extra_info('peername')} 積壓過多，斷開連線")
+                w.close()
+                continue
+            w.write(data)
+
+if __name__ == "__main__":
+    if websockets is None:
+        raise SystemExit("market_daemon 需要 websockets 套件 (pip install websockets)")
+    try:
+        asyncio.run(MarketDaemon().serve())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,232 @@
+import asyncio
+import random
+import threading
+import time
+import numpy as np
+from PySide6.QtCore import QObject, Signal
+from binance import AsyncClient, BinanceSocketManager
+from binance.client import Client
+import config
+from exchange_info_cache import shared_cache
+from rest_scheduler import shared_scheduler
+
+# 觸發類型 (levels 的列順序)
+KINDS = ("突破多", "突破空", "MA多", "MA空")
+
+def calc_levels(highs, lows, closes, params):
+    """向量化版的 calc_breakout_levels / calc_ma_level (含進場緩衝)
+    每一列是一個幣種、每一欄是一根已收盤日 K (舊 -> 新，天數不足的幣種左側補 NaN)
+    :return: shape (4, 幣種數) 的觸發價，順序同 KINDS；資料不足時為 NaN
+    """
+    lb_l, lb_s = int(params['long_lookback']), int(params['short_lookback'])
+    ma_l, ma_s = int(params['long_ma_window']), int(params['short_ma_window'])
+    return np.vstack([
+        highs[:, -lb_l:].max(axis=1) * (1 + params['bo_long_buffer'] / 100),
+        lows[:, -lb_s:].min(axis=1) * (1 - params['bo_short_buffer'] / 100),
+        closes[:, -ma_l:].mean(axis=1) * (1 + params['ma_long_buffer'] / 100),
+        closes[:, -ma_s:].mean(axis=1) * (1 - params['ma_short_buffer'] / 100),
+    ])
+
+class MarketScanner(QObject):
+    """全市場掃描：訂閱 !markPrice@arr，以 NumPy 一次計算所有 USDT 永續合約與突破位/均線的距離"""
+    # 每次報價後發射：[(symbol, 現價, 觸發類型, 觸發價, 距離%)]，依距離由近到遠排序
+    # 距離% = (觸發價 / 現價 - 1) * 100，多方為負代表已越過觸發價
+    scan_updated = Signal(list)
+    log_update = Signal(str)
+
+    def __init__(self, params=None, near_pct=None, is_testnet=False):
+        super().__init__()
+        self.params = dict(config.SCANNER_PARAMS)
+        self.params.update(params or {})
+        self.near_pct = near_pct if near_pct is not None else config.SCANNER_NEAR_PCT
+        self.is_testnet = is_testnet
+        # (幣種清單, symbol -> 欄位, 現價陣列, 觸發價陣列)；換新的幣種清單時整組替換
+        self._state = ([], {}, np.zeros(0), np.full((len(KINDS), 0), np.nan))
+        self.next_rollover_ms = 0
+        self._stale = []          # 上次補齊時獲取失敗或資料尚未換日的幣種，稍後重抓
+        self._stale_target = 0    # 這些幣種的最新 K 線應達到的開盤時間 (ms)
+        self._running = False
+        self._received = False  # 本次連線是否已收到報價 (用於重置退避)
+
+    def start(self):
+        self._running = True
+        threading.Thread(target=self._seed_loop, daemon=True).start()
+        threading.Thread(target=self._run_loop, daemon=True).start()
+
+    def stop(self):
+        self._running = False
+
+    def safe_emit_log(self, msg):
+        try:
+            self.log_update.emit(msg)
+        except RuntimeError:
+            pass
+
+    # --- 觸發價：啟動時與每日換日後以 REST 補齊 ---
+    def _seed_loop(self):
+        client = None
+        failures = 0
+        retry_at = refetch_at = 0.0
+        while self._running:
+            now = time.time()
+            try:
+                if client is None:
+                    # [修改] 換日補齊的大量日 K 請求走一般車道，不擠掉帳戶的下單額度
+                    client = shared_scheduler(self.is_testnet).attach(Client(testnet=self.is_testnet))
+                if now < retry_at:
+                    pass
+                elif int(now * 1000) >= self.next_rollover_ms + config.KLINE_BOOK_GRACE_MS:
+                    # 換日後稍等交易所產出新 K 線再補
+                    self._seed(client)
+                    failures = 0
+                    refetch_at = time.time() + config.SCANNER_RETRY_S
+                elif self._stale and now >= refetch_at:
+                    self._refetch(client)
+                    refetch_at = time.time() + config.SCANNER_RETRY_S
+            except Exception as e:
+                # [修正] 整輪失敗時加倍退避，不每秒重新補齊全市場
+                failures += 1
+                delay = min(config.SCANNER_BACKOFF_MAX, config.SCANNER_RETRY_S * 2 ** (failures - 1))
+                retry_at = time.time() + delay
+                self.safe_emit_log(f"⚠️ [掃描] 更新觸發價失敗，{delay:.0f} 秒後重試: {e}")
+            time.sleep(1)
+
+    def _seed(self, client):
+        # [修改] 每日補齊時順便更新共用的交易規則快取，幣種清單由解析好的紀錄篩選
+        cache = shared_cache(self.is_testnet)
+        cache.refresh(client)
+        symbols = sorted(s for s, r in cache.records().items()
+                         if r['contractType'] == 'PERPETUAL' and r['quoteAsset'] == 'USDT' and r['status'] == 'TRADING')
+        old_symbols, old_index, old_price, old_levels = self._state
+        index = {s: i for i, s in enumerate(symbols)}
+        price = np.zeros(len(symbols))
+        levels = np.full((len(KINDS), len(symbols)), np.nan)
+        # 沿用舊的現價與觸發價，補齊期間掃描不中斷
+        keep = [(i, old_index[s]) for s, i in index.items() if s in old_index]
+        if keep:
+            new_cols, old_cols = np.array(keep).T
+            price[new_cols] = old_price[old_cols]
+            levels[:, new_cols] = old_levels[:, old_cols]
+        self._state = (symbols, index, price, levels)
+        self.safe_emit_log(f"🔎 [掃描] 開始更新 {len(symbols)} 個 USDT 永續合約的觸發價...")
+
+        target = self.next_rollover_ms
+        updated, stale, next_rollover = self._fetch(client, symbols, index, levels, target)
+        if not self._running:
+            return
+        if not updated:
+            raise RuntimeError("所有幣種的 K 線都獲取失敗")
+        self._stale, self._stale_target = stale, target
+        if next_rollover:
+            self.next_rollover_ms = next_rollover
+        retry = f"，{len(stale)} 個幣種稍後重抓" if stale else ""
+        self.safe_emit_log(f"✅ [掃描] 觸發價更新完成{retry}，下次更新: {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.next_rollover_ms / 1000))}")
+
+    def _refetch(self, client):
+        """[新增] 重抓上次補齊時獲取失敗或日 K 尚未換日的幣種 (否則整天沿用前一天的觸發價)"""
+        symbols, index, price, levels = self._state
+        stale = [s for s in self._stale if s in index]
+        updated, self._stale, _ = self._fetch(client, stale, index, levels, self._stale_target)
+        if updated:
+            self.safe_emit_log(f"🔁 [掃描] 補抓 {updated} 個幣種的觸發價")
+
+    def _fetch(self, client, symbols, index, levels, target):
+        """逐一取得日 K，每 50 個一批向量化計算後寫回 levels
+        :param target: 最新一根 K 線應達到的開盤時間 (ms)，尚未達到的幣種保留舊值並列入重抓
+        :return: (更新的幣種數, 需要重抓的幣種, 下次換日時間 ms)
+        """
+        p = self.params
+        window = max(int(p['long_lookback']), int(p['short_lookback']), int(p['long_ma_window']), int(p['short_ma_window']))
+        batch = 50
+        updated, stale, next_rollover = 0, [], 0
+        for lo in range(0, len(symbols), batch):
+            chunk = symbols[lo:lo + batch]
+            highs, lows, closes = (np.full((len(chunk), window), np.nan) for _ in range(3))
+            for r, symbol in enumerate(chunk):
+                if not self._running:
+                    return updated, stale, next_rollover
+                try:
+                    klines = client.futures_klines(symbol=symbol, interval='1d', limit=window + 1)
+                except Exception as e:
+                    self.safe_emit_log(f"⚠️ [掃描] {symbol} K 線獲取失敗: {e}")
+                    stale.append(symbol)
+                    continue
+                finally:
+                    time.sleep(config.SCANNER_SEED_INTERVAL)
+                if not klines:
+                    continue  # 剛上市，保留舊值
+                if klines[-1][0] < target:
+                    stale.append(symbol)  # 資料尚未換日，保留舊值
+                    continue
+                next_rollover = max(next_rollover, klines[-1][6] + 1)
+                # 排除最後一根 (今天)，右側對齊，天數不足時左側保持 NaN
+                closed = klines[:-1]
+                if closed:
+                    highs[r, -len(closed):] = [float(k[2]) for k in closed]
+                    lows[r, -len(closed):] = [float(k[3]) for k in closed]
+                    closes[r, -len(closed):] = [float(k[4]) for k in closed]
+            # 一批一次向量化計算，寫回正在使用的觸發價陣列
+            fresh = calc_levels(highs, lows, closes, p)
+            rows = ~np.isnan(closes[:, -1])
+            cols = np.array([index[s] for s in chunk])
+            levels[:, cols[rows]] = fresh[:, rows]
+            updated += int(rows.sum())
+        return updated, stale, next_rollover
+
+    # --- 報價：全市場標記價格陣列 ---
+    def _run_loop(self):
+        asyncio.run(self._supervise())
+
+    async def _supervise(self):
+        attempt = 0
+        while self._running:
+            self._received = False
+            try:
+                await self._listen()
+            except Exception as e:
+                self.safe_emit_log(f"⚠️ [掃描] 串流中斷: {e}")
+            if not self._running:
+                break
+            if self._received:
+                attempt = 0
+            delay = min(config.STREAM_BACKOFF_MAX, config.STREAM_BACKOFF_BASE * (2 ** attempt)) * random.uniform(0.5, 1.0)
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    async def _listen(self):
+        client = await AsyncClient.create(testnet=self.is_testnet)
+        try:
+            bsm = BinanceSocketManager(client)
+            async with bsm.all_mark_price_socket(fast=config.SCANNER_FAST) as ts:
+                while self._running:
+                    res = await asyncio.wait_for(ts.recv(), timeout=config.STREAM_STALL_TIMEOUT)
+                    if res and res.get('e') == 'error':
+                        raise ConnectionError(f"{res.get('type')}: {res.get('m')}")
+                    if res and 'data' in res:
+                        self._received = True
+                        self.on_prices(res['data'])
+        finally:
+            await client.close_connection()
+
+    def on_prices(self, data):
+        """寫入整批標記價格後做一次掃描"""
+        symbols, index, price, levels = self._state
+        cols, values = [], []
+        for d in data:
+            i = index.get(d['s'])
+            if i is not None:
+                cols.append(i)
+                values.append(float(d['p']))
+        price[cols] = values
+        self.scan_updated.emit(self.scan())
+
+    def scan(self):
+        """一次 NumPy 運算找出所有距離觸發價在 near_pct 以內的幣種"""
+        symbols, index, price, levels = self._state
+        with np.errstate(divide='ignore', invalid='ignore'):
+            dist = (levels / price - 1) * 100
+            near = np.abs(dist) <= self.near_pct  # NaN (資料不足) 與尚無報價 (inf) 都會是 False
+        kinds, cols = np.nonzero(near)
+        order = np.argsort(np.abs(dist[kinds, cols]))
+        return [(symbols[c], float(price[c]), KINDS[k], float(levels[k, c]), float(dist[k, c]))
+                for k, c in zip(kinds[order], cols[order])]
@@ -1,5 +1,6 @@
 from binance.client import Client
 import math
+from exchange_info_cache import cache_for
 
 def get_ma_level(client, symbol, window, check_time=None):
     """
@@ -23,33 +24,36 @@ def get_ma_level(client, symbol, window, check_time=None):
                 return None
 
         # 排除最後一根（當前未收盤），只取已收盤的
-        closed_klines = klines[:-1]
-        closes = [float(k[4]) for k in closed_klines] 
-        return sum(closes) / len(closes)
+        return calc_ma_level(klines[:-1], window)
     except Exception as e:
         print(f"獲取 MA 失敗: {e}")
         return None
 
-def get_symbol_rules(client, symbol):
+def calc_ma_level(closed_klines, window):
+    """[新增] 純計算：由已收盤的 K 線 (舊 -> 新) 取最近 window 根的收盤均價"""
+    if window <= 0 or len(closed_klines) < window:
+        return None
+    return sum(float(k[4]) for k in closed_klines[-window:]) / window
+
+def get_symbol_rules(client, symbol, price=None):
+    """[修改] 由全行程共用的交易規則快取取得 (記憶體查詢，不再每次下載 exchange info 與查詢現價)
+    :param price: 用來換算以金額計的最小數量 (actualMinQty)；未傳入時不計算
+    """
     try:
-        info = client.futures_exchange_info()
-        ticker = client.futures_symbol_ticker(symbol=symbol)
-        curr_price = float(ticker['price'])
-        for s in info['symbols']:
-            if s['symbol'] == symbol:
-                rules = {'price': curr_price}
-                for f in s['filters']:
-                    if f['filterType'] == 'LOT_SIZE':
-                        rules['minQty'] = float(f['minQty'])
-                        rules['stepSize'] = float(f['stepSize'])
-                    if f['filterType'] == 'MIN_NOTIONAL':
-                        rules['minNotional'] = float(f['notional'])
-                min_qty_by_money = rules['minNotional'] / curr_price
-                rules['actualMinQty'] = max(rules['minQty'], min_qty_by_money)
-                rules['actualMinQty'] = math.ceil(rules['actualMinQty'] / rules['stepSize']) * rules['stepSize']
-                return rules
+        rec = cache_for(client).lookup(client, symbol)
+        if rec is None:
+            return None
+        rules = dict(rec)
+        if price:
+            rules['price'] = price
+            # 計算基於金額的最小數量： $MinQty_{money} = \frac{MinNotional}{Price}$
+            min_qty_by_money = rules['minNotional'] / price
+            # 真正的最小量 = max(數量限制, 金額限制)，並依步進單位向上取整
+            rules['actualMinQty'] = math.ceil(max(rules['minQty'], min_qty_by_money) / rules['stepSize']) * rules['stepSize']
+        return rules
+    except Exception as e:
+        print(f"獲取規則失敗: {e}")
         return None
-    except: return None
 
 def round_step_size(quantity, step_size):
     precision = int(round(-math.log10(step_size), 0))
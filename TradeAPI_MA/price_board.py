@@ -0,0 +1,150 @@
+import time
+import config
+from trigger_index import TriggerIndex
+
+# 報價來源 -> 對應的 WebSocket 串流名稱 (小寫幣種之後的部分)
+SOURCE_STREAMS = {
+    "markPrice": "markPrice",
+    "markPrice@1s": "markPrice@1s",
+    "aggTrade": "aggTrade",
+    "bookTicker.mid": "bookTicker",
+    "bookTicker.bid": "bookTicker",
+    "bookTicker.ask": "bookTicker",
+}
+
+def get_price_sources(symbol):
+    """讀取幣種的進場/停損報價來源設定，未設定的部分套用預設值"""
+    sources = dict(config.DEFAULT_PRICE_SOURCE)
+    sources.update(config.PRICE_SOURCES.get(symbol, {}))
+    for role, src in sources.items():
+        if src not in SOURCE_STREAMS:
+            raise ValueError(f"{symbol} 的 {role} 報價來源不支援: {src}")
+    return sources
+
+def board_key(symbol, role):
+    """看板上的欄位名稱：進場價沿用幣種名稱 (維持 price_updated 的格式)，停損價另開一格"""
+    return symbol if role == "entry" else f"{symbol}@{role}"
+
+class TickRing:
+    """[新增] 單一欄位的逐筆報價環形緩衝：行情執行緒寫入一次，所有訂閱者共用，各自保留讀取位置"""
+
+    def __init__(self, size):
+        self.size = size
+        self.buf = [0.0] * size
+        self.count = 0   # 累計寫入筆數
+        self.readers = 0
+
+    def append(self, price):
+        # 先寫資料再推進筆數，讀取端看到新筆數時資料一定已寫入
+        self.buf[self.count % self.size] = price
+        self.count += 1
+
+class TapeReader:
+    """[新增] 報價帶讀取端：只在自己的執行緒呼叫 drain()"""
+
+    def __init__(self, ring):
+        self.ring = ring
+        self.pos = ring.count
+
+    def __len__(self):
+        return min(self.ring.count - self.pos, self.ring.size)
+
+    def drain(self):
+        """取出上次讀取之後的所有報價 (舊 -> 新)；落後超過緩衝大小時只保留最新的部分"""
+        ring = self.ring
+        end = ring.count
+        n = min(end - self.pos, ring.size)
+        self.pos = end
+        if n <= 0:
+            return []
+        i = (end - n) % ring.size
+        if i + n <= ring.size:
+            return ring.buf[i:i + n]
+        return ring.buf[i:] + ring.buf[:i + n - ring.size]
+
+class PriceBoard:
+    """最新價看板：每個幣種只保留一格最新報價，行情執行緒覆寫、其他執行緒免鎖讀取"""
+
+    def __init__(self):
+        # symbol -> [price, 交易所事件時間 ms, 本地接收時間, 序號]
+        # [修改] 欄位預先配置、每筆報價就地改寫，行情熱路徑不再產生新物件
+        self._slots = {}
+        self._seq = 0
+        # 已寫入新價但 GUI 尚未消化的幣種 (每個幣種最多只排一個 Qt 事件)
+        self._dirty = set()
+        # [修改] 逐筆報價帶：key -> TickRing (所有訂閱者共用一份)，讓 Worker 評估兩次取樣之間的每一筆報價
+        self._rings = {}
+        # [新增] 觸發價索引：每筆報價只喚醒價位被穿越的 Worker，不再逐一通知所有訂閱者
+        self.triggers = TriggerIndex()
+        # [新增] 跨行程鏡像 (SharedPriceBus)：有設定時每筆報價也寫入共享記憶體給 shard 行程
+        self.mirror = None
+
+    def reserve(self, keys):
+        """[新增] 預先配置看板欄位 (訂閱時呼叫)"""
+        for k in keys:
+            if k not in self._slots:
+                self._slots[k] = [0.0, 0, 0.0, 0]
+
+    def publish(self, symbol, price, event_ms=0, notify=True):
+        """寫入最新價 (只應由行情執行緒呼叫)
+        :param notify: False 代表這格不需要通知 GUI (例如停損專用的報價)
+        :return: True 代表這個幣種原本沒有待處理的通知，呼叫端需要發一次訊號
+        """
+        self._seq += 1
+        slot = self._slots.get(symbol)
+        if slot is None:
+            slot = self._slots[symbol] = [0.0, 0, 0.0, 0]
+        prev = slot[0]
+        # 先寫價格、最後寫序號：讀取端看到新序號時，價格一定已經是新的
+        slot[0] = price
+        slot[1] = event_ms
+        slot[2] = time.time()
+        slot[3] = self._seq
+        if self.mirror is not None:
+            self.mirror.write(symbol, price, event_ms)
+        ring = self._rings.get(symbol)
+        if ring is not None:
+            # [修改] 先放進報價帶再喚醒，Worker 醒來時一定讀得到這一筆
+            ring.append(price)
+            for wake in self.triggers.crossed(symbol, prev, price):
+                wake()
+        # 先寫價格再檢查 dirty，搭配 ack() 先清旗標再讀價，確保不會漏掉最後一筆
+        if not notify or symbol in self._dirty:
+            return False
+        self._dirty.add(symbol)
+        return True
+
+    def subscribe(self, key):
+        """[新增] 訂閱某欄位的每一筆報價，回傳 TapeReader
+        喚醒時機改由 triggers.arm() 登記的價位決定，沒有穿越關注價位的報價只會留在報價帶
+        """
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = TickRing(config.TICK_TAPE_MAX)
+        ring.readers += 1
+        return TapeReader(ring)
+
+    def unsubscribe(self, key, tape):
+        ring = self._rings.get(key)
+        if ring is tape.ring:
+            ring.readers -= 1
+            if ring.readers <= 0:
+                del self._rings[key]
+
+    def ack(self, symbol):
+        """GUI 消化完通知後呼叫，下一筆報價才會再發訊號"""
+        self._dirty.discard(symbol)
+
+    def get(self, symbol):
+        slot = self._slots.get(symbol)
+        return slot[0] if slot else 0.0
+
+    def snapshot(self, symbol):
+        """回傳 (price, event_ms, recv_time, seq) 的複本，沒有資料時回傳 None"""
+        slot = self._slots.get(symbol)
+        if slot is None or slot[3] == 0:
+            return None
+        return tuple(slot)
+
+    def prices(self):
+        return {s: slot[0] for s, slot in list(self._slots.items()) if slot[3]}
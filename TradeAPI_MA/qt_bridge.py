@@ -0,0 +1,19 @@
+from PySide6.QtCore import QObject, Signal, Slot
+
+class QtInvoker(QObject):
+    """把 EventSignal 的 slot 排回建立這個物件的 Qt 執行緒 (GUI / 引擎主執行緒) 執行
+    Worker 與行情執行緒 emit 時只排一個 Qt 事件，不會直接碰到介面元件
+    """
+    _call = Signal(object)
+
+    def __init__(self):
+        super().__init__()
+        self._call.connect(self._run)
+
+    @Slot(object)
+    def _run(self, job):
+        job()
+
+    def wrap(self, fn):
+        """回傳可由任何執行緒呼叫的版本，實際的 fn 會在本物件所屬的執行緒執行"""
+        return lambda *args: self._call.emit(lambda: fn(*args))
@@ -0,0 +1,190 @@
+# replay.py
+# 回放：以虛擬時鐘把 TickRecorder 錄下的逐筆報價依序餵給正式的 TradingWorker (與實盤同一份策略程式)
+# 下單由 SimClient 以當下報價立即成交；Worker 只在實盤也會被喚醒的時機 (穿越觸發價 / 例行檢查 / 換日) 跑一輪
+# 用法: python replay.py <幣種> <起始日 YYYYMMDD> [結束日 YYYYMMDD] [--params=headless_params.json] [--history=klines.json] [--ticks=ticks]
+#   --history: 起始日之前的日 K (futures_klines 的原始格式)；未提供時先以紀錄累積足夠的日 K，累積期間不交易
+import json
+import shutil
+import sys
+import time
+from datetime import datetime, timedelta
+import config
+import trading_strategy
+from trading_strategy import TradingWorker
+from clock import VirtualClock
+from price_board import PriceBoard
+from kline_book import KlineBook
+from tick_recorder import TickReader, archive_files
+from exchange_info_cache import ExchangeInfoCache
+from headless import STRATEGY_NAME, PARAMS_FILE, load_params
+
+DAY_MS = 86400000
+REPLAY_STATE_FOLDER = "replay_states"  # 回放用的狀態檔資料夾，每次回放前清空，不會動到實盤的 position_states
+
+class SimClient:
+    """回放用的交易所：日 K 來自紀錄的報價 (加上歷史檔)，市價單以目前報價立即成交 (不計手續費與滑價)"""
+    API_KEY = "replay"
+
+    def __init__(self, symbol, book, balance=1000.0, step_size=0.001):
+        self.symbol = symbol
+        self.book = book
+        self.live = None       # 進行中的日 K (由 replay 維護)
+        self.price = 0.0
+        self.now = 0.0
+        self.balance = balance
+        self.step_size = step_size
+        self.position = 0.0    # 正為多單、負為空單
+        self.avg_price = 0.0
+        self.fills = []        # (時間戳, 方向, 數量, 成交價, 已實現損益)
+        self.rules_cache = ExchangeInfoCache(background=False)  # 只存在記憶體，不寫入也不讀取實盤的規則快取檔
+
+    def futures_klines(self, symbol, interval='1d', limit=500, **kwargs):
+        rows = list(self.book.closed(symbol))
+        if self.live is not None:
+            rows.append(self.live)
+        return rows[-limit:]
+
+    def futures_exchange_info(self):
+        step = str(self.step_size)
+        return {'symbols': [{'symbol': self.symbol, 'filters': [
+            {'filterType': 'LOT_SIZE', 'minQty': step, 'stepSize': step},
+            {'filterType': 'MIN_NOTIONAL', 'notional': '5'},
+        ]}]}
+
+    def futures_symbol_ticker(self, symbol):
+        return {'symbol': symbol, 'price': str(self.price)}
+
+    def futures_account(self):
+        return {'positions': [{'symbol': self.symbol, 'positionAmt': str(self.position)}],
+                'assets': [{'asset': 'USDT', 'walletBalance': str(self.balance)}]}
+
+    def futures_create_order(self, symbol, side, type, quantity, reduceOnly=False, **kwargs):
+        pos, price = self.position, self.price
+        qty = float(quantity) if side == "BUY" else -float(quantity)
+        if reduceOnly:
+            # 只減倉：方向相同或數量超過持倉的部分不成交
+            qty = 0.0 if pos == 0 or (pos > 0) == (qty > 0) else max(-abs(pos), min(abs(pos), qty))
+        pnl = 0.0
+        if pos == 0 or (pos > 0) == (qty > 0):
+            if qty:
+                self.avg_price = (self.avg_price * abs(pos) + price * abs(qty)) / abs(pos + qty)
+        else:
+            pnl = min(abs(qty), abs(pos)) * (price - self.avg_price) * (1 if pos > 0 else -1)
+            self.balance += pnl
+            if abs(qty) > abs(pos):
+                self.avg_price = price  # 反手
+        self.position = round(pos + qty, 12)
+        if self.position == 0:
+            self.avg_price = 0.0
+        self.fills.append((self.now, side, abs(qty), price, pnl))
+        return {'orderId': len(self.fills), 'status': 'FILLED', 'executedQty': str(abs(qty)), 'avgPrice': str(price)}
+
+    def close_connection(self):
+        pass
+
+def kline_event(row, closed):
+    """日 K 列轉成 kline 串流事件的格式 (KlineBook.on_kline)"""
+    return {'t': row[0], 'o': row[1], 'h': row[2], 'l': row[3], 'c': row[4], 'v': row[5], 'T': row[6], 'x': closed}
+
+def replay(symbol, days, params, clock, history=None, folder=None, log=print):
+    """依序回放指定日期 (本地日期 YYYYMMDD) 的紀錄
+    :return: (TradingWorker, SimClient, 回放的進場報價筆數)
+    """
+    board = PriceBoard()
+    book = KlineBook()
+    client = SimClient(symbol, book)
+    shutil.rmtree(REPLAY_STATE_FOLDER, ignore_errors=True)
+    trading_strategy.STATE_FOLDER = REPLAY_STATE_FOLDER
+    worker = None
+    row = None      # 進行中的日 K (UTC 日，與幣安相同)
+    ready = False   # 已收盤的日 K 足夠計算觸發價
+    due = 0.0       # 沒有報價喚醒時，下一次例行檢查的時間
+    count = 0
+    prefix = symbol + "@"
+    for day in days:
+        for path in archive_files(folder or config.TICK_DIR, day):
+            reader = TickReader(path)
+            try:
+                for key, exch_ms, local_us, price in reader:
+                    if key != symbol and not key.startswith(prefix):
+                        continue
+                    ts_ms = exch_ms or local_us // 1000
+                    clock.set(ts_ms / 1000)
+                    client.now = clock.time()
+                    if key != symbol:
+                        board.publish(key, price, ts_ms, notify=False)  # 停損用的報價來源
+                    else:
+                        count += 1
+                        client.price = price
+                        open_ms = ts_ms - ts_ms % DAY_MS
+                        if row is None or open_ms > row[0]:
+                            new_row = [open_ms, price, price, price, price, 0.0, open_ms + DAY_MS - 1]
+                            if row is None:
+                                book.seed(symbol, [k for k in (history or []) if k[0] < open_ms] + [new_row])
+                            else:
+                                book.on_kline(symbol, kline_event(row, True))
+                                book.on_kline(symbol, kline_event(new_row, False))
+                            row = client.live = new_row
+                        else:
+                            if price > row[2]:
+                                row[2] = price
+                            elif price < row[3]:
+                                row[3] = price
+                            row[4] = price
+                        if worker is None:
+                            worker = TradingWorker(client, params, symbol, STRATEGY_NAME, price_board=board, kline_book=book, clock=clock)
+                            worker.log_update.connect(log)
+                            worker.is_running = True
+                        board.publish(symbol, price, ts_ms)
+                    if worker is None:
+                        continue
+                    if not ready:
+                        ready = book.has(symbol, worker.lookback_days())
+                        if not ready:
+                            continue
+                        worker.drain_ticks(price)  # 累積日 K 期間的報價不拿來判斷
+                    now = clock.time()
+                    if worker.pending() or now >= due:
+                        worker.wait_tick(0)  # 清除喚醒旗標 (虛擬時鐘不等待)
+                        try:
+                            worker.step()
+                        except Exception as e:
+                            worker.loop_errors += 1
+                            log(f"循環異常: {e}")
+                        due = clock.time() + worker.idle_timeout()
+            finally:
+                reader.close()
+    if worker is not None:
+        worker.stop()
+    return worker, client, count
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    opts = dict(a[2:].split("=", 1) for a in sys.argv[1:] if a.startswith("--") and "=" in a)
+    if len(args) < 2:
+        raise SystemExit("用法: python replay.py <幣種> <起始日 YYYYMMDD> [結束日 YYYYMMDD] [--params=檔案] [--history=檔案] [--ticks=資料夾]")
+    symbol = args[0].upper()
+    start = datetime.strptime(args[1], "%Y%m%d")
+    end = datetime.strptime(args[2], "%Y%m%d") if len(args) > 2 else start
+    days = [(start + timedelta(days=i)).strftime("%Y%m%d") for i in range((end - start).days + 1)]
+    params = load_params(opts.get("params", PARAMS_FILE))
+    history = None
+    if "history" in opts:
+        with open(opts["history"], "r", encoding="utf-8") as f:
+            history = json.load(f)
+
+    clock = VirtualClock()
+    log = lambda m: print(f"[{clock.now().strftime('%Y-%m-%d %H:%M:%S')}] {m}", flush=True)
+    t0 = time.perf_counter()
+    worker, client, count = replay(symbol, days, params, clock, history, opts.get("ticks"), log)
+    wall = time.perf_counter() - t0
+    if worker is None:
+        raise SystemExit(f"{days[0]} ~ {days[-1]} 沒有 {symbol} 的紀錄")
+
+    print(f"⏩ 回放 {count} 筆 {symbol} 報價，耗時 {wall:.1f} 秒 ({STRATEGY_NAME}，{days[0]} ~ {days[-1]})")
+    for ts, side, qty, price, pnl in client.fills:
+        print(f"  {datetime.fromtimestamp(ts).strftime('%Y-%m-%d %H:%M:%S')} {side} {qty} @ {price}" + (f" | 損益 {pnl:+.2f}" if pnl else ""))
+    print(f"成交 {len(client.fills)} 筆 | 已實現損益 {sum(f[4] for f in client.fills):+.2f} USDT | 結束持倉 {client.position}")
+
+if __name__ == "__main__":
+    main()
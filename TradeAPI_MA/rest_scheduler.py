@@ -0,0 +1,285 @@
+import asyncio
+import contextlib
+import contextvars
+import os
+import struct
+import threading
+from multiprocessing import shared_memory
+from binance.exceptions import BinanceAPIException
+import config
+from time_sync import shared_sync
+
+ORDER, DATA = 0, 1  # 車道：下單 / 其他 (日 K、交易規則、帳戶刷新)
+ORDER_PATHS = {'order', 'algoOrder', 'batchOrders', 'allOpenOrders', 'countdownCancelAll'}
+# 合約端點的 IP 權重 (幣安文件)，未列出的以 1 計；下單只計入下單次數，不佔 IP 權重
+WEIGHTS = {'account': 5, 'balance': 5, 'positionRisk': 5, 'userTrades': 5, 'order': 0, 'algoOrder': 0, 'batchOrders': 5}
+
+_urgent = contextvars.ContextVar('rest_urgent', default=False)
+
+@contextlib.contextmanager
+def urgent():
+    """進出場流程中的所有請求 (例如下單前查餘額) 都走下單車道；執行緒與協程各自獨立"""
+    token = _urgent.set(True)
+    try:
+        yield
+    finally:
+        _urgent.reset(token)
+
+_nowait = contextvars.ContextVar('rest_nowait', default=False)
+# 本次請求的回應 (每個執行緒 / 協程各自一份)；池中的 Client 由多個執行緒共用，client.response 可能已被別的請求覆寫
+_response = contextvars.ContextVar('rest_response', default=None)
+
+class RestBusy(Exception):
+    """nowait() 之下額度不足 (或 429/418 暫停中) 時拋出，delay 為建議等待秒數"""
+
+    def __init__(self, delay):
+        super().__init__(f"REST 請求額度已滿，約 {delay:.0f} 秒後再試")
+        self.delay = delay
+
+@contextlib.contextmanager
+def nowait():
+    """GUI 執行緒的請求不排隊：額度不足時立即拋出 RestBusy，不卡住介面"""
+    token = _nowait.set(True)
+    try:
+        yield
+    finally:
+        _nowait.reset(token)
+
+def request_weight(path, params):
+    """請求送出前的權重估計，實際用量以回應標頭為準"""
+    if path == 'klines':
+        limit = int(params.get('limit', 500))
+        return 1 if limit < 100 else 2 if limit < 500 else 5 if limit <= 1000 else 10
+    if path == 'ticker/price' and 'symbol' not in params:
+        return 2
+    return WEIGHTS.get(path, 1)
+
+# 共享記憶體：識別碼, 權重所屬分鐘, 該分鐘已用權重, 暫停請求直到 (毫秒)
+SHARED = struct.Struct('<8sqqq')
+MAGIC = b'RESTW001'
+
+class SharedBudget:
+    """同一台機器 (同一個 IP) 各行程共用的權重紀錄：BT / MA / 引擎 / shard 行程讀寫同一段具名共享記憶體
+    只記錄回應標頭看到的最新用量 (取較大值) 與 429/418 的暫停時間，不做跨行程鎖；共享記憶體不可用時退回本行程記錄
+    行程結束時不刪除 (只有 32 bytes)，之後啟動的行程沿用同一份紀錄
+    """
+
+    def __init__(self, name):
+        self.shm = None
+        try:
+            try:
+                self.shm = shared_memory.SharedMemory(name=name, create=True, size=SHARED.size)
+                SHARED.pack_into(self.shm.buf, 0, MAGIC, 0, 0, 0)
+            except FileExistsError:
+                self.shm = shared_memory.SharedMemory(name=name)
+            if os.name == "posix":
+                # resource_tracker 會在建立者結束時刪除共享記憶體，其他行程就失去共用的紀錄
+                from multiprocessing import resource_tracker
+                resource_tracker.unregister(self.shm._name, "shared_memory")
+            self.buf = self.shm.buf
+        except Exception as e:
+            print(f"[RestScheduler] 無法使用共享記憶體，權重只在本行程計算: {e}")
+            self.buf = bytearray(SHARED.size)
+
+    def read(self):
+        """(分鐘, 已用權重, 暫停到 毫秒)"""
+        _, minute, used, ban = SHARED.unpack_from(self.buf, 0)
+        return minute, used, ban
+
+    def report(self, minute, used):
+        old_minute, old_used, ban = self.read()
+        if minute > old_minute or (minute == old_minute and used > old_used):
+            SHARED.pack_into(self.buf, 0, MAGIC, minute, used, ban)
+
+    def ban(self, until_ms):
+        minute, used, ban = self.read()
+        if until_ms > ban:
+            SHARED.pack_into(self.buf, 0, MAGIC, minute, used, until_ms)
+
+class RestScheduler:
+    """合約 REST 請求排程：依回應標頭的 X-MBX-USED-WEIGHT-1M 控管每分鐘 IP 權重 (各行程共用)
+    下單車道可用到 REST_WEIGHT_LIMIT，其他請求最多到 上限 - REST_ORDER_RESERVE；有下單在等待時其他請求一律讓行
+    每個帳戶的下單數依 X-MBX-ORDER-COUNT-1M 控管；遇到 429/418 依 Retry-After 暫停所有請求
+    """
+
+    def __init__(self, testnet=False):
+        self.testnet = testnet
+        self.sync = shared_sync(testnet)  # 權重以交易所的分鐘計算
+        self.budget = SharedBudget(f"tradeapi_rest_{'testnet' if testnet else 'live'}")
+        self._cond = threading.Condition()
+        self._minute = 0
+        self._pending = 0         # 本行程已送出、尚未從標頭看到的權重
+        self._orders_waiting = 0
+        self.waits = [0, 0]       # 各車道因額度不足而等待的次數
+
+    def _delay(self, lane, weight, client):
+        """可以送出時保留權重並回傳 0，否則回傳建議等待秒數 (呼叫端需持有 self._cond)"""
+        now_ms = self.sync.time() * 1000
+        minute, used, ban = self.budget.read()
+        if now_ms < ban:
+            return (ban - now_ms) / 1000
+        cur = int(now_ms // 60000)
+        if cur != self._minute:
+            self._minute = cur
+            self._pending = 0
+        if minute != cur:
+            used = 0
+        to_next = (cur + 1) * 60 - now_ms / 1000
+        if lane == DATA:
+            if self._orders_waiting:
+                return to_next
+            cap = config.REST_WEIGHT_LIMIT - config.REST_ORDER_RESERVE
+        else:
+            cap = config.REST_WEIGHT_LIMIT
+            count_minute, count = getattr(client, 'order_count', (0, 0))
+            if count_minute == cur and count >= config.REST_ORDER_COUNT_LIMIT:
+                return to_next
+        if used + self._pending + weight > cap:
+            return to_next
+        self._pending += weight
+        return 0
+
+    def acquire(self, lane, weight, client=None):
+        """等到額度足夠 (下單優先) 後保留權重；nowait() 之下不等待，改拋出 RestBusy"""
+        with self._cond:
+            if lane == ORDER:
+                self._orders_waiting += 1
+            try:
+                delay = self._delay(lane, weight, client)
+                if delay > 0:
+                    self.waits[lane] += 1
+                    if _nowait.get():
+                        raise RestBusy(delay)
+                while delay > 0:
+                    self._cond.wait(min(delay, 1.0))
+                    delay = self._delay(lane, weight, client)
+            finally:
+                if lane == ORDER:
+                    self._orders_waiting -= 1
+                    self._cond.notify_all()
+
+    async def acquire_async(self, lane, weight, client=None):
+        """acquire 的協程版本 (不佔住事件迴圈)"""
+        waiting = False
+        try:
+            while True:
+                with self._cond:
+                    delay = self._delay(lane, weight, client)
+                    if delay <= 0:
+                        return
+                    if _nowait.get():
+                        self.waits[lane] += 1
+                        raise RestBusy(delay)
+                    if not waiting:
+                        waiting = True
+                        self.waits[lane] += 1
+                        if lane == ORDER:
+                            self._orders_waiting += 1
+                await asyncio.sleep(min(delay, 0.2))
+        finally:
+            if waiting and lane == ORDER:
+                with self._cond:
+                    self._orders_waiting -= 1
+                    self._cond.notify_all()
+
+    def observe(self, client, status, headers, weight):
+        """請求完成：以回應標頭更新共用權重與帳戶下單數，失敗時釋放保留的權重"""
+        minute = int(self.sync.time() // 60)
+        with self._cond:
+            self._pending = max(0, self._pending - weight)
+            if headers is not None:
+                used = headers.get('X-MBX-USED-WEIGHT-1M')
+                if used is not None:
+                    self.budget.report(minute, int(used))
+                count = headers.get('X-MBX-ORDER-COUNT-1M')
+                if count is not None and client is not None:
+                    client.order_count = (minute, int(count))
+                if status in (418, 429):
+                    retry = headers.get('Retry-After')
+                    pause = float(retry) if retry else config.REST_BAN_DEFAULT_S
+                    self.budget.ban(int((self.sync.time() + pause) * 1000))
+                    print(f"[RestScheduler] 幣安回應 {status}，所有行程暫停 REST 請求 {pause:.0f} 秒")
+            self._cond.notify_all()
+
+    def attach(self, client):
+        """讓同步 Client 的合約請求經過排程 (同一個 Client 只掛一次)"""
+        if getattr(client, 'rest_scheduler', None) is self:
+            return client
+        raw = client._request_futures_api
+        handle = client._handle_response
+
+        def handle_response(response):
+            _response.set(response)
+            return handle(response)
+
+        def request(method, path, signed=False, version=1, **kwargs):
+            lane = ORDER if path in ORDER_PATHS or _urgent.get() else DATA
+            weight = request_weight(path, kwargs.get('data') or {})
+            self.acquire(lane, weight, client)
+            _response.set(None)
+            try:
+                result = raw(method, path, signed, version, **kwargs)
+            except BinanceAPIException as e:
+                self.observe(client, e.status_code, getattr(e.response, 'headers', None), weight)
+                raise
+            except Exception:
+                self.observe(client, 0, None, weight)
+                raise
+            self.observe(client, 200, getattr(_response.get(), 'headers', None), weight)
+            return result
+
+        client._handle_response = handle_response
+        client._request_futures_api = request
+        client.rest_scheduler = self
+        return client
+
+    def attach_async(self, client):
+        """attach 的 AsyncClient 版本"""
+        if getattr(client, 'rest_scheduler', None) is self:
+            return client
+        raw = client._request_futures_api
+        handle = client._handle_response
+
+        async def handle_response(response):
+            _response.set(response)
+            return await handle(response)
+
+        async def request(method, path, signed=False, version=1, **kwargs):
+            lane = ORDER if path in ORDER_PATHS or _urgent.get() else DATA
+            weight = request_weight(path, kwargs.get('data') or {})
+            await self.acquire_async(lane, weight, client)
+            _response.set(None)
+            try:
+                result = await raw(method, path, signed, version, **kwargs)
+            except BinanceAPIException as e:
+                self.observe(client, e.status_code, getattr(e.response, 'headers', None), weight)
+                raise
+            except Exception:
+                self.observe(client, 0, None, weight)
+                raise
+            self.observe(client, 200, getattr(_response.get(), 'headers', None), weight)
+            return result
+
+        client._handle_response = handle_response
+        client._request_futures_api = request
+        client.rest_scheduler = self
+        return client
+
+    def stats(self):
+        """(本分鐘已用權重估計, 上限, 一般請求等待次數, 下單等待次數)"""
+        minute, used, _ = self.budget.read()
+        cur = int(self.sync.time() // 60)
+        with self._cond:
+            pending = self._pending if self._minute == cur else 0
+        return (used if minute == cur else 0) + pending, config.REST_WEIGHT_LIMIT, self.waits[DATA], self.waits[ORDER]
+
+_shared = {}
+_shared_lock = threading.Lock()
+
+def shared_scheduler(testnet=False):
+    """同一行程共用的排程器 (正式網 / 測試網各一份)"""
+    with _shared_lock:
+        scheduler = _shared.get(testnet)
+        if scheduler is None:
+            scheduler = _shared[testnet] = RestScheduler(testnet)
+        return scheduler
@@ -0,0 +1,256 @@
+import atexit
+import glob
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from collections import deque
+from itertools import accumulate, chain
+from operator import sub, xor
+from datetime import datetime
+import config
+
+# 每筆固定寬度：幣種編號 (uint16)、交易所時間 ms (int64，未知為 0)、本地接收時間 µs (int64)、價格 (float64)
+RECORD = struct.Struct('<Hqqd')
+# 各欄位在一筆紀錄中的 (位移, 寬度)
+FIELDS = ((0, 2), (2, 8), (10, 8), (18, 8))
+# 壓縮檔標頭：識別碼 + 筆數
+ZHEADER = struct.Struct('<6sq')
+ZMAGIC = b'TICKZ1'
+
+def symbol_file(path):
+    """紀錄檔對應的幣種表 (第 N 行 = 編號 N)"""
+    return path[:path.rindex('.')] + '.sym'
+
+def load_symbols(path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        return [line.rstrip('\n') for line in f]
+
+def archive_files(folder, day):
+    """列出某一天 (YYYYMMDD) 的所有紀錄檔，依分段順序排列"""
+    files = glob.glob(os.path.join(folder, f"{day}*.tick")) + glob.glob(os.path.join(folder, f"{day}*.tickz"))
+
+    def part(path):
+        name = os.path.basename(path).split('.')[0]
+        return int(name.split('_')[1]) if '_' in name else 0
+    return sorted(files, key=part)
+
+def split_columns(data, n):
+    """前 n 筆紀錄拆成四個欄位各自連續存放的 bytes (以跨步切片逐位元組搬移，不逐筆解析)"""
+    size = RECORD.size
+    cols = []
+    for off, width in FIELDS:
+        col = bytearray(n * width)
+        for j in range(width):
+            col[j::width] = data[off + j:n * size:size]
+        cols.append(col)
+    return cols
+
+def join_columns(cols, n):
+    """split_columns 的反向：各欄位交錯寫回固定寬度的紀錄"""
+    size = RECORD.size
+    out = bytearray(n * size)
+    for (off, width), col in zip(FIELDS, cols):
+        for j in range(width):
+            out[off + j::size] = col[j::width]
+    return out
+
+def compress_file(path):
+    """把 .tick 轉成 .tickz：欄位分開存放，時間取差分、價格與前一筆做位元 XOR (價格不變時為 0)，再以 zlib 壓縮
+    [修改] 欄位拆分與差分 / XOR 都在 C 層完成 (跨步切片、map、accumulate)，不再逐筆在 Python 迴圈處理
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    n = len(data) // RECORD.size
+    ids, *cols = split_columns(data, n)
+    exch, local, bits = array('q'), array('q'), array('q')
+    for a, col in zip((exch, local, bits), cols):
+        a.frombytes(col)
+    exch = array('q', map(sub, exch, chain((0,), exch)))
+    local = array('q', map(sub, local, chain((0,), local)))
+    bits = array('q', map(xor, bits, chain((0,), bits)))  # 價格的位元 (float64 視為 int64)
+    payload = b''.join((bytes(ids), exch.tobytes(), local.tobytes(), bits.tobytes()))
+    tmp = path + 'z.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(ZHEADER.pack(ZMAGIC, n))
+        f.write(zlib.compress(payload, 6))
+    os.replace(tmp, path + 'z')
+    os.remove(path)
+
+def decompress_file(path):
+    """把 .tickz 還原成與 .tick 相同的固定寬度內容"""
+    with open(path, 'rb') as f:
+        magic, n = ZHEADER.unpack(f.read(ZHEADER.size))
+        if magic != ZMAGIC:
+            raise ValueError(f"不是 tick 壓縮檔: {path}")
+        payload = zlib.decompress(f.read())
+    ids, exch, local, bits = array('H'), array('q'), array('q'), array('q')
+    pos = 0
+    for a in (ids, exch, local, bits):
+        size = n * a.itemsize
+        a.frombytes(payload[pos:pos + size])
+        pos += size
+    exch = array('q', accumulate(exch))
+    local = array('q', accumulate(local))
+    bits = array('q', accumulate(bits, xor))
+    return bytes(join_columns([a.tobytes() for a in (ids, exch, local, bits)], n))
+
+class TickReader:
+    """讀取紀錄檔：.tick 以 mmap 開啟 (不複製、以磁碟速度讀取)，.tickz 解壓後提供相同介面"""
+
+    def __init__(self, path):
+        self.path = path
+        self.symbols = load_symbols(symbol_file(path))
+        self._file = self._mm = None
+        if path.endswith('.tickz'):
+            self._buf = memoryview(decompress_file(path))
+        elif os.path.getsize(path) == 0:
+            self._buf = memoryview(b'')
+        else:
+            self._file = open(path, 'rb')
+            self._mm = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._buf = memoryview(self._mm)
+        # 寫入中的檔案可能停在半筆，只讀完整的部分
+        self.count = len(self._buf) // RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        """依寫入順序產生 (symbol, 交易所時間 ms, 本地接收時間 µs, 價格)"""
+        symbols = self.symbols
+        for sid, e, l, p in RECORD.iter_unpack(self._buf[:self.count * RECORD.size]):
+            yield symbols[sid], e, l, p
+
+    def record(self, i):
+        sid, e, l, p = RECORD.unpack_from(self._buf, i * RECORD.size)
+        return self.symbols[sid], e, l, p
+
+    def close(self):
+        self._buf.release()
+        if self._mm is not None:
+            self._mm.close()
+            self._file.close()
+
+class TickRecorder:
+    """逐筆報價紀錄器：熱路徑只把資料放進佇列，由背景執行緒批次寫入當日的 append-only 檔
+    檔案: <TICK_DIR>/YYYYMMDD.tick (超過 TICK_ROTATE_MB 時換成 YYYYMMDD_1.tick ...)，幣種表存在同名 .sym
+    """
+
+    def __init__(self, folder=None):
+        self.folder = folder or config.TICK_DIR
+        self._queue = deque()
+        self._running = False
+        self._thread = None
+        self._file = None
+        self._sym_file = None
+        self._path = ""
+        self._day = ""
+        self._part = 0
+        self._ids = {}  # symbol -> 目前檔案內的編號
+
+    def start(self):
+        os.makedirs(self.folder, exist_ok=True)
+        if config.TICK_COMPRESS:
+            leftovers = self._leftovers(datetime.now().strftime("%Y%m%d"))
+            if leftovers:
+                threading.Thread(target=self._compress, args=leftovers, daemon=True).start()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _leftovers(self, day):
+        """[新增] 上次執行留下、尚未壓縮的紀錄檔 (例如換日前就關閉程式的前一天檔案)；當天最後一個分段會接續寫入，不壓縮"""
+        files = glob.glob(os.path.join(self.folder, "*.tick"))
+        today = [p for p in archive_files(self.folder, day) if p.endswith('.tick')]
+        keep = today[-1] if today else None
+        return [p for p in files if p != keep]
+
+    def record(self, symbol, price, exchange_ms=0):
+        """熱路徑：只做一次 deque.append (執行緒安全、不需鎖)，可由任何執行緒呼叫"""
+        self._queue.append((symbol, exchange_ms, time.time_ns() // 1000, price))
+
+    def close(self):
+        if not self._running:
+            return
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        self._drain()
+        self._close_file()
+
+    def _run(self):
+        while self._running:
+            time.sleep(config.TICK_FLUSH_INTERVAL)
+            try:
+                self._drain()
+            except Exception as e:
+                print(f"[TickRecorder] 寫入失敗: {e}")
+
+    def _drain(self):
+        if not self._queue:
+            return
+        day = datetime.now().strftime("%Y%m%d")
+        if day != self._day or self._file is None:
+            self._open(day, 0)
+        elif self._file.tell() >= config.TICK_ROTATE_MB * 1024 * 1024:
+            self._open(day, self._part + 1)
+
+        buf = bytearray()
+        ids, pack, pop = self._ids, RECORD.pack, self._queue.popleft
+        for _ in range(len(self._queue)):
+            symbol, exch, local_us, price = pop()
+            sid = ids.get(symbol)
+            if sid is None:
+                sid = self._new_symbol(symbol)
+            buf += pack(sid, exch, local_us, price)
+        self._file.write(buf)
+        self._file.flush()
+
+    def _new_symbol(self, symbol):
+        sid = self._ids[symbol] = len(self._ids)
+        self._sym_file.write(symbol + '\n')
+        self._sym_file.flush()
+        return sid
+
+    def _open(self, day, part):
+        """換檔 (換日或超過大小)，舊檔在背景壓縮"""
+        old = self._path
+        self._close_file()
+        if old and config.TICK_COMPRESS:
+            threading.Thread(target=self._compress, args=(old,), daemon=True).start()
+
+        # 重新啟動時接續當天最後一個分段 (不寫回較前面的分段)，已壓縮過的分段不再寫入
+        while os.path.exists(self._part_path(day, part + 1)) or os.path.exists(self._part_path(day, part + 1) + 'z'):
+            part += 1
+        while os.path.exists(self._part_path(day, part) + 'z'):
+            part += 1
+        self._day, self._part = day, part
+        self._path = self._part_path(day, part)
+        self._ids = {s: i for i, s in enumerate(load_symbols(symbol_file(self._path)))}
+        self._file = open(self._path, 'ab')
+        self._sym_file = open(symbol_file(self._path), 'a', encoding='utf-8')
+
+    def _part_path(self, day, part):
+        name = day if part == 0 else f"{day}_{part}"
+        return os.path.join(self.folder, name + '.tick')
+
+    def _close_file(self):
+        if self._file is not None:
+            self._file.close()
+            self._sym_file.close()
+            self._file = self._sym_file = None
+
+    @staticmethod
+    def _compress(*paths):
+        for path in paths:
+            try:
+                compress_file(path)
+            except Exception as e:
+                print(f"[TickRecorder] 壓縮失敗 {path}: {e}")
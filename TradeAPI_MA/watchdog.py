@@ -0,0 +1,60 @@
+import time
+import config
+
+class Watchdog:
+    """行情與 Worker 監控：每個幣種最後報價的年齡、每個 Worker 迴圈的心跳與單輪耗時"""
+
+    def __init__(self, board):
+        self.board = board
+        self._levels = {}  # id(worker) -> 上次的狀態等級，只在改變時回報
+        self._errors = {}  # id(worker) -> 上次看到的例外次數
+
+    def tick_age(self, symbol, now=None):
+        """幣種最後一筆報價距今幾秒，從未收到報價時回傳 None"""
+        slot = self.board.snapshot(symbol)
+        if slot is None:
+            return None
+        return (now or time.time()) - slot[2]
+
+    def check(self, worker, now=None):
+        """檢查單一 Worker
+        :return: (狀態欄文字, 是否異常, 狀態改變時的告警訊息或 None)
+        """
+        now = now or time.time()
+        tick_age = self.tick_age(worker.symbol, now)
+        beat_age = now - worker.heartbeat if worker.heartbeat else 0.0
+        # 取出這段期間最慢的一輪後歸零，避免一次尖峰一直掛在畫面上
+        peak_ms, worker.loop_max = worker.loop_max * 1000, 0.0
+        alloc_peak, worker.loop_alloc_max = worker.loop_alloc_max, 0
+        errors = worker.loop_errors - self._errors.get(id(worker), 0)
+        self._errors[id(worker)] = worker.loop_errors
+
+        if beat_age > config.WATCHDOG_HEARTBEAT_STALE:
+            level, text = "stalled", f"🛑 停滯 {beat_age:.0f}s"
+        elif tick_age is None or tick_age > config.WATCHDOG_TICK_STALE:
+            level = "stale"
+            text = "⚠️ 無報價" if tick_age is None else f"⚠️ 報價延遲 {tick_age:.0f}s"
+            if config.WATCHDOG_BLOCK_STALE_ENTRY:
+                worker.mark_feed_stale()  # 收到下一筆新報價前暫停進場
+        elif errors:
+            level, text = "error", f"❗ 例外 {errors} 次"
+        elif peak_ms > config.WATCHDOG_LATENCY_WARN_MS:
+            level, text = "slow", f"🐢 迴圈 {peak_ms:.0f}ms"
+        else:
+            level = "ok"
+            text = f"{'⏳ 等待同步' if worker.wait_for_reset else '⚡ 運行'} {worker.loop_latency * 1000:.1f}ms"
+            if config.LATENCY_MODE:
+                # [新增] 低延遲模式：每輪新增的記憶體區塊 (平均/最大)，用來追蹤判斷路徑上的配置是否變多
+                text += f" | 配置 {worker.loop_allocs:.0f}/{alloc_peak}"
+
+        alert = None
+        prev = self._levels.get(id(worker), "ok")
+        if level != prev:
+            alert = f"🐶 [Watchdog] {worker.symbol} {text}" if level != "ok" else f"✅ [Watchdog] {worker.symbol} 恢復正常"
+        self._levels[id(worker)] = level
+        return text, level != "ok", alert
+
+    def forget(self, worker):
+        """Worker 停止或移除時清掉紀錄"""
+        self._levels.pop(id(worker), None)
+        self._errors.pop(id(worker), None)
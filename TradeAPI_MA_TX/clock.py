@@ -0,0 +1,51 @@
+import time
+from datetime import datetime
+
+class RealClock:
+    """實盤時鐘：直接使用系統時間 (Worker 未指定時鐘時共用 REAL_CLOCK)"""
+
+    def time(self):
+        return time.time()
+
+    def now(self):
+        return datetime.now()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+    def wait(self, event, timeout):
+        """等待 threading.Event，最多 timeout 秒"""
+        return event.wait(timeout)
+
+class VirtualClock:
+    """模擬時鐘：時間只由呼叫端推進 (set / advance)，sleep 與等待不佔用實際時間
+    replay 把每筆紀錄的時間設進來，策略看到的「現在」就是當時的行情時間
+    """
+
+    def __init__(self, start=0.0):
+        self._now = float(start)
+
+    def time(self):
+        return self._now
+
+    def now(self):
+        return datetime.fromtimestamp(self._now)
+
+    def sleep(self, seconds):
+        self._now += max(0.0, seconds)
+
+    def wait(self, event, timeout):
+        """事件已設定就立即返回，否則視為等滿 timeout"""
+        if not event.is_set():
+            self._now += max(0.0, timeout or 0.0)
+        return event.is_set()
+
+    def set(self, ts):
+        """前進到指定時間 (秒)；不會倒退"""
+        if ts > self._now:
+            self._now = ts
+
+    def advance(self, seconds):
+        self._now += seconds
+
+REAL_CLOCK = RealClock()
@@ -31,4 +31,11 @@ def load_and_decrypt_credentials():
 USER_ID, USER_PASS = load_and_decrypt_credentials()
 
 # 測試環境設定
-IS_TESTNET = False
\ No newline at end of file
+IS_TESTNET = False
+
+# --- 逐筆報價紀錄 (TickRecorder) ---
+TICK_RECORD = True            # 把收到的每一筆報價寫入日檔，供重播與分析
+TICK_DIR = "ticks"            # 紀錄檔資料夾
+TICK_FLUSH_INTERVAL = 0.2     # 背景寫入間隔 (秒)
+TICK_ROTATE_MB = 256          # 單一檔案超過此大小即換新檔 (同一天以 _1, _2 ... 區分)
+TICK_COMPRESS = True          # 換檔後把舊檔壓縮成 .tickz (差分 + zlib)
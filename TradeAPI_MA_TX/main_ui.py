@@ -14,6 +14,9 @@ import config
 from sk_utils import handle_code, sk
 from request_futures_data import QuoteFetcher
 from trading_strategy import TradingWorker
+from tick_recorder import TickRecorder
+from trigger_index import TriggerIndex
+from clock import REAL_CLOCK
 
 CREDENTIALS_FILE = "credentials.json"
 
@@ -102,11 +105,12 @@ class PriceBridge(QObject):
 
 # --- 2. Fetcher ---
 class UIBridgedFetcher(QuoteFetcher):
-    def __init__(self, bridge):
+    def __init__(self, bridge, recorder=None):
         import pythoncom
         pythoncom.CoInitialize()
         super().__init__()
         self.bridge = bridge
+        self.recorder = recorder  # [新增] 逐筆報價紀錄 (背景寫檔)
 
     def OnNotifyQuoteLONG(self, sMarketNo, nIndex):
         super().OnNotifyQuoteLONG(sMarketNo, nIndex)
@@ -118,6 +122,9 @@ class UIBridgedFetcher(QuoteFetcher):
         symbol = pSKStock.bstrStockNo.strip()
         if price > 0:
             self.bridge.price_signal.emit(symbol, price)
+            if self.recorder is not None:
+                # 群益報價沒有交易所時間戳，只記錄本地接收時間
+                self.recorder.record(symbol, price)
 
     def OnAccount(self, bstrLogInID, bstrAccountData):
         super().OnAccount(bstrLogInID, bstrAccountData)
@@ -143,13 +150,14 @@ class UIBridgedFetcher(QuoteFetcher):
 
 # --- 3. 執行緒 ---
 class FetcherThread(QThread):
-    def __init__(self, bridge):
+    def __init__(self, bridge, recorder=None):
         super().__init__()
         self.bridge = bridge
+        self.recorder = recorder
         self.fetcher = None
 
     def run(self):
-        self.fetcher = UIBridgedFetcher(self.bridge)
+        self.fetcher = UIBridgedFetcher(self.bridge, self.recorder)
         self.fetcher.start()
 
 # --- 4. 主視窗 ---
@@ -161,8 +169,13 @@ class MainWindow(QMainWindow):
         
         self.is_ready = False
         self.workers = {} 
+        # [新增] 觸發價索引：每筆報價只處理價位被穿越的 Worker，不再逐一呼叫所有 Worker
+        self.trigger_index = TriggerIndex()
+        self.last_prices = {}
         self.accounts_list = [] 
         self.last_auto_update = ""
+        # [新增] 換日下載排程與 K 線日期範圍都經由時鐘判斷 (模擬時可換成 VirtualClock)
+        self.clock = REAL_CLOCK
         self.current_symbol = "TX00"
         
         # 暫存啟動資訊
@@ -179,7 +192,13 @@ class MainWindow(QMainWindow):
         self.bridge.log_signal.connect(self.append_log)
         self.bridge.server_ready.connect(self.on_server_ready)
         
-        self.engine_thread = FetcherThread(self.bridge)
+        # [新增] 逐筆報價紀錄：背景執行緒寫入 ticks/YYYYMMDD.tick，供重播與分析
+        self.tick_recorder = None
+        if config.TICK_RECORD:
+            self.tick_recorder = TickRecorder()
+            self.tick_recorder.start()
+
+        self.engine_thread = FetcherThread(self.bridge, self.tick_recorder)
         self.engine_thread.start()
         self.append_log(">>> 系統啟動中...")
 
@@ -309,9 +328,13 @@ class MainWindow(QMainWindow):
         if symbol == self.current_symbol:
             self.price_label.setText(f"{symbol}: {price:,.0f}")
         
-        for acc, worker in self.workers.items():
-            if worker and worker.symbol == symbol:
-                worker.process_quote(price)
+        prev = self.last_prices.get(symbol, price)
+        self.last_prices[symbol] = price
+        for worker in self.trigger_index.crossed(symbol, prev, price):
+            if worker not in self.workers.values():
+                continue  # [修正] 帳戶已停止，不再處理報價也不重新登記
+            worker.process_quote(price)
+            self.trigger_index.arm(symbol, worker, worker.trigger_levels())
 
     def on_account_found(self, account):
         if account in self.accounts_list: return
@@ -383,6 +406,9 @@ class MainWindow(QMainWindow):
 
         else:
             # --- 停止流程 ---
+            worker = self.workers[account]
+            if worker is not None:  # [修正] Worker 可能已被清除 (例如啟動失敗)，不對 None 取 symbol
+                self.trigger_index.disarm(worker.symbol, worker)
             self.workers[account] = None
             btn.setText("啟動")
             btn.setStyleSheet("background-color: #27ae60; color: white; font-weight: bold;")
@@ -440,6 +466,8 @@ class MainWindow(QMainWindow):
         
         worker.reload_history(prices)
         self.workers[account] = worker
+        # 下一筆報價一定處理一次 (現價可能已經在進場區間內)
+        self.trigger_index.arm(trade_symbol, worker, worker.trigger_levels(), pending=True)
         
         btn = self.account_table.cellWidget(row, 4)
         btn.setText("停止")
@@ -469,7 +497,7 @@ class MainWindow(QMainWindow):
         self.dl_thread.start()
 
     def get_kline_date_range(self):
-        now = datetime.now()
+        now = self.clock.now()
         if now.hour >= 15:
             e_dt = now.strftime("%Y%m%d")
         else:
@@ -478,7 +506,7 @@ class MainWindow(QMainWindow):
         return s_dt, e_dt
 
     def check_daily_update(self):
-        now = datetime.now()
+        now = self.clock.now()
         if now.hour == 15 and 0 <= now.minute <= 10:
             today_str = now.strftime("%Y%m%d")
             if self.last_auto_update != today_str:
@@ -494,7 +522,9 @@ class MainWindow(QMainWindow):
         prices = self.read_csv_prices("TX00")
         if prices:
             for w in self.workers.values():
-                if w: w.reload_history(prices)
+                if w:
+                    w.reload_history(prices)
+                    self.trigger_index.arm(w.symbol, w, w.trigger_levels(), pending=True)
             self.append_log("✅ 換日資料更新完畢")
 
     def append_log(self, msg):
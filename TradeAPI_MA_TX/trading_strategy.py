@@ -12,6 +12,7 @@ if not os.path.exists(STATE_FOLDER):
 class TradingWorker(QObject):
     log_signal = Signal(str)
     status_signal = Signal(str) # 新增訊號：回傳倉位狀態給 UI 表格
+    MAX_SLIPPAGE = 5.0  # [新增] 進場時最多追價幾點
 
     def __init__(self, order_obj, params, symbol):
         super().__init__()
@@ -111,7 +112,7 @@ class TradingWorker(QObject):
             return
 
     def check_slippage(self, price, target_price, side):
-        max_slippage = 5.0
+        max_slippage = self.MAX_SLIPPAGE
         # 做多：價格遠高於目標價 -> 不追
         if side == "BUY" and price > (target_price + max_slippage):
             self.log_signal.emit(f"⚠️ 價格過高 ({price})！高於進場價 {target_price:.0f}，放棄追多")
@@ -209,6 +210,26 @@ class TradingWorker(QObject):
                 self.log_signal.emit(f"💰 空單獲利反彈平倉：{price}")
                 self.execute_order("BUY", price, self.short_p['qty'])
 
+    def trigger_levels(self):
+        """[新增] 需要處理報價的價位 (供 MainWindow 的觸發價索引使用)
+        空手時為多空進場區間的兩端；持倉時為停損價、移停啟動/回撤價與目前最佳價 (創新高/新低要更新)
+        """
+        if not self.history_ready:
+            return []
+        if not self.in_position:
+            long_thresh = self.current_ma_long * (1 + self.long_p['buffer'] / 100)
+            short_thresh = self.current_ma_short * (1 - self.short_p['buffer'] / 100)
+            return [long_thresh, long_thresh + self.MAX_SLIPPAGE, short_thresh - self.MAX_SLIPPAGE, short_thresh]
+        if self.current_side == "BUY":
+            p = self.long_p
+            levels = [self.entry_price * (1 - p['sl'] / 100), self.best_price]
+            levels.append(self.best_price * (1 - p['ttp_call'] / 100) if self.ttp_active else self.entry_price * (1 + p['ttp_trig'] / 100))
+        else:
+            p = self.short_p
+            levels = [self.entry_price * (1 + p['sl'] / 100), self.best_price]
+            levels.append(self.best_price * (1 + p['ttp_call'] / 100) if self.ttp_active else self.entry_price * (1 - p['ttp_trig'] / 100))
+        return levels
+
     def save_state(self):
         state = {
             "in_position": self.in_position,
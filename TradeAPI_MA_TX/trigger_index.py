@@ -0,0 +1,72 @@
+import bisect
+import threading
+
+class TriggerIndex:
+    """觸發價索引：每個幣種一份依價格排序的陣列，記錄每個持有者 (Worker 或其喚醒函式) 目前關注的價位
+    每筆報價只以二分搜尋找出 [前一價, 現價] 之間被穿越的價位，只處理這些持有者，成本 O(log n + 命中數)
+    """
+
+    def __init__(self):
+        # key -> (排序後的價位, 對應的持有者)，每次登記整份替換，報價端免鎖讀取
+        self._books = {}
+        self._armed = {}    # key -> {持有者: 價位 tuple}
+        self._pending = {}  # key -> 下一筆報價不論是否穿越都要處理一次的持有者
+        self._lock = threading.Lock()
+
+    def arm(self, key, owner, levels, pending=False):
+        """登記 (或更新) 持有者關注的價位；價位沒變時不重建
+        :param pending: True 代表下一筆報價一定要處理一次 (例如剛啟動、現價可能已在進場區間內)
+        """
+        levels = tuple(sorted(l for l in levels if 0 < l < float('inf')))
+        with self._lock:
+            armed = self._armed.setdefault(key, {})
+            if pending:
+                self._pending[key] = self._pending.get(key, ()) + (owner,)
+            if armed.get(owner) == levels:
+                return
+            armed[owner] = levels
+            self._rebuild(key)
+
+    def disarm(self, key, owner):
+        with self._lock:
+            # [修正] 一併移除待處理的登記，停止的持有者不會再被下一筆報價喚醒
+            pending = self._pending.get(key)
+            if pending and owner in pending:
+                pending = tuple(o for o in pending if o is not owner)
+                if pending:
+                    self._pending[key] = pending
+                else:
+                    del self._pending[key]
+            armed = self._armed.get(key)
+            if armed and armed.pop(owner, None) is not None:
+                self._rebuild(key)
+
+    def crossed(self, key, prev, price):
+        """回傳價位落在 [prev, price] (不分方向) 內的持有者，依價位排序、不重複"""
+        pending = None
+        if self._pending:  # 大多數報價沒有待處理的持有者，免鎖略過
+            with self._lock:
+                pending = self._pending.pop(key, None)
+        book = self._books.get(key)
+        hits = ()
+        if book is not None:
+            levels, owners = book
+            lo, hi = (prev, price) if prev <= price else (price, prev)
+            i = bisect.bisect_left(levels, lo)
+            j = bisect.bisect_right(levels, hi)
+            if i < j:
+                hits = owners[i:j]
+        if pending:
+            hits = tuple(hits) + pending
+        if len(hits) > 1:
+            hits = tuple(dict.fromkeys(hits))
+        return hits
+
+    def count(self, key):
+        """目前登記在這個 key 的持有者數量"""
+        return len(self._armed.get(key, ()))
+
+    def _rebuild(self, key):
+        pairs = sorted(((l, i) for i, levels in enumerate(self._armed[key].values()) for l in levels), key=lambda p: p[0])
+        owners = list(self._armed[key])
+        self._books[key] = ([l for l, _ in pairs], [owners[i] for _, i in pairs])